@@ -0,0 +1,78 @@
+"""Microbenchmark of the SR7270 reply parsing. Compares the per-read cost of the old str based read_dev/check_status
+against the byte table decoder in optics.hardware_control.sr7270 on typical xy. replies.
+
+usage: python -m benchmarks.lockin_parse [-n number of reads]"""
+import argparse
+import timeit
+from array import array
+from collections import OrderedDict
+from optics.hardware_control.sr7270 import LockIn
+
+
+class LegacyLockIn:
+    """The reply handling from before the byte decoder, kept for comparison"""
+    def __init__(self):
+        self._overload = False
+        self._unlocked = False
+
+    @staticmethod
+    def read_dev(raw):
+        return ''.join(chr(x) for x in raw)
+
+    def check_status(self, i):
+        self._overload = False
+        self._unlocked = False
+        status_codes = OrderedDict({'command complete': 0, 'invalid command': 'Invalid lock in command',
+                                    'invalid command parameter': 'Invalid lock in command parameter',
+                                    'reference unlock': 0,
+                                    'output overload': 0,
+                                    'new ADC after trigger': 0,
+                                    'input overload': 'Lock in input overload',
+                                    'data available': 0})
+        overload_codes = ['X1', 'Y1', 'X2', 'Y2', 'CH1', 'CH2', 'CH3', 'CH4']
+        status_bytes = [x for x in i[-2::]]
+        i = i[0:-3].replace('\n', '')
+        if status_bytes[0] == '!':
+            return [float(j) for j in i.split(',')] if i else None
+        for j, k in enumerate(reversed(bin(ord(status_bytes[0])))):
+            if k == '1':
+                if status_codes[list(status_codes.keys())[j]]:
+                    if status_codes[list(status_codes.keys())[j]] != 'Lock in input overload':
+                        raise ValueError(status_codes[list(status_codes.keys())[j]])
+                if list(status_codes.keys())[j] == 'reference unlock':
+                    self._unlocked = True
+                else:
+                    if list(status_codes.keys())[j] == 'output overload':
+                        for l, m in enumerate(reversed(bin(ord(status_bytes[1])))):
+                            if m == '1':
+                                if overload_codes[l] == 'X1' or overload_codes[l] == 'Y1':
+                                    self._overload = True
+        return [float(j) for j in i.split(',')] if i else None
+
+
+def replies():
+    """Raw USB buffers as returned by pyusb for a few typical replies"""
+    return [array('B', b'1.2345E-06,-6.789E-07\n\x00\x81\x00'),  # xy. with data available
+            array('B', b'3.2100E-03,1.0000E-04\n\x00\xc1\x00'),  # xy. with an input overload warning
+            array('B', b'0.2000\n\x00\x01\x00')]  # tc.
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SR7270 reply parsing benchmark')
+    parser.add_argument('-n', metavar='number', type=int, default=100000, help='number of reads to time')
+    args = parser.parse_args()
+    raw = replies()
+    legacy = LegacyLockIn()
+    lockin = LockIn.__new__(LockIn)  # no device is needed to parse replies
+    for buffer in raw:
+        assert legacy.check_status(legacy.read_dev(buffer)) == lockin.check_status(buffer.tobytes())
+    old = timeit.timeit(lambda: [legacy.check_status(legacy.read_dev(buffer)) for buffer in raw], number=args.n)
+    new = timeit.timeit(lambda: [lockin.check_status(buffer.tobytes()) for buffer in raw], number=args.n)
+    reads = args.n * len(raw)
+    print('legacy parse: {:.2f} us per read'.format(old / reads * 1e6))
+    print('table parse:  {:.2f} us per read'.format(new / reads * 1e6))
+    print('speed up:     {:.1f}x'.format(old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""End to end throughput of the measurements, run against the simulated instruments in optics.hardware_control.sim.
+Every case runs a small measurement (thermovoltage and heating maps, an IV sweep, a raman time series and an
+electromigration) and reports pixels, points or spectra per second. A second, profiled run splits the time between
+instrument I/O, conversions, file writes, rendering, waiting in the event loop (tk_sleep, settling) and everything else.
+
+The measurements run headless: their master is a sim.headless.HeadlessMaster and their figures are drawn with Agg
+through sim.headless.HeadlessCanvas, so no display or tk root is needed. Cases that cannot run here (DAQBreak needs
+scipy) are reported and skipped.
+
+--save writes the results to benchmarks/results/<commit>.json, and --compare <commit> prints the change in throughput
+against the results saved for that commit, flagging drops of more than 10%.
+
+usage, from the repository: python -m benchmarks.measurements [case ...] [-r repeat] [--save] [--compare commit]"""
+import argparse
+import contextlib
+import cProfile
+import csv
+import glob
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections import defaultdict
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot
+from optics.hardware_control import hardware_addresses_and_constants as hw
+from optics.hardware_control.instrument_worker import InstrumentWorker
+from optics.hardware_control.sim import daq, npc3sg, pm100d, polarizercontroller, sr7270
+from optics.hardware_control.sim.headless import HeadlessMaster, HeadlessCanvas
+from optics.hardware_control.sim.ccd_controller import CCDController2
+from optics.hardware_control.sim.sample import Sample
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(REPOSITORY, 'benchmarks', 'results')
+CATEGORIES = ['instrument I/O', 'conversions', 'file writes', 'rendering', 'waiting', 'other']
+
+
+@contextlib.contextmanager
+def agg_backend():
+    """Keeps matplotlib on Agg while the cases run. The measurement modules pick their interactive backend with
+    matplotlib.use when they are imported. The matplotlib they were written for ignored that once pyplot was loaded;
+    newer versions switch backend, which fails without a display"""
+    use = matplotlib.use
+    matplotlib.use = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        matplotlib.use = use
+
+
+@contextlib.contextmanager
+def instruments(sample):
+    """The instruments of main_lockin_gui.main, on the simulated sample, with 1 ms lock in time constants so the
+    settling does not dominate"""
+    with contextlib.ExitStack() as cm:
+        npc3sg_x = cm.enter_context(daq.create_ao_task(hw.ao_x, sample=sample))
+        npc3sg_y = cm.enter_context(daq.create_ao_task(hw.ao_y, sample=sample))
+        continuous_ai = cm.enter_context(daq.create_continuous_ai_task([hw.ai_switch, hw.ai_dc1, hw.ai_dc2, hw.ai_x,
+                                                                        hw.ai_y], sample=sample))
+        lock_ins = {lock_in.check_reference_mode(): lock_in
+                    for lock_in in cm.enter_context(sr7270.create_endpoints(sample=sample))}
+        lock_ins[0.0].change_tc(1e-3)
+        lock_ins[1.0].change_tc(1e-3, channel=1)
+        lock_ins[1.0].change_tc(1e-3, channel=2)
+        yield dict(npc3sg_x=npc3sg_x, npc3sg_y=npc3sg_y,
+                   npc3sg_input=npc3sg.continuous_input(continuous_ai, [hw.ai_x, hw.ai_y]),
+                   sr7270_single_reference=lock_ins[0.0], sr7270_dual_harmonic=lock_ins[1.0],
+                   powermeter=cm.enter_context(pm100d.connect(sample=sample)),
+                   waveplate=cm.enter_context(polarizercontroller.connect_kdc101(waveplate=True, sample=sample)),
+                   daq_switch_ai=daq.AnalogInput(daq.AnalogInputView(continuous_ai, hw.ai_switch, fresh=True), sleep=0),
+                   daq_switch_ao=cm.enter_context(daq.create_ao_task(hw.ao_switch, sample=sample)))
+
+
+def thermovoltage_map(master, filepath, sample, size=10):
+    from optics.thermovoltage_measurement.thermovoltage_map import ThermovoltageScan
+    with instruments(sample) as i:
+        ThermovoltageScan(master, filepath, '', 'benchmark', 0, 1000, size, size, 20, 20, 80, 80, i['npc3sg_x'],
+                          i['npc3sg_y'], i['npc3sg_input'], i['sr7270_single_reference'], i['powermeter'],
+                          i['waveplate'], canvas=HeadlessCanvas).main()
+    return size * size, 'pixels'
+
+
+def heating_map(master, filepath, sample, size=10):
+    from optics.heating_measurement.heating_map import HeatingScan
+    with instruments(sample) as i:
+        HeatingScan(master, filepath, '', 'benchmark', 0, 1000, 10, 5, size, size, 20, 20, 80, 80, i['npc3sg_x'],
+                    i['npc3sg_y'], i['npc3sg_input'], i['sr7270_dual_harmonic'], i['sr7270_single_reference'],
+                    i['powermeter'], i['waveplate'], canvas=HeadlessCanvas).main()
+    return size * size, 'pixels'
+
+
+def iv_sweep(master, filepath, sample, steps=21, scans=2):
+    from optics.current_vs_voltage.current_vs_voltage import CurrentVoltageSweep
+    with instruments(sample) as i:
+        CurrentVoltageSweep(master, filepath, '', 'benchmark', 0, 1000, 5, -100, 100, steps, 2,
+                            i['sr7270_dual_harmonic'], i['sr7270_single_reference'], 1, scans, 50,
+                            canvas=HeadlessCanvas).main()
+    return steps * scans, 'points'
+
+
+def raman_time(master, filepath, sample, spectra=10):
+    from optics.raman.raman_time import RamanTime
+    ccd = InstrumentWorker(lambda: CCDController2(sample, poll=0.01), 'ccd')
+    try:
+        with instruments(sample) as i:
+            RamanTime(master, ccd, 1200, 1, 785, 'cm^-1', 0.05, 1, True, False, False, 'benchmark', filepath, '', 0,
+                      0, spectra, 400, 600, i['waveplate'], i['powermeter'], i['npc3sg_input'],
+                      canvas=HeadlessCanvas).main()
+    finally:
+        ccd.close()
+    return spectra, 'spectra'
+
+
+def daq_break(master, filepath, sample):
+    from optics.electromigrate.daq_break import DAQBreak
+    sample.resistance = 50
+    with instruments(sample) as i:
+        run = DAQBreak(master, i['daq_switch_ao'], i['daq_switch_ai'], filepath, 'benchmark', desired_resistance=80,
+                       break_voltage=0.6, start_voltage=0.4, delta_voltage=0.005, canvas=HeadlessCanvas)
+        run.main()
+        while run._scheduler.running:  # main() only starts the measurement on the event loop
+            master.update()
+            time.sleep(0.001)
+    points = 0
+    for filename in glob.glob(os.path.join(filepath, '*.csv')):
+        with open(filename, newline='') as f:
+            rows = list(csv.reader(f))
+        points += len(rows) - next((n + 1 for n, row in enumerate(rows) if row[:1] == ['voltage']), len(rows))
+    return points, 'points'
+
+
+CASES = {'thermovoltage_map': thermovoltage_map, 'heating_map': heating_map, 'iv_sweep': iv_sweep,
+         'raman_time': raman_time, 'daq_break': daq_break}
+
+
+def run_case(case, profile=None):
+    """Runs a case on a new headless master and data directory. Returns the count, its unit and the seconds taken"""
+    master = HeadlessMaster()
+    with tempfile.TemporaryDirectory() as filepath, agg_backend():
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            count, unit = case(master, filepath, Sample())
+            return count, unit, time.perf_counter() - start
+        finally:
+            if profile:
+                profile.disable()
+            master.destroy()
+
+
+def category(function):
+    """The category of a profiled function, or None for builtins and libraries, whose time goes to their callers"""
+    filename, _, name = function
+    filename = filename.replace('\\', '/')
+    if name == 'tk_sleep' or (filename.endswith('sim/headless.py') and name == 'after'):
+        return 'waiting'
+    if filename.endswith('sim/headless.py'):
+        return None  # the event loop, whose callbacks are counted where they belong
+    if "'writerow'" in name or "'writerows'" in name or name.startswith("<method 'write' of '_io"):
+        return 'file writes'
+    if '/optics/hardware_control/' in filename:
+        return 'instrument I/O'
+    if filename.endswith(('optics/misc_utility/conversions.py', 'optics/raman/unit_conversions.py')):
+        return 'conversions'
+    if '/optics/storage/' in filename or filename.endswith(('optics/measurements/checkpoint.py',
+                                                            'optics/raman/spectrum_store.py')):
+        return 'file writes'
+    if any(part in filename for part in ('/matplotlib/', '/tkinter/', '/PIL/', '/optics/thermovoltage_plot/',
+                                         '/optics/heating_plot/', 'optics/misc_utility/tkinter_utilities.py')):
+        return 'rendering'
+    if filename.startswith(REPOSITORY):
+        return 'other'
+    return None
+
+
+def split(stats):
+    """Splits the time of every function in stats (pstats.Stats.stats) between the categories. Functions without one
+    share their own time out between their callers, in proportion to the time spent in them from each caller"""
+    shares = {}
+
+    def share(function):
+        if function not in shares:
+            shares[function] = {'other': 1.0}  # stands in while working out the callers, for recursion
+            own = category(function)
+            if own:
+                shares[function] = {own: 1.0}
+            else:
+                total = defaultdict(float)
+                callers = stats[function][4]
+                weights = sum(c[3] for c in callers.values())
+                for caller, (_, _, _, cumulative) in callers.items():
+                    if caller in stats and weights:
+                        for name, fraction in share(caller).items():
+                            total[name] += fraction * cumulative / weights
+                shares[function] = dict(total) or {'other': 1.0}
+        return shares[function]
+
+    seconds = dict.fromkeys(CATEGORIES, 0.0)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    for function, (_, _, own_time, _, _) in stats.items():
+        for name, fraction in share(function).items():
+            seconds[name] += own_time * fraction
+    total = sum(seconds.values()) or 1.0
+    return dict((name, value / total) for name, value in seconds.items())
+
+
+def commit(revision='HEAD'):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', revision], cwd=REPOSITORY,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return revision
+
+
+def compare(results, revision):
+    filename = os.path.join(RESULTS, '{}.json'.format(commit(revision)))
+    if not os.path.exists(filename):
+        print('no saved results for {} ({})'.format(revision, filename))
+        return
+    with open(filename) as f:
+        baseline = json.load(f)
+    print('\ncompared with {} ({}):'.format(baseline['commit'], baseline['date']))
+    for name, result in results.items():
+        if name not in baseline['cases']:
+            continue
+        ratio = result['rate'] / baseline['cases'][name]['rate']
+        print('{:<18} {:8.2f} -> {:8.2f} {}/s  x{:.2f}{}'.format(name, baseline['cases'][name]['rate'], result['rate'],
+                                                               result['unit'], ratio,
+                                                               '  REGRESSION' if ratio < 0.9 else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('cases', nargs='*', help='the cases to run, of {} (all by default)'.format(', '.join(CASES)))
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='timed runs of every case, the fastest is kept')
+    parser.add_argument('--save', action='store_true', help='save the results for the current commit')
+    parser.add_argument('--compare', metavar='commit', help='compare with the results saved for a commit')
+    args = parser.parse_args()
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error('unknown cases: {}'.format(', '.join(unknown)))
+    results = {}
+    for name in args.cases or CASES:
+        try:
+            runs = [run_case(CASES[name]) for _ in range(args.repeat)]
+            count, unit, seconds = min(runs, key=lambda run: run[2])
+            profile = cProfile.Profile()
+            run_case(CASES[name], profile)
+            fractions = split(pstats.Stats(profile).stats)
+        except Exception as err:
+            print('{:<18} skipped: {}'.format(name, traceback.format_exception_only(type(err), err)[-1].strip()))
+            continue
+        results[name] = dict(count=count, unit=unit, seconds=seconds, rate=count / seconds, split=fractions)
+        print('{:<18} {:5d} {} in {:6.2f} s: {:8.2f} {}/s | {}'.format(
+            name, count, unit, seconds, count / seconds, unit,
+            ', '.join('{} {:.0f}%'.format(category_name, fractions[category_name] * 100)
+                      for category_name in CATEGORIES)))
+    if args.save and results:
+        os.makedirs(RESULTS, exist_ok=True)
+        filename = os.path.join(RESULTS, '{}.json'.format(commit()))
+        with open(filename, 'w') as f:
+            json.dump(dict(commit=commit(), date=time.strftime('%Y-%m-%d %H:%M:%S'), python=platform.python_version(),
+                           cases=results), f, indent=2)
+        print('saved to {}'.format(filename))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,26 +4,33 @@ matplotlib.use('TkAgg')
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg)
 from matplotlib.figure import Figure
 import numpy as np
-import csv
 import os
 from os import path
 import tkinter as tk
 from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.hardware_control import sr7270
+from optics.measurements.settle import lockin_settle
+from optics.storage.writer import open_writer, extension
+from optics.thermovoltage_plot.live_image import LiveImage
+from optics.misc_utility.running_stats import RunningStats
+from optics.current_vs_voltage.sweep_average import SweepAverage
+from optics.current_vs_voltage.live_sweep import LiveSweepPlots
 from optics.misc_utility.conversions import convert_x_to_iphoto, convert_x1_to_didv, convert_x2_to_d2idv2, \
     convert_adc_to_idc, normalize_iets_from_x1, normalize_iets_from_didv, differentiate_d2idv2
 import pandas as pd
 import time
 
 
-class CurrentVoltageGateSweep:
+class CurrentVoltageGateSweep(LiveSweepPlots):
     def __init__(self, master, filepath, notes, device, index, gain, osc, start_voltage, stop_voltage, steps,
                  number_measurements, sr7270_dual_harmonic, sr7270_single_reference, wait_time_ms, scans, tick_spacing,
-                 keithley, min_gate, max_gate, gate_steps):
+                 keithley, min_gate, max_gate, gate_steps, settle='fixed', file_format='csv'):
         self._master = master
         self._filepath = filepath
         self._notes = notes
         self._device = device
         self._index = index
+        self._file_format = file_format
         self._gain = gain
         self._osc = osc / 1000
         self._number_measurements = number_measurements
@@ -102,6 +109,9 @@ class CurrentVoltageGateSweep:
         self._wf_fig.tight_layout()
         self._wf_canvas.draw()
         self._wf_canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        self._live = {im: LiveImage(self._wf_canvas, im) for im in [self._im1, self._im2, self._im3, self._im4,
+                                                                     self._im5, self._im6]}
+        self._stats = {im: RunningStats([0]) for im in self._live}  # the waterfalls start as zeros
         self._didvx = []
         self._didvx = []
         self._didvy = []
@@ -119,12 +129,14 @@ class CurrentVoltageGateSweep:
         self._time_constant = np.amax([self._sr7270_dual_harmonic.read_tc(),
                                        self._sr7270_dual_harmonic.read_tc(channel=2),
                                        self._sr7270_single_reference.read_tc()])
+        self._settle = lockin_settle(self._master, self._sr7270_dual_harmonic, settle, self._time_constant,
+                                     channels=(1, 2))
         self._wait_time_ms = wait_time_ms
         self._scans = scans
         self._tick_spacing = tick_spacing
-        self._averaged_data_frame = pd.DataFrame(columns=['voltage', 'idc', 'didvx', 'didvy', 'd2idvx2', 'd2idvy2',
-                                                          'iphotox', 'iphotoy', 'iets_normalized', 'iets_normalized_y',
-                                                          'diff d2idvx2', 'diff d2idvy2'])
+        self._average = None  # the scans of the current gate
+        self._file_index = None
+        super().__init__(self._master)
         self._keithley = keithley
         self._keithley.reset()
         self._keithley.enable_output()
@@ -197,17 +209,20 @@ class CurrentVoltageGateSweep:
         os.makedirs(self._averaged_filepath, exist_ok=True)
 
     def makefile(self, scan):
-        index = self._index
-        self._averaged_filename = path.join(self._averaged_filepath, '{}_{}_{}_{}_{}{}'.format(self._device, 'gate',
-                                                                                               self._gate,
-                                                                                               'total averaged IV sweep',
-                                                                                               index, '.csv'))
-        while path.exists(self._averaged_filename):
-            index += 1
-            self._averaged_filename = path.join(self._averaged_filepath, '{}_{}_{}_{}_{}{}'.format(self._device, 'gate',
-                                                                                                   self._gate,
-                                                                                                   'total averaged IV sweep',
-                                                                                                   index, '.csv'))
+        file_extension = extension(self._file_format)
+        if scan == 1:  # the first scan of a gate picks the index, the averaged file is rewritten after every scan
+            index = self._index
+            self._averaged_filename = path.join(self._averaged_filepath,
+                                                '{}_{}_{}_{}_{}{}'.format(self._device, 'gate', self._gate,
+                                                                          'total averaged IV sweep', index, '.csv'))
+            while path.exists(self._averaged_filename):
+                index += 1
+                self._averaged_filename = path.join(self._averaged_filepath,
+                                                    '{}_{}_{}_{}_{}{}'.format(self._device, 'gate', self._gate,
+                                                                              'total averaged IV sweep', index,
+                                                                              '.csv'))
+            self._file_index = index
+        index = self._file_index
         raw_filepath = path.join(self._raw_filepath, '{}_{}_{}_{}_{}'.format(self._device, 'gate', self._gate, 'raw scans', index))
         os.makedirs(raw_filepath, exist_ok=True)
         sweep_filepath = path.join(self._averaged_filepath, '{}_{}_{}_{}_{}'.format(self._device, 'gate', self._gate, 'individual scans', index))
@@ -215,12 +230,12 @@ class CurrentVoltageGateSweep:
         self._filename = path.join(raw_filepath, '{}_{}_{}_{}_{} {} {} {}_{}{}'.format(self._device, 'gate', self._gate,
                                                                                        'raw IV sweep', 'scan',
                                                                                        scan, 'of', self._scans, index,
-                                                                                       '.csv'))
+                                                                                       file_extension))
         self._sweep_filename = path.join(sweep_filepath,
                                          '{}_{}_{}_{}_{} {} {} {}_{}{}'.format(self._device, 'gate', self._gate,
                                                                                'averaged IV sweep',
                                                                                'scan', scan, 'of',
-                                                                               self._scans, index, '.csv'))
+                                                                               self._scans, index, file_extension))
         self._imagefile = path.join(sweep_filepath,
                                     '{}_{}_{}_{}_{} {} {} {}_{}{}'.format(self._device, 'gate', self._gate, 'IV sweep',
                                                                           'scan',
@@ -233,12 +248,12 @@ class CurrentVoltageGateSweep:
             index += 1
             self._filename = path.join(self._raw_filepath, '{}_{}_{} {} {} {}_{}{}'.format(self._device, 'raw IV sweep',
                                                                                        'scan', scan, 'of',
-                                                                                       self._scans, index, '.csv'))
+                                                                                       self._scans, index, file_extension))
             self._sweep_filename = path.join(self._averaged_filepath, '{}_{}_{} {} {} {}_{}{}'.format(self._device,
                                                                                              'averaged IV sweep',
                                                                                              'scan', scan, 'of',
                                                                                              self._scans, index,
-                                                                                             '.csv'))
+                                                                                             file_extension))
             self._imagefile = path.join(self._raw_filepath, '{}_{}_{} {} {} {}_{}{}'.format(self._device, 'IV sweep',
                                                                                         'scan', scan, 'of',
                                                                                         self._scans, index, '.png'))
@@ -271,7 +286,6 @@ class CurrentVoltageGateSweep:
             i[0].set_ylabel(i[1], color=i[2])
             i[0].tick_params(axis='y', labelcolor=i[2])
             i[0].plot([i for i in self._voltages], [0 for i in self._voltages], c=i[2], linestyle='--', linewidth=0.5)
-            i[0].ticklabel_format(axis='1', style='sci', scilimits=(-3, 3))
             if self._voltages[0] < self._voltages[-1]:
                 [i[0].axvline(x=q / 1000, color='k', linestyle='--', linewidth=0.5) for q in
                  range(int(self._voltages[0] * 1000), int(self._voltages[-1] * 1000)) if q % self._tick_spacing == 0]
@@ -306,12 +320,11 @@ class CurrentVoltageGateSweep:
         self._diff_d2idvx2 = []
         self._diff_d2idvy2 = []
 
-    def update_plot(self, im, data):
-        im.set_data(data)
-        im.set_clim(vmin=np.amin(data))
-        im.set_clim(vmax=np.amax(data))
+    def update_plot(self, im, data, row):
+        self._stats[im].add(data[row])
+        self._live[im].update(data, self._stats[im].min, self._stats[im].max)
 
-    def measure(self):
+    def sweep(self, scan):
         for i, j in enumerate(self._voltages):
             if self._abort:
                 break
@@ -319,7 +332,7 @@ class CurrentVoltageGateSweep:
             j = np.round(j * 1000, 0)
             vdc = j / 1000
             self._sr7270_dual_harmonic.change_applied_voltage(j)
-            tk_sleep(self._master, self._time_constant)  # three times the largest time constant
+            self._settle(lambda: self._sr7270_dual_harmonic.query_many(['xy1.', 'xy2.']))  # both harmonics
             if self._abort:
                 break
             xy1 = []
@@ -327,10 +340,14 @@ class CurrentVoltageGateSweep:
             xy = []
             adc = []
             for k in range(self._number_measurements):
-                xy.append(self._sr7270_single_reference.read_xy())
-                xy1.append(self._sr7270_dual_harmonic.read_xy1())
-                xy2.append(self._sr7270_dual_harmonic.read_xy2())
-                adc.append(self._sr7270_dual_harmonic.read_adc(3))
+                _, xy_k, xy1_k, xy2_k, adc_k = sr7270.read_all([(self._sr7270_single_reference, 'xy.'),
+                                                                 (self._sr7270_dual_harmonic, 'xy1.'),
+                                                                 (self._sr7270_dual_harmonic, 'xy2.'),
+                                                                 (self._sr7270_dual_harmonic, 'adc. 3')])
+                xy.append(xy_k)
+                xy1.append(xy1_k)
+                xy2.append(xy2_k)
+                adc.append(adc_k)
                 tk_sleep(self._master, self._wait_time_ms)
                 self._writer.writerow([vdc, adc[k][0], xy[k][0], xy[k][1], xy1[k][0], xy1[k][1], xy2[k][0], xy2[k][1],
                                        convert_adc_to_idc(adc[k][0], self._gain),
@@ -356,27 +373,15 @@ class CurrentVoltageGateSweep:
             self._idc.append(convert_adc_to_idc(np.average([k[0] for k in adc]), self._gain))
             self._iets_normalized.append(normalize_iets_from_didv(self._didvx[i], self._d2idvx2[i]))
             self._iets_normalized_y.append(normalize_iets_from_didv(self._didvy[i], self._d2idvy2[i]))
-            self._averaged_data_frame.loc[len(self._averaged_data_frame)] = [vdc, self._idc[-1], self._didvx[-1],
-                                                                             self._didvy[-1],
-                                                                             self._d2idvx2[-1], self._d2idvy2[-1],
-                                                                             self._iphotox[-1],
-                                                                             self._iphotoy[-1],
-                                                                             self._iets_normalized[-1], self._iets_normalized_y[-1],
-                                                                             self._diff_d2idvx2[
-                                                                                 -1] if self._diff_d2idvx2 else 0,
-                                                                             self._diff_d2idvy2[
-                                                                                 -1] if self._diff_d2idvy2 else 0]
-            self._ax1.plot(vdc, self._idc[i], linestyle='', color='blue', marker='o', markersize=2)
-            self._ax2.plot(vdc, self._didvx[i], linestyle='', color='blue', marker='o', markersize=2)
-            self._ax2_twin.plot(vdc, self._didvy[i], linestyle='', color='red', marker='o', markersize=2)
-            self._ax3.plot(vdc, self._d2idvx2[i], linestyle='', color='blue', marker='o', markersize=2)
-            self._ax3_twin.plot(vdc, self._d2idvy2[i], linestyle='', color='red', marker='o', markersize=2)
-            self._ax4.plot(vdc, self._iets_normalized[i], linestyle='', color='blue', marker='o', markersize=2)
-            self._ax4_twin.plot(vdc, self._iphotox[i], linestyle='', color='red', marker='o', markersize=2)
+            self._average.add(scan, vdc, [self._idc[-1], self._didvx[-1], self._didvy[-1], self._d2idvx2[-1],
+                                          self._d2idvy2[-1], self._iphotox[-1], self._iphotoy[-1],
+                                          self._iets_normalized[-1], self._iets_normalized_y[-1],
+                                          self._diff_d2idvx2[-1] if self._diff_d2idvx2 else 0,
+                                          self._diff_d2idvy2[-1] if self._diff_d2idvy2 else 0])
+            self.add_point(i, vdc, [self._idc[i], self._didvx[i], self._didvy[i], self._d2idvx2[i], self._d2idvy2[i],
+                                    self._iets_normalized[i], self._iphotox[i],
+                                    self._diff_d2idvx2[-1] if i >= 1 else np.nan])
             if i >= 1:
-                self._ax5.plot(vdc, differentiate_d2idv2(self._didvx[i], self._didvx[i - 1]), linestyle='',
-                               color='blue',
-                               marker='o', markersize=2)
                 self._sweep_writer.writerow([vdc, adc[-1][0], xy[-1][0], xy[-1][1], xy1[-1][0], xy1[-1][1], xy2[-1][0],
                                              xy2[-1][1], self._idc[i], self._didvx[i], self._didvy[i], self._d2idvx2[i],
                                              self._d2idvy2[i], self._iets_normalized[i], self._iphotox[i],
@@ -387,8 +392,6 @@ class CurrentVoltageGateSweep:
                                              xy2[-1][1], self._idc[i], self._didvx[i], self._didvy[i], self._d2idvx2[i],
                                              self._d2idvy2[i], self._iets_normalized[i], self._iphotox[i],
                                              self._iphotoy[i], vdc / self._idc[i], 1 / self._didvx[i]])
-            self._fig.tight_layout()
-            self._fig.canvas.draw()
 
     def close(self):
         self.abort()
@@ -406,20 +409,25 @@ class CurrentVoltageGateSweep:
                 break
             self._gate = gate
             self._keithley.set_voltage(gate)
+            self._average = SweepAverage(self._voltages, ['idc', 'didvx', 'didvy', 'd2idvx2', 'd2idvy2', 'iphotox',
+                                                          'iphotoy', 'iets_normalized', 'iets_normalized_y',
+                                                          'diff d2idvx2', 'diff d2idvy2'], self._scans)
             for scan in range(1, self._scans + 1):
                 #self._voltages = np.flip(self._voltages, axis=0)
                 self.makefile(scan)
-                with open(self._filename, 'w', newline='') as inputfile, open(self._sweep_filename, 'w', newline='') as fin:
+                with open_writer(self._filename, self._file_format) as self._writer, \
+                        open_writer(self._sweep_filename, self._file_format) as self._sweep_writer:
                     try:
                         self._sr7270_dual_harmonic.change_oscillator_amplitude(self._osc * 1000)
                         tk_sleep(self._master, 300)
-                        self._writer = csv.writer(inputfile)
-                        self._sweep_writer = csv.writer(fin)
                         self.write_header()
                         self.setup_plots()
                         self._ax1.set_title('Scan {} of {}, Gate = {} V'.format(scan, self._scans, self._gate))
-                        self.measure()
+                        if len(self._average):
+                            self.plot_average(alpha=0.3)  # the previous scans, faded
+                        self.measure(scan)
                         self._fig.savefig(self._imagefile, format='png', bbox_inches='tight')
+                        self._average.frame().to_csv(self._averaged_filename)
                         self._canvas.get_tk_widget().destroy()
                         self.reset_values()
                     except ValueError as err:
@@ -429,30 +437,8 @@ class CurrentVoltageGateSweep:
             self._sr7270_dual_harmonic.change_applied_voltage(0)
             self.setup_plots()
             self._ax1.set_title('Average of {} scans, Gate = {} V'.format(self._scans, self._gate))
-            averaged_data = self._averaged_data_frame.groupby('voltage', as_index=False).mean()
-            self._ax1.plot(averaged_data['voltage'], averaged_data['idc'], linestyle='', color='blue', marker='o',
-                           markersize=2)
-            self._fig.canvas.draw()
-            self._ax2.plot(averaged_data['voltage'], averaged_data['didvx'], linestyle='', color='blue', marker='o',
-                           markersize=2)
-            self._fig.canvas.draw()
-            self._ax2_twin.plot(averaged_data['voltage'], averaged_data['didvy'], linestyle='', color='red', marker='o',
-                                markersize=2)
-            self._fig.canvas.draw()
-            self._ax3.plot(averaged_data['voltage'], averaged_data['d2idvx2'], linestyle='', color='blue', marker='o',
-                           markersize=2)
-            self._fig.canvas.draw()
-            self._ax3_twin.plot(averaged_data['voltage'], averaged_data['d2idvy2'], linestyle='', color='red', marker='o',
-                                markersize=2)
-            self._fig.canvas.draw()
-            self._ax4.plot(averaged_data['voltage'], averaged_data['iets_normalized'], linestyle='', color='blue',
-                           marker='o', markersize=2)
-            self._fig.canvas.draw()
-            self._ax4_twin.plot(averaged_data['voltage'], averaged_data['iphotox'], linestyle='', color='red', marker='o',
-                                markersize=2)
-            self._fig.canvas.draw()
-            self._ax5.plot(averaged_data['voltage'], averaged_data['diff d2idvx2'], linestyle='', color='blue', marker='o',
-                           markersize=2)
+            averaged_data = self._average.frame()
+            self.plot_average()
             self._fig.tight_layout()
             self._fig.canvas.draw()
             self._fig.savefig(self._averaged_imagefile, format='png', bbox_inches='tight')
@@ -466,13 +452,12 @@ class CurrentVoltageGateSweep:
             self._wf_5[n] = averaged_data['iets_normalized']
             self._wf_6[n] = averaged_data['iets_normalized_y']
             self._v = averaged_data['voltage']
-            self.update_plot(self._im1, self._wf_1)
-            self.update_plot(self._im2, self._wf_2)
-            self.update_plot(self._im3, self._wf_3)
-            self.update_plot(self._im4, self._wf_4)
-            self.update_plot(self._im5, self._wf_5)
-            self.update_plot(self._im6, self._wf_6)
-            self._wf_canvas.draw()
+            self.update_plot(self._im1, self._wf_1, n)
+            self.update_plot(self._im2, self._wf_2, n)
+            self.update_plot(self._im3, self._wf_3, n)
+            self.update_plot(self._im4, self._wf_4, n)
+            self.update_plot(self._im5, self._wf_5, n)
+            self.update_plot(self._im6, self._wf_6, n)
             self._master.update()
         self._wf_fig.savefig(self._wf_imagefile, format='png', bbox_inches='tight')
         for i in [(self._wf_1, self._wf_didvx_file), (self._wf_2, self._wf_didvy_file), (self._wf_3, self._wf_d2idvx2_file),
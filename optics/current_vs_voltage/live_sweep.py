@@ -0,0 +1,72 @@
+from optics.misc_utility.tkinter_utilities import RenderTick
+from optics.misc_utility.running_stats import RunningStats
+import numpy as np
+
+
+class LiveSweepPlots:
+    """The live plots of the IV sweeps: one line per plotted quantity, filled in point by point during a sweep and
+    handed to matplotlib by a RenderTick at most frame_rate times a second, over the average of the previous scans.
+
+    Subclasses set up the axes of plot_axes, _canvas, _average (a SweepAverage) and _voltages, call add_point for
+    every voltage from sweep(scan), and run a sweep with measure(scan)."""
+    def __init__(self, master, frame_rate=5):
+        self._traces = []  # (axes, line, RunningStats) of every plotted quantity
+        self._trace_voltage = None
+        self._trace_values = None
+        self._points = 0
+        self._rendered = 0
+        self._render_tick = RenderTick(master, self.render, frame_rate=frame_rate)
+
+    def plot_axes(self):
+        return [(self._ax1, 'idc', 'blue'), (self._ax2, 'didvx', 'blue'), (self._ax2_twin, 'didvy', 'red'),
+                (self._ax3, 'd2idvx2', 'blue'), (self._ax3_twin, 'd2idvy2', 'red'),
+                (self._ax4, 'iets_normalized', 'blue'), (self._ax4_twin, 'iphotox', 'red'),
+                (self._ax5, 'diff d2idvx2', 'blue')]
+
+    def plot_average(self, alpha=1.0):
+        """Plots the average of the scans so far, with the standard error as error bars"""
+        averaged_data = self._average.frame()
+        for ax, column, color in self.plot_axes():
+            ax.errorbar(averaged_data['voltage'], averaged_data[column],
+                        yerr=averaged_data['{} stderr'.format(column)], linestyle='', color=color, marker='o',
+                        markersize=2, elinewidth=0.5, alpha=alpha)
+
+    def setup_traces(self):
+        """Adds one line per plotted quantity, whose data is filled in point by point during the sweep"""
+        self._trace_voltage = np.full(len(self._voltages), np.nan)
+        self._trace_values = np.full((len(self._voltages), len(self.plot_axes())), np.nan)
+        self._points = 0
+        self._rendered = 0
+        averaged_data = self._average.frame()
+        self._traces = []
+        for ax, column, color in self.plot_axes():
+            line, = ax.plot([], [], linestyle='', color=color, marker='o', markersize=2)
+            self._traces.append((ax, line, RunningStats([0, *averaged_data[column]])))  # the zero line and average
+
+    def add_point(self, i, vdc, values):
+        self._trace_voltage[i] = vdc
+        self._trace_values[i] = values
+        for (_, _, stats), value in zip(self._traces, values):
+            stats.add(value)
+        self._points = i + 1
+
+    def render(self):
+        """Hands the points measured so far to the lines and rescales the y axes, at most frame_rate times a second"""
+        if self._points == self._rendered:
+            return
+        self._rendered = self._points
+        for k, (ax, line, stats) in enumerate(self._traces):
+            line.set_data(self._trace_voltage[:self._points], self._trace_values[:self._points, k])
+            if stats.max > stats.min:
+                margin = 0.05 * (stats.max - stats.min)
+                ax.set_ylim(stats.min - margin, stats.max + margin)
+        self._canvas.draw_idle()
+
+    def measure(self, scan):
+        self.setup_traces()
+        self._render_tick.start()
+        try:
+            self.sweep(scan)
+        finally:
+            self._render_tick.stop()
+            self.render()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+def applied_voltages(voltages):
+    """The voltages a sweep actually applies, rounded to the mV like in measure, in ascending order"""
+    return np.unique(np.round(np.asarray(voltages) * 1000, 0) / 1000)
+
+
+class SweepAverage:
+    """Average of the points of repeated IV sweeps, kept up to date as every point comes in.
+
+    Every point is stored in a structured array preallocated for steps x scans points, and a running mean and sum of
+    squared deviations are kept for every voltage with Welford's algorithm, so the averaged curves and their standard
+    errors are available at any time instead of only from a groupby once all scans are done.
+
+    Usage: average = SweepAverage(voltages, ['idc', 'didvx'], scans)
+        average.add(scan, vdc, [idc, didvx])
+        average.frame(), one row per measured voltage with the mean and standard error of every column
+    """
+    def __init__(self, voltages, columns, scans):
+        self.voltage = applied_voltages(voltages)
+        self.columns = list(columns)
+        self._index = {voltage: i for i, voltage in enumerate(self.voltage)}
+        dtype = np.dtype([('scan', 'i4'), ('voltage', 'f8'), *[(column, 'f8') for column in self.columns]])
+        self.points = np.zeros(len(self.voltage) * scans, dtype=dtype)
+        self._length = 0
+        self.count = np.zeros(len(self.voltage), dtype=int)
+        self.mean = np.zeros((len(self.voltage), len(self.columns)))
+        self._squares = np.zeros((len(self.voltage), len(self.columns)))  # sum of squared deviations from the mean
+
+    def __len__(self):
+        return self._length
+
+    def add(self, scan, voltage, values):
+        values = np.asarray(values, dtype=float)
+        if self._length == len(self.points):
+            self.points = np.resize(self.points, 2 * len(self.points))  # a sweep longer than planned
+        self.points[self._length] = (scan, voltage, *values)
+        self._length += 1
+        i = self._index[voltage]
+        self.count[i] += 1
+        delta = values - self.mean[i]
+        self.mean[i] += delta / self.count[i]
+        self._squares[i] += delta * (values - self.mean[i])
+
+    def stderr(self):
+        """Standard error of the mean of every voltage and column, nan where there are fewer than two points"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = self._squares / (self.count[:, None] - 1)
+            return np.where(self.count[:, None] > 1, np.sqrt(variance / self.count[:, None]), np.nan)
+
+    def frame(self):
+        measured = self.count > 0
+        data = pd.DataFrame(self.mean[measured], columns=self.columns)
+        data.insert(0, 'voltage', self.voltage[measured])
+        stderr = self.stderr()[measured]
+        for i, column in enumerate(self.columns):
+            data['{} stderr'.format(column)] = stderr[:, i]
+        data['scans'] = self.count[measured]
+        return data
@@ -7,7 +7,8 @@ import os
 from itertools import count
 import csv
 from optics.misc_utility.conversions import convert_x_to_iphoto
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.measurements.scheduler import Scheduler
+from optics.misc_utility.tkinter_utilities import has_widgets
 import tkinter as tk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
@@ -15,7 +16,7 @@ from matplotlib.figure import Figure
 class DAQBreak:
     def __init__(self, master, ao, ai, filepath, device, steps=11, stop_voltage=0.05, desired_resistance=80,
                  break_voltage=1.5, passes=1, increase_break_voltage=True, delta_break_voltage=0.005, start_voltage=.1,
-                 delta_voltage=0.002, current_drop=50e-6, abort=False, gain=1000):
+                 delta_voltage=0.002, current_drop=50e-6, abort=False, gain=1000, canvas=FigureCanvasTkAgg):
         self._master = master
         # ready the device
         self._ao = ao
@@ -32,7 +33,7 @@ class DAQBreak:
         self._ax3.title.set_text('Percent of maximum current: ')
         self._ax3.set_xlim(0, 1)
         self._fig.tight_layout()
-        self._canvas = FigureCanvasTkAgg(self._fig, master=self._master)  # A tk.DrawingArea.
+        self._canvas = canvas(self._fig, master=self._master)  # A tk.DrawingArea.
         self._canvas.draw()
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self._ln = None
@@ -66,6 +67,7 @@ class DAQBreak:
         self._gain = gain
         self._current_break_voltage = self._break_voltage
         self._points = []
+        self._scheduler = Scheduler(self._master)
 
     def abort(self):
         self._abort = True
@@ -92,11 +94,10 @@ class DAQBreak:
         self._points = []
         values = np.zeros((self._steps+1, 2))
         for n, v in enumerate(np.linspace(0, self._stop_voltage, self._steps+1)):
-            self._master.update()
             self._ao.source_voltage(v)
             j = self.read_current()
             values[n] = v, j
-            tk_sleep(self._master, self._wait_time)
+            yield self._wait_time
             self._points.append(self._ax1.plot(v, j, linestyle='', color='blue', marker='o', markersize=5))
             self._ax1.set_ylim(np.amin(values[:, 1]) * 0.9, np.amax(values[:, 1]) * 1.1)
             self._ax1.title.set_text('Measuring resistance\nCurrent resistance: %s ohms' % np.ceil(v / j))
@@ -109,7 +110,6 @@ class DAQBreak:
         self._ln, = self._ax1.plot(linspace, linear(linspace, m, b))
         self._ax1.title.set_text('Measured resistance: %s ohms\n ' % np.ceil(self._sweep_resistance))
         self._fig.canvas.draw()
-        self._master.update()
         self.check_status()
 
     def check_status(self):
@@ -141,76 +141,81 @@ class DAQBreak:
             return False
 
     def ramp_voltage(self):
-        currents = []
-        voltages = []
-        points = []
-        for n, v in enumerate(np.arange(self._start_voltage, self._current_break_voltage, self._delta_voltage)):
-            self._master.update()
-            if self._abort:
-                break
-            self._ao.source_voltage(v)
-            i = self.read_current()
-            self._writer.writerow([v, i, v/i])
-            voltages.append(v)
-            currents.append(i)
-            percent_max = i / np.amax(currents)
-            points.append(self._ax2.plot(v, i, linestyle='', color='blue', marker='o', markersize=5))
-            self._ax2.title.set_text('Breaking junction\nCurrent resistance: %s ohms' % np.ceil(v / i))
-            bar = self._ax3.barh(1, percent_max, 0.35, color='cyan')
-            self._ax3.title.set_text('Percent of maximum current: %s %%' % np.ceil(percent_max * 100))
-            self._canvas.draw()
-            bar.remove()
-            if v / i > self._desired_resistance:
-                break
-            if n > 1:
-                if i < currents[n - 1] - self._current_drop:
-                    self._current_dropped = True
-                    print('current dropped')
+        """Ramps the voltage up to the break voltage, raising it after every pass, until the junction breaks or
+        the desired resistance is reached"""
+        while True:
+            currents = []
+            voltages = []
+            points = []
+            for n, v in enumerate(np.arange(self._start_voltage, self._current_break_voltage, self._delta_voltage)):
+                yield
+                if self._abort:
                     break
-        if len(currents) > 3:
-            linspace = np.linspace(self._start_voltage, self._current_break_voltage, 100)
-            #m, _ = proportional_fit(voltages, currents)
-            m, b, _, _ = linear_fit(voltages, currents)
-            self._sweep_resistance = 1 / m
-            #ln, = self._ax2.plot(linspace, proportional(linspace, m))
-            ln, = self._ax2.plot(linspace, linear(linspace, m, b))
-            self._ax2.title.set_text('Breaking resistance: %s ohms\n ' % np.ceil(self._sweep_resistance))
-            self._fig.canvas.draw()
-            self._ao.source_voltage(0)
-            tk_sleep(self._master, 250)
-            ln.remove()
-        [x[0].remove() for x in points]
-        if self._increase_break_voltage:
-            self._current_break_voltage += self._delta_break_voltage
-        self._master.update()
-        if self.continue_breaking():
-            self.ramp_voltage()
+                self._ao.source_voltage(v)
+                i = self.read_current()
+                self._writer.writerow([v, i, v/i])
+                voltages.append(v)
+                currents.append(i)
+                percent_max = i / np.amax(currents)
+                points.append(self._ax2.plot(v, i, linestyle='', color='blue', marker='o', markersize=5))
+                self._ax2.title.set_text('Breaking junction\nCurrent resistance: %s ohms' % np.ceil(v / i))
+                bar = self._ax3.barh(1, percent_max, 0.35, color='cyan')
+                self._ax3.title.set_text('Percent of maximum current: %s %%' % np.ceil(percent_max * 100))
+                self._canvas.draw()
+                bar.remove()
+                if v / i > self._desired_resistance:
+                    break
+                if n > 1:
+                    if i < currents[n - 1] - self._current_drop:
+                        self._current_dropped = True
+                        print('current dropped')
+                        break
+            if len(currents) > 3:
+                linspace = np.linspace(self._start_voltage, self._current_break_voltage, 100)
+                #m, _ = proportional_fit(voltages, currents)
+                m, b, _, _ = linear_fit(voltages, currents)
+                self._sweep_resistance = 1 / m
+                #ln, = self._ax2.plot(linspace, proportional(linspace, m))
+                ln, = self._ax2.plot(linspace, linear(linspace, m, b))
+                self._ax2.title.set_text('Breaking resistance: %s ohms\n ' % np.ceil(self._sweep_resistance))
+                self._fig.canvas.draw()
+                self._ao.source_voltage(0)
+                yield 250
+                ln.remove()
+            [x[0].remove() for x in points]
+            if self._increase_break_voltage:
+                self._current_break_voltage += self._delta_break_voltage
+            if not self.continue_breaking():
+                return
 
     def break_junction(self):
-        self._current_break_voltage = self._break_voltage
-        self.ramp_voltage()
-        if not self.continue_breaking():
-            self._fig.savefig(self._filename + '%s.png' % next(self._c), format='png', bbox_inches='tight')
-        self._master.update()
-        if self.continue_breaking():
-            self.break_junction()
+        while True:
+            self._current_break_voltage = self._break_voltage
+            yield from self.ramp_voltage()
+            if not self.continue_breaking():
+                self._fig.savefig(self._filename + '%s.png' % next(self._c), format='png', bbox_inches='tight')
+                return
 
     def measure(self):
-        with open(self._filename + '%s.csv' % next(self._j), 'w', newline='') as inputfile, \
-                open(self._filename + '%s sweep resistance.csv' % next(self._k), 'w', newline='') as fin:
-            self._writer = csv.writer(inputfile)
-            self._sweep_writer = csv.writer(fin)
-            self.write_header()
-            self.measure_resistance()
-            self.break_junction()
-        self.measure()
+        while True:  # until check_status raises NameError
+            with open(self._filename + '%s.csv' % next(self._j), 'w', newline='') as inputfile, \
+                    open(self._filename + '%s sweep resistance.csv' % next(self._k), 'w', newline='') as fin:
+                self._writer = csv.writer(inputfile)
+                self._sweep_writer = csv.writer(fin)
+                self.write_header()
+                yield from self.measure_resistance()
+                yield from self.break_junction()
 
-    def main(self):
-        button = tk.Button(master=self._master, text="Abort", command=self.abort)
-        button.pack(side=tk.BOTTOM)
+    def run(self):
         try:
-            self.measure()
+            yield from self.measure()
         except NameError:
             print(self._message)
             print('Final resistance: %s ohms' % np.ceil(self._sweep_resistance))
             self._ao.source_voltage(0)
+
+    def main(self):
+        if has_widgets(self._master):
+            button = tk.Button(master=self._master, text="Abort", command=self.abort)
+            button.pack(side=tk.BOTTOM)
+        self._scheduler.start(self.run())
@@ -9,7 +9,7 @@ import csv
 import tkinter as tk
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg)
 from matplotlib.figure import Figure
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.measurements.scheduler import Scheduler
 
 
 class KeithleyBreak:
@@ -69,6 +69,7 @@ class KeithleyBreak:
         self._pass = count(0)
         self._points = []
         self._current_break_voltage = self._break_voltage
+        self._scheduler = Scheduler(self._master)
 
     def abort(self):
         self._abort = True
@@ -77,11 +78,10 @@ class KeithleyBreak:
         values = np.zeros((self._steps+1, 2))
         self._points = []
         for n, i in enumerate(np.linspace(0, self._stop_voltage, self._steps+1)):
-            self._master.update()
             self._sourcemeter.set_voltage(i)
             v, j, _, _, _ = self._sourcemeter.read_points()
             values[n] = v, j
-            tk_sleep(self._master, self._wait_time)
+            yield self._wait_time
             self._points.append(self._ax1.plot(i, j, linestyle='', color='blue', marker='o', markersize=5))
             self._ax1.set_ylim(np.amin(values[:, 1]) * 0.9, np.amax(values[:, 1]) * 1.1)
             self._ax1.title.set_text('Measuring resistance\nCurrent resistance: %s ohms' % np.ceil(i / j))
@@ -125,13 +125,13 @@ class KeithleyBreak:
             raise NameError
 
     def ramp_voltage(self):
-        if not self._abort:
-            self._master.update()
+        """Ramps the voltage up to the break voltage, raising it after every pass, until the resistance jumps by more
+        than r_percent between points (the junction breaks), the desired resistance is reached or the scan is aborted"""
+        while not self._abort:
             currents = []
             voltages = []
             points = []
             for n, v_applied in enumerate(np.arange(self._start_voltage, self._current_break_voltage, self._delta_voltage)):
-                self._master.update()
                 self._sourcemeter.set_voltage(v_applied)
                 v, j, _, _, _ = self._sourcemeter.read_points()
                 voltages.append(v_applied)
@@ -143,7 +143,7 @@ class KeithleyBreak:
                 bar = self._ax3.barh(1, percent_max, 0.35, color='cyan')
                 self._ax3.title.set_text('Percent of maximum current: %s %%' % np.ceil(percent_max * 100))
                 self._fig.canvas.draw()
-                self._master.update()
+                yield
                 bar.remove()
                 if n > 1:
                     upper = (1 + self._r_percent / 100) * voltages[n - 1] / currents[n - 1]
@@ -161,15 +161,14 @@ class KeithleyBreak:
                 ln, = self._ax2.plot(linspace, proportional(linspace, m))
                 self._ax2.title.set_text('Breaking resistance: %s ohms\n ' % np.ceil(self._sweep_resistance))
                 self._fig.canvas.draw()
-                tk_sleep(self._master, 250)
+                yield 250
                 ln.remove()
             self._sourcemeter.set_voltage(0)
             [x[0].remove() for x in points]
             if self._increase_break_voltage:
                 self._current_break_voltage += self._delta_break_voltage
-            if not self._current_dropped or not self._abort: # this is pretty much a while loop, but you can't use
-                # a while loop in Tkinter
-                self.ramp_voltage()
+            if not self.continue_breaking():
+                return
 
     def continue_breaking(self):
         if not self._abort and not self._current_dropped and not self._sweep_resistance >= self._desired_resistance \
@@ -179,37 +178,40 @@ class KeithleyBreak:
             return False
 
     def break_junction(self):
-        self._master.update()
-        self._current_break_voltage = self._break_voltage
-        self._pass = count(0)
-        self.ramp_voltage()
-        if self._sweep_resistance >= self._desired_resistance:
-            self._fig.savefig(self._filename + '%s.png' % next(self._c), format='png', bbox_inches='tight')
-            self._ln.remove()
-        if self._sweep_resistance < 0:
-            self._fig.savefig(self._filename + '%s.png' % next(self._c), format='png', bbox_inches='tight')
-            self._ln.remove()
-        if self._current_dropped:
-            self._ln.remove()
-        if self.continue_breaking():
-            self.break_junction()
+        while True:
+            self._current_break_voltage = self._break_voltage
+            self._pass = count(0)
+            yield from self.ramp_voltage()
+            if self._sweep_resistance >= self._desired_resistance:
+                self._fig.savefig(self._filename + '%s.png' % next(self._c), format='png', bbox_inches='tight')
+                self._ln.remove()
+            if self._sweep_resistance < 0:
+                self._fig.savefig(self._filename + '%s.png' % next(self._c), format='png', bbox_inches='tight')
+                self._ln.remove()
+            if self._current_dropped:
+                self._ln.remove()
+            if not self.continue_breaking():
+                return
 
     def measure(self):
-        with open(self._filename + '%s.csv' % next(self._j), 'w', newline='') as inputfile:
-            self._writer = csv.writer(inputfile)
-            self._writer.writerow(['resistance'])
-            self.measure_resistance()
-            self.break_junction()
-            self.remove_points()
-        self.measure()
+        while True:  # until check_status raises NameError
+            with open(self._filename + '%s.csv' % next(self._j), 'w', newline='') as inputfile:
+                self._writer = csv.writer(inputfile)
+                self._writer.writerow(['resistance'])
+                yield from self.measure_resistance()
+                yield from self.break_junction()
+                self.remove_points()
 
-    def main(self):
-        button = tk.Button(master=self._master, text="Abort", command=self.abort)
-        button.pack(side=tk.BOTTOM)
+    def run(self):
         try:
-            self.measure()
+            yield from self.measure()
         except NameError:
             print(self._message)
             print('Final resistance: %s ohms' % np.ceil(self._sweep_resistance))
             self._fig.savefig(self._filename + '%s.png' % next(self._c), format='png', bbox_inches='tight')
             self._sourcemeter.set_voltage(0)
+
+    def main(self):
+        button = tk.Button(master=self._master, text="Abort", command=self.abort)
+        button.pack(side=tk.BOTTOM)
+        self._scheduler.start(self.run())
@@ -111,8 +111,11 @@ if __name__ is '__main__':
     from optics.hardware_control import hardware_addresses_and_constants, daq
 
     root = tk.Tk()
-    with daq.create_ai_task(hardware_addresses_and_constants.ai_switch, sleep=0) as ai, \
+    # the switch input is read through the continuous task, as in main_lockin_gui, so it is the only task on the channel
+    with daq.create_continuous_ai_task([hardware_addresses_and_constants.ai_switch]) as continuous_ai, \
             daq.create_ao_task(hardware_addresses_and_constants.ao_switch) as ao:
+        ai = daq.AnalogInput(daq.AnalogInputView(continuous_ai, hardware_addresses_and_constants.ai_switch, fresh=True),
+                             sleep=0)
         app = DAQBreakGUI(root, ai, ao)
         app.build_daqbreak_gui()
         root.mainloop()
\ No newline at end of file
@@ -6,6 +6,10 @@ matplotlib.use('Qt4Agg')  # this allows you to see the interactive plots!
 import tkinter as tk
 import numpy as np
 from optics.hardware_control import attenuator_wheel, pm100d, sr7270, npc3sg, polarizercontroller, daq
+from optics.misc_utility import scanner
+from optics.storage.writer import file_formats
+from optics.measurements.settle import settle_modes
+from optics.measurements.adaptive_scan import sampling_modes
 import optics.hardware_control.hardware_addresses_and_constants as hw
 from optics.heating_measurement.heating_map import HeatingScan
 from optics.thermovoltage_measurement.thermovoltage_intensity import ThermovoltageIntensity
@@ -37,7 +41,8 @@ class BaseLockinGUI(BaseGUI):
     def __init__(self, master, npc3sg_x=None, npc3sg_y=None, npc3sg_input=None,
                  sr7270_dual_harmonic=None, sr7270_single_reference=None, powermeter=None, attenuatorwheel=None,
                  waveplate=None,
-                 daq_input=None, daq_switch_ai=None, daq_switch_ao=None, keithley=None, laser=None, polarizer=None):
+                 daq_input=None, daq_switch_ai=None, daq_switch_ao=None, keithley=None, laser=None, polarizer=None,
+                 line_scanner=None):
         self._master = master
         super().__init__(self._master)
         self._master.title('Optics setup measurements')
@@ -54,6 +59,7 @@ class BaseLockinGUI(BaseGUI):
         self._daq_input = daq_input
         self._daq_switch_ai = daq_switch_ai
         self._daq_switch_ao = daq_switch_ao
+        self._line_scanner = line_scanner
         self._polarizer = polarizer
         self._newWindow = None
         self._app = None
@@ -67,7 +73,8 @@ class BaseLockinGUI(BaseGUI):
                                          powermeter=self._powermeter, attenuatorwheel=self._attenuatorwheel,
                                          waveplate=self._waveplate, daq_input=self._daq_input,
                                          daq_switch_ai=self._daq_switch_ai,
-                                         daq_switch_ao=self._daq_switch_ao, keithley=self._keithley, laser=self._laser, polarizer=self._polarizer)
+                                         daq_switch_ao=self._daq_switch_ao, keithley=self._keithley, laser=self._laser, polarizer=self._polarizer,
+                                         line_scanner=self._line_scanner)
         measurement = {'heatmap': self._app.build_heating_scan_gui,
                        'ptemap': self._app.build_thermovoltage_scan_gui,
                        'ptemapdc': self._app.build_thermovoltage_scan_dc_gui,
@@ -161,7 +168,8 @@ class LockinMeasurementGUI(BaseGUI):
     def __init__(self, master, npc3sg_x=None, npc3sg_y=None, npc3sg_input=None,
                  sr7270_dual_harmonic=None, sr7270_single_reference=None, powermeter=None, attenuatorwheel=None,
                  waveplate=None,
-                 daq_input=None, daq_switch_ai=None, daq_switch_ao=None, keithley=None, laser=None, polarizer=None):
+                 daq_input=None, daq_switch_ai=None, daq_switch_ao=None, keithley=None, laser=None, polarizer=None,
+                 line_scanner=None):
         self._master = master
         super().__init__(self._master)
         self._npc3sg_x = npc3sg_x
@@ -171,6 +179,7 @@ class LockinMeasurementGUI(BaseGUI):
         self._sr7270_single_reference = sr7270_single_reference
         self._daq_switch_ai = daq_switch_ai
         self._daq_switch_ao = daq_switch_ao
+        self._line_scanner = line_scanner
         self._keithley = keithley
         self._laser = laser
         self._powermeter = powermeter
@@ -181,6 +190,20 @@ class LockinMeasurementGUI(BaseGUI):
         self._direction.set('Forward')
         self._axis = tk.StringVar()
         self._axis.set('y')
+        self._path = tk.StringVar()
+        self._path.set('raster')
+        self._file_format = tk.StringVar()
+        self._file_format.set('csv')
+        self._resume = tk.StringVar()
+        self._resume.set('False')
+        self._settle = tk.StringVar()
+        self._settle.set('fixed')
+        self._sampling = tk.StringVar()
+        self._sampling.set('full')
+        self._acquisition = tk.StringVar()
+        self._acquisition.set('polled')
+        self._timing = tk.StringVar()
+        self._timing.set('software')
         self._current_gain = tk.StringVar()
         self._current_gain.set('1 mA/V')
         self._voltage_gain = tk.StringVar()
@@ -222,7 +245,9 @@ class LockinMeasurementGUI(BaseGUI):
                                 int(self._inputs['x range']), int(self._inputs['y range']),
                                 int(self._inputs['x center']), int(self._inputs['y center']), self._npc3sg_x,
                                 self._npc3sg_y, self._npc3sg_input, self._sr7270_single_reference, self._powermeter,
-                                self._waveplate, direction, self._axis.get())
+                                self._waveplate, direction, self._axis.get(), path=self._path.get(),
+                                file_format=self._file_format.get(), resume=self.string_to_bool(self._resume.get()),
+                                settle=self._settle.get(), sampling=self._sampling.get())
         run.main()
 
     def thermovoltage_scan_dc(self, event=None):
@@ -231,6 +256,10 @@ class LockinMeasurementGUI(BaseGUI):
             direction = False
         else:
             direction = True
+        line_scanner = None
+        if self._timing.get() == 'hardware':
+            line_scanner = self._line_scanner
+            line_scanner.samples_per_pixel = int(self._inputs['samples per pixel (hardware timing)'])
         run = ThermovoltageScanDC(tk.Toplevel(self._master), self._inputs['file path'], self._inputs['notes'],
                                   self._inputs['device'],
                                   int(self._inputs['scan']), float(self._voltage_gain.get()),
@@ -238,7 +267,10 @@ class LockinMeasurementGUI(BaseGUI):
                                   int(self._inputs['y pixel density']), int(self._inputs['x range']),
                                   int(self._inputs['y range']), int(self._inputs['x center']),
                                   int(self._inputs['y center']), self._npc3sg_x, self._npc3sg_y, self._daq_input,
-                                  self._powermeter, self._waveplate, direction)
+                                  self._powermeter, self._waveplate, direction, self._path.get(),
+                                  line_scanner,
+                                  file_format=self._file_format.get(),
+                                  resume=self.string_to_bool(self._resume.get()))
         run.main()
 
     def heating_scan(self, event=None):
@@ -256,7 +288,8 @@ class LockinMeasurementGUI(BaseGUI):
                           int(self._inputs['x range']), int(self._inputs['y range']), int(self._inputs['x center']),
                           int(self._inputs['y center']), self._npc3sg_x, self._npc3sg_y, self._npc3sg_input,
                           self._sr7270_dual_harmonic, self._sr7270_single_reference, self._powermeter, self._waveplate,
-                          direction)
+                          direction, self._path.get(), file_format=self._file_format.get(),
+                          resume=self.string_to_bool(self._resume.get()), settle=self._settle.get())
         run.main()
 
     def thermovoltage_time(self, event=None):
@@ -266,7 +299,8 @@ class LockinMeasurementGUI(BaseGUI):
                                 int(self._inputs['scan']), float(self._voltage_gain.get()),
                                 float(self._inputs['rate (per second)']), float(self._inputs['max time (s)']),
                                 self._npc3sg_input, self._sr7270_single_reference,
-                                self._powermeter, self._waveplate)
+                                self._powermeter, self._waveplate, self._acquisition.get() == 'curve buffer',
+                                file_format=self._file_format.get())
         run.main()
 
     def heating_time(self, event=None):
@@ -341,7 +375,8 @@ class LockinMeasurementGUI(BaseGUI):
                                       self._sr7270_single_reference, float(self._inputs['wait time (ms)']),
                                       int(self._inputs['scans']), int(self._inputs['tick spacing (mV)']),
                                       self._keithley, float(self._inputs['min gate (V)']),
-                                      float(self._inputs['max gate (V)']), int(self._inputs['gate steps']))
+                                      float(self._inputs['max gate (V)']), int(self._inputs['gate steps']),
+                                      settle=self._settle.get(), file_format=self._file_format.get())
         run.main()
 
     def iv_sweep(self, event=None):
@@ -355,7 +390,8 @@ class LockinMeasurementGUI(BaseGUI):
                                       float(self._inputs['stop voltage (mV)']), int(self._inputs['steps']), int(self._inputs['# to average']),
                                       self._sr7270_dual_harmonic, self._sr7270_single_reference, float(self._inputs['wait time (ms)']),
                                       int(self._inputs['scans']), int(self._inputs['tick spacing (mV)']), self._keithley,
-                                      float(self._inputs['gate (V)']), int(self._inputs['gate ramp spacing (mV)']))
+                                      float(self._inputs['gate (V)']), int(self._inputs['gate ramp spacing (mV)']),
+                                      file_format=self._file_format.get(), settle=self._settle.get())
         else:
             run = CurrentVoltageSweep(tk.Toplevel(self._master), self._inputs['file path'], self._inputs['notes'],
                                     self._inputs['device'], int(self._inputs['index']),
@@ -365,7 +401,8 @@ class LockinMeasurementGUI(BaseGUI):
                                     float(self._inputs['stop voltage (mV)']), int(self._inputs['steps']),
                                     int(self._inputs['# to average']), self._sr7270_dual_harmonic,
                                     self._sr7270_single_reference, float(self._inputs['wait time (ms)']),
-                                    int(self._inputs['scans']), int(self._inputs['tick spacing (mV)']))
+                                    int(self._inputs['scans']), int(self._inputs['tick spacing (mV)']),
+                                    file_format=self._file_format.get(), settle=self._settle.get())
         run.main()
 
     def thermovoltage_polarization(self, event=None):
@@ -454,15 +491,25 @@ class LockinMeasurementGUI(BaseGUI):
         self.make_option_menu('gain', self._voltage_gain, self._voltage_gain_options)
         self.make_option_menu('direction', self._direction, ['Forward', 'Reverse'])
         self.make_option_menu('cutthrough axis', self._axis, ['x', 'y'])
+        self.make_option_menu('scan path', self._path, scanner.scan_paths)
+        self.make_option_menu('file format', self._file_format, file_formats)
+        self.make_option_menu('resume', self._resume, ['False', 'True'])
+        self.make_option_menu('settle', self._settle, settle_modes)
+        self.make_option_menu('sampling', self._sampling, sampling_modes)
         self.endform(self.thermovoltage_scan)
 
     def build_thermovoltage_scan_dc_gui(self):
         caption = "DC thermovoltage map scan"
         self._fields = {'file path': "", 'device': "", 'scan': 0, 'notes': "", 'x pixel density': 20,
-                        'y pixel density': 20, 'x range': 160, 'y range': 160, 'x center': 80, 'y center': 80}
+                        'y pixel density': 20, 'x range': 160, 'y range': 160, 'x center': 80, 'y center': 80,
+                        'samples per pixel (hardware timing)': 1000}
         self.beginform(caption)
         self.make_option_menu('gain', self._voltage_gain, self._voltage_gain_options)
         self.make_option_menu('direction', self._direction, ['Forward', 'Reverse'])
+        self.make_option_menu('scan path', self._path, scanner.scan_paths[:2])
+        self.make_option_menu('timing', self._timing, ['software', 'hardware'])
+        self.make_option_menu('file format', self._file_format, file_formats)
+        self.make_option_menu('resume', self._resume, ['False', 'True'])
         self.endform(self.thermovoltage_scan_dc)
 
     def build_heating_scan_gui(self):
@@ -473,6 +520,10 @@ class LockinMeasurementGUI(BaseGUI):
         self.beginform(caption)
         self.make_option_menu('gain', self._current_gain, self._current_amplifier_gain_options.keys())
         self.make_option_menu('direction', self._direction, ['Forward', 'Reverse'])
+        self.make_option_menu('scan path', self._path, scanner.scan_paths)
+        self.make_option_menu('file format', self._file_format, file_formats)
+        self.make_option_menu('resume', self._resume, ['False', 'True'])
+        self.make_option_menu('settle', self._settle, settle_modes)
         self.endform(self.heating_scan)
 
     def build_thermovoltage_time_gui(self):
@@ -481,6 +532,8 @@ class LockinMeasurementGUI(BaseGUI):
                         'max time (s)': 300}
         self.beginform(caption)
         self.make_option_menu('gain', self._voltage_gain, self._voltage_gain_options)
+        self.make_option_menu('acquisition', self._acquisition, ['polled', 'curve buffer'])
+        self.make_option_menu('file format', self._file_format, file_formats)
         self.endform(self.thermovoltage_time)
 
     def build_change_intensity_gui(self):
@@ -626,6 +679,8 @@ class LockinMeasurementGUI(BaseGUI):
                         'max gate (V)': 100, 'gate steps': 11}
         self.beginform(caption)
         self.make_option_menu('gain', self._current_gain, self._current_amplifier_gain_options.keys())
+        self.make_option_menu('settle', self._settle, settle_modes)
+        self.make_option_menu('file format', self._file_format, file_formats)
         self.endform(self.iv_sweep_gate)
 
     def build_sweep_iv_gui(self):
@@ -641,6 +696,8 @@ class LockinMeasurementGUI(BaseGUI):
                             'oscillator amplitude (mV)': 7, 'tick spacing (mV)': 25, 'scans': 1}
         self.beginform(caption)
         self.make_option_menu('gain', self._current_gain, self._current_amplifier_gain_options.keys())
+        self.make_option_menu('file format', self._file_format, file_formats)
+        self.make_option_menu('settle', self._settle, settle_modes)
         self.endform(self.iv_sweep)
 
     def build_single_reference_gui(self):
@@ -786,7 +843,9 @@ def main():
         with ExitStack() as cm:
             npc3sg_x = cm.enter_context(daq.create_ao_task(hw.ao_x))
             npc3sg_y = cm.enter_context(daq.create_ao_task(hw.ao_y))
-            npc3sg_input = cm.enter_context(npc3sg.connect_input([hw.ai_x, hw.ai_y]))
+            continuous_ai = cm.enter_context(daq.create_continuous_ai_task([hw.ai_switch, hw.ai_dc1, hw.ai_dc2,
+                                                                             hw.ai_x, hw.ai_y]))
+            npc3sg_input = npc3sg.continuous_input(continuous_ai, [hw.ai_x, hw.ai_y])
             lock_ins = cm.enter_context(sr7270.create_endpoints(hw.vendor, hw.product))
             for lock_in in lock_ins:
                 mode = lock_in.check_reference_mode()
@@ -819,8 +878,8 @@ def main():
                 polarizer = None
                 print('Warning: Polarizer controller not connected')
             attenuatorwheel = cm.enter_context(attenuator_wheel.create_do_task(hw.attenuator_wheel_outputs))
-            daq_input = cm.enter_context(daq.create_ai_task([hw.ai_dc1, hw.ai_dc2], points=1000))
-            daq_switch_ai = cm.enter_context(daq.create_ai_task(hw.ai_switch, sleep=0))
+            daq_input = daq.AnalogInput(daq.AnalogInputView(continuous_ai, [hw.ai_dc1, hw.ai_dc2], points=1000), sleep=0)
+            daq_switch_ai = daq.AnalogInput(daq.AnalogInputView(continuous_ai, hw.ai_switch, fresh=True), sleep=0)
             daq_switch_ao = cm.enter_context(daq.create_ao_task(hw.ao_switch))
             laser = cm.enter_context(toptica_ibeam_smart.connect_laser())
             keithley = cm.enter_context(keithley_k2400.connect(hardware_addresses_and_constants.keithley_address))
@@ -836,7 +895,8 @@ def main():
                                 sr7270_single_reference=sr7270_single_reference,
                                 powermeter=powermeter, attenuatorwheel=attenuatorwheel, waveplate=waveplate,
                                 daq_input=daq_input, daq_switch_ai=daq_switch_ai, daq_switch_ao=daq_switch_ao,
-                                keithley=keithley, laser=laser, polarizer=polarizer)
+                                keithley=keithley, laser=laser, polarizer=polarizer,
+                                line_scanner=npc3sg.line_scanner(hw.ao_x, [hw.ai_dc1, hw.ai_dc2], npc3sg_x, continuous_ai))
             app.build()
             root.mainloop()
     except Exception as err:
@@ -0,0 +1,81 @@
+import functools
+import queue
+import threading
+from concurrent import futures
+
+
+class InstrumentWorker:
+    """Owns one instrument on a thread of its own, so that slow calls (a CCD integrating for seconds, a lock in
+    averaging) do not block the tkinter thread or the instruments of other windows.
+
+    The device is made by calling factory on the worker thread and is only ever used from that thread, which is what
+    COM objects like the CCD need; initializer is called on the thread first (CoInitialize for COM). Calls are queued
+    and run one at a time in the order they were submitted. submit returns a concurrent.futures.Future; any other
+    attribute is forwarded to the device and waited for, so a worker can be passed to code written for the device
+    itself: worker.read_gain() blocks like device.read_gain() did, worker.submit('take_spectrum', 1) does not.
+
+    Usage: ccd = InstrumentWorker(CCDController2, 'ccd', initializer=lambda: co_initialize(None))
+        future = ccd.submit('take_spectrum', integration_time, gain, scans)
+        raw, data = instrument_worker.wait(master, future), keeps the windows of master responsive meanwhile
+    """
+    def __init__(self, factory, name=None, initializer=None):
+        self._calls = queue.Queue()
+        self._device = None
+        opened = futures.Future()
+        self._thread = threading.Thread(target=self._run, args=(factory, initializer, opened), name=name, daemon=True)
+        self._thread.start()
+        opened.result()  # raises the exception of factory if the device could not be opened
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if callable(getattr(type(self._device), name, None)):
+            return functools.partial(self.call, name)
+        return self._queue(getattr, self._device, name).result()  # properties such as xpixels
+
+    def submit(self, method, *args, **kwargs):
+        """Queues device.method(*args, **kwargs) and returns a Future of its result"""
+        return self._queue(lambda: getattr(self._device, method)(*args, **kwargs))
+
+    def call(self, method, *args, **kwargs):
+        return self.submit(method, *args, **kwargs).result()
+
+    def close(self):
+        """Stops the thread once the calls already submitted are done"""
+        self._calls.put(None)
+        self._thread.join()
+
+    def _queue(self, function, *args):
+        future = futures.Future()
+        self._calls.put((future, function, args))
+        return future
+
+    def _run(self, factory, initializer, opened):
+        try:
+            if initializer:
+                initializer()
+            self._device = factory()
+        except Exception as error:
+            opened.set_exception(error)
+            return
+        opened.set_result(None)
+        while True:
+            item = self._calls.get()
+            if item is None:
+                return
+            future, function, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except Exception as error:
+                future.set_exception(error)
+
+
+def wait(master, future, interval=0.02):
+    """The result of future, handling the events of master every interval seconds until it is done, for measurement
+    loops that need a reading before they can go on. Generator measurements run by a Scheduler can instead
+    yield a delay in ms while not future.done()"""
+    while not futures.wait([future], timeout=interval).done:
+        master.update()
+    return future.result()
@@ -1,10 +1,10 @@
 import contextlib
-import visa
 import time
 
 
 @contextlib.contextmanager
 def connect(address):
+    import visa  # imported here so that SourceMeter can be used with sim.keithley_k2400 without VISA
     rm = visa.ResourceManager()
     rm.list_resources()
     inst = rm.open_resource(address)
@@ -8,15 +8,32 @@ import time
 
 
 class NPC3SGReader:
-    def __init__(self, multiple_ai):
+    def __init__(self, multiple_ai, sleep=0.1):
         self._multiple_ai = multiple_ai
+        self._sleep = sleep
 
     def read(self):
-        time.sleep(0.1)
+        if self._sleep:
+            time.sleep(self._sleep)
         voltage = self._multiple_ai.readAll()
         return [voltage[i] / 10 * 160 for i in voltage]
 
 
+def continuous_input(continuous_ai, ai_channels, points=100):
+    """Reads the piezo position from channels of an already running daq.ContinuousAnalogInput without waiting"""
+    return NPC3SGReader(daq.AnalogInputView(continuous_ai, ai_channels, points=points), sleep=0)
+
+
+def line_scanner(ao_channel, ai_channels, npc3sg_x=None, continuous_ai=None, rate=10000, samples_per_pixel=1000,
+                 discard=100):
+    """Returns a daq.LineScan that sweeps the piezo x axis along a line while reading ai_channels. The on demand x
+    output and the continuous input are paused while a line runs. The defaults average as many samples per pixel as
+    the polled DC map; see daq.LineScan for trading samples_per_pixel against speed"""
+    pause = [task for task in (npc3sg_x, continuous_ai) if task]
+    return daq.LineScan(ao_channel, ai_channels, rate=rate, samples_per_pixel=samples_per_pixel, discard=discard,
+                        pause=pause)
+
+
 @contextlib.contextmanager
 def connect_input(ai_channels):
     multiple_ai = daq.MultiChannelAnalogInput(ai_channels)
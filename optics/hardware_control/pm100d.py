@@ -1,10 +1,10 @@
-import visa
-from ThorlabsPM100 import ThorlabsPM100
 import contextlib
 from optics.hardware_control.hardware_addresses_and_constants import  power_factor
 
 @contextlib.contextmanager
 def connect(address):
+    import visa  # imported here so that PowerMeter can be used with sim.pm100d without VISA
+    from ThorlabsPM100 import ThorlabsPM100
     rm = visa.ResourceManager()
     inst = rm.open_resource(address)
     try:
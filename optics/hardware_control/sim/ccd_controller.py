@@ -0,0 +1,56 @@
+import time
+import numpy as np
+from optics.hardware_control.sim.sample import Sample
+
+
+class CCDController2:
+    """Simulated ccd_controller.CCDController2. take_spectrum blocks for the integration time of every scan plus
+    readout seconds, checking every poll seconds like the real one, and returns raman peaks (gaussians at peaks, in
+    pixels, with heights in counts per second) on a dark level with shot noise. The peaks scale with the laser power
+    of the sample and the gain setting"""
+    def __init__(self, sample=None, xpixels=1024, peaks=((300, 2000, 4), (520, 800, 6), (700, 300, 10)), dark=600,
+                 readout=0.05, poll=0.1):
+        self._sample = sample or Sample.default()
+        self._xpixels = xpixels
+        self._peaks = peaks
+        self._dark = dark
+        self._readout = readout
+        self._poll = poll
+        self._gain = 1
+        self._busy_until = 0
+
+    @property
+    def xpixels(self):
+        return self._xpixels
+
+    def read_gain(self):
+        return self._gain
+
+    def set_gain(self, gain):
+        self._gain = gain
+
+    def is_busy(self):
+        return time.perf_counter() < self._busy_until
+
+    def counts(self, integration_time, shutter_open, darksubstract):
+        pixels = np.arange(self._xpixels)
+        rate = np.zeros(self._xpixels)
+        if shutter_open:
+            for center, height, width in self._peaks:
+                rate += height * np.exp(-(pixels - center) ** 2 / (2 * width ** 2))
+            rate *= self._sample.power / 1e-3 * (1 + self._gain)
+        signal = self._sample.rng.poisson(rate * integration_time) + self._sample.rng.normal(self._dark, 5, pixels.size)
+        return signal - self._dark if darksubstract else signal
+
+    def take_spectrum(self, integration_time_seconds=1, gain=1, scans=1, shutter_open=True, darksubstract=False):
+        self.set_gain(gain)
+        raw_data = np.zeros([scans, self._xpixels])
+        for j in range(scans):
+            self._busy_until = time.perf_counter() + integration_time_seconds + self._readout
+            while self.is_busy():
+                time.sleep(self._poll)
+            raw_data[j] = self.counts(integration_time_seconds, shutter_open, darksubstract)
+        return raw_data, np.mean(raw_data, axis=0)
+
+    def stop(self):
+        self._busy_until = 0
@@ -0,0 +1,172 @@
+import contextlib
+import time
+import numpy as np
+from optics.hardware_control import hardware_addresses_and_constants as hw
+from optics.hardware_control.sim.sample import Sample
+
+
+def channel_signals(sample):
+    """What every AI channel of the setup reads from the sample, in volts: the piezo position sensors (0-10 V over
+    0-160 um), the DC photovoltage on the DC inputs, and the current amplifier output (current times gain) on the
+    lock in/DAQ switch input, for the bias set by the switch AO"""
+    return {hw.ai_x: lambda: sample.x.position / 160 * 10, hw.ai_y: lambda: sample.y.position / 160 * 10,
+            hw.ai_dc1: sample.photovoltage, hw.ai_dc2: lambda: 0.5 * sample.photovoltage(),
+            hw.ai_switch: lambda: sample.current() * sample.gain}
+
+
+class ContinuousAnalogInput:
+    """Simulated daq.ContinuousAnalogInput. There is no acquisition thread; reads make up the latest samples from the
+    sample at the time of the read, and the sample count advances with the clock at rate Hz, so wait_for takes as long
+    as the hardware would"""
+    def __init__(self, physical_channels, rate=10000, buffer_seconds=1, sample=None):
+        if type(physical_channels) == type(""):
+            physical_channels = [physical_channels]
+        self.physicalChannel = list(physical_channels)
+        self._sample = sample or Sample.default()
+        self._signals = channel_signals(self._sample)
+        self._rate = rate
+        self._size = int(rate * buffer_seconds)
+        self._started = time.perf_counter()
+
+    @property
+    def total(self):
+        return int((time.perf_counter() - self._started) * self._rate)
+
+    def channel_index(self, name):
+        return self.physicalChannel.index(name)
+
+    def latest(self, n=1):
+        n = min(n, self._size, max(self.total, 1))
+        values = np.array([self._signals.get(name, lambda: 0.0)() for name in self.physicalChannel])
+        return self._sample.jitter(np.repeat(values[:, None], n, axis=1))
+
+    def mean_over(self, window):
+        return np.mean(self.latest(max(int(window * self._rate), 1)), axis=1)
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def wait_for(self, samples, timeout=10.0):
+        time.sleep(min(samples / self._rate, timeout))
+
+
+class AnalogInputView:
+    """Simulated daq.AnalogInputView"""
+    def __init__(self, continuous_ai, physical_channels, points=1, average=True, fresh=False):
+        self._continuous_ai = continuous_ai
+        if type(physical_channels) == type(""):
+            physical_channels = [physical_channels]
+        self.physicalChannel = list(physical_channels)
+        self._rows = [continuous_ai.channel_index(name) for name in self.physicalChannel]
+        self._points = points
+        self._average = average
+        self._fresh = fresh
+
+    def readAll(self, fresh=None):
+        data = self.samples(fresh)
+        return dict((name, np.average(data[i]) if self._average else data[i])
+                    for i, name in enumerate(self.physicalChannel))
+
+    def read(self, name=None, fresh=None):
+        if name is None:
+            name = self.physicalChannel[0]
+        data = self.samples(fresh)[self.physicalChannel.index(name)]
+        return np.average(data) if self._average else data
+
+    def samples(self, fresh=None):
+        if self._fresh if fresh is None else fresh:
+            self._continuous_ai.wait_for(self._points)
+        return self._continuous_ai.latest(self._points)[self._rows]
+
+
+class AnalogInput:
+    """Simulated daq.AnalogInput"""
+    def __init__(self, multiple_ai, sleep=0.1):
+        self._multiple_ai = multiple_ai
+        self._sleep = sleep
+
+    def read(self):
+        time.sleep(self._sleep)
+        voltage = self._multiple_ai.readAll()
+        return [voltage[i] for i in voltage]
+
+
+class AnalogOutput:
+    """Simulated daq.AnalogOutput. Moving the piezo channels moves the piezo of the sample, which then settles, and
+    sourcing a voltage on the switch channel sets the bias of the sample. Every write takes write_time seconds"""
+    def __init__(self, ao_channel, sample=None, write_time=0.0002):
+        self._sample = sample or Sample.default()
+        self._channel = ao_channel
+        self._axis = {hw.ao_x: self._sample.x, hw.ao_y: self._sample.y}.get(ao_channel)
+        self._write_time = write_time
+
+    def move(self, position):
+        time.sleep(self._write_time)
+        if self._axis:
+            self._axis.move(position)
+
+    def source_voltage(self, voltage):
+        time.sleep(self._write_time)
+        if self._axis:
+            self._axis.move(voltage / 10 * 160)
+        elif self._channel == hw.ao_switch:
+            self._sample.bias = voltage
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+
+class LineScan:
+    """Simulated daq.LineScan. A line takes as long as on the hardware (len(positions) / pixel_rate) and returns the
+    channel signals with the x piezo at every position"""
+    def __init__(self, ao_channel, ai_channels, rate=10000, samples_per_pixel=1000, discard=100, pause=(),
+                 limit=(-10.0, 10.0), sample=None):
+        if type(ai_channels) == type(""):
+            ai_channels = [ai_channels]
+        self.physicalChannel = list(ai_channels)
+        self._rate = rate
+        self.samples_per_pixel = samples_per_pixel
+        self._discard = discard
+        self._sample = sample or Sample.default()
+        self._axis = {hw.ao_x: self._sample.x, hw.ao_y: self._sample.y}[ao_channel]
+        self._signals = channel_signals(self._sample)
+
+    @property
+    def pixel_rate(self):
+        return self._rate / (self._discard + self.samples_per_pixel)
+
+    def scan(self, positions):
+        positions = np.asarray(positions, dtype=float)
+        time.sleep(len(positions) / self.pixel_rate)
+        data = np.zeros((len(self.physicalChannel), len(positions)))
+        for j, position in enumerate(positions):
+            self._axis.move(position, settled=True)  # the samples averaged on the hardware are after the settling
+            data[:, j] = [self._signals.get(name, lambda: 0.0)() for name in self.physicalChannel]
+        return self._sample.jitter(data)
+
+
+@contextlib.contextmanager
+def create_ai_task(ai_channels, points=1, sleep=0.1, sample=None):
+    multiple_ai = AnalogInputView(ContinuousAnalogInput(ai_channels, sample=sample), ai_channels, points=points)
+    yield AnalogInput(multiple_ai, sleep)
+
+
+@contextlib.contextmanager
+def create_continuous_ai_task(ai_channels, rate=10000, buffer_seconds=1, sample=None):
+    yield ContinuousAnalogInput(ai_channels, rate=rate, buffer_seconds=buffer_seconds, sample=sample)
+
+
+@contextlib.contextmanager
+def create_ao_task(ao_channel, reset_to_zero=True, sample=None):
+    output = AnalogOutput(ao_channel, sample=sample)
+    try:
+        yield output
+    finally:
+        if reset_to_zero:
+            output.source_voltage(0)
@@ -0,0 +1,91 @@
+import heapq
+import itertools
+import time
+import tkinter
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+class HeadlessMaster:
+    """Stands in for a tkinter master where there is no display, with the after() scheduling that the measurement
+    helpers rely on (misc_utility.tkinter_utilities.RenderTick, measurements.scheduler.Scheduler and
+    instrument_worker.wait). update() runs the callbacks that are due, like the event loop would, and mainloop() runs
+    callbacks until there are none left or until() is true. tk is a Tcl interpreter without Tk, so tkinter variables
+    such as StringVar(master) work, but widgets cannot be made: measurements skip their buttons for a master that
+    misc_utility.tkinter_utilities.has_widgets is False for.
+
+    Together with HeadlessCanvas this runs the measurements that take a canvas argument (ThermovoltageScan,
+    HeatingScan, CurrentVoltageSweep, RamanTime and DAQBreak) without a display.
+
+    Usage: master = HeadlessMaster()
+        Scheduler(master).start(measurement.run())
+        master.mainloop()
+        ThermovoltageScan(master, ..., canvas=HeadlessCanvas).main()
+    """
+    headless = True
+
+    def __init__(self):
+        self.tk = tkinter.Tcl().tk
+        self._queue = []
+        self._ids = itertools.count()
+        self._cancelled = set()
+
+    def after(self, ms, func=None, *args):
+        if func is None:
+            time.sleep(ms / 1000)
+            return None
+        after_id = next(self._ids)
+        heapq.heappush(self._queue, (time.perf_counter() + ms / 1000, after_id, func, args))
+        return after_id
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, after_id):
+        self._cancelled.add(after_id)
+
+    def update(self):
+        now = time.perf_counter()
+        while self._queue and self._queue[0][0] <= now:
+            _, after_id, func, args = heapq.heappop(self._queue)
+            if after_id in self._cancelled:
+                self._cancelled.discard(after_id)
+                continue
+            func(*args)
+
+    update_idletasks = update
+
+    def mainloop(self, until=None):
+        while self._queue and not (until and until()):
+            time.sleep(max(self._queue[0][0] - time.perf_counter(), 0))
+            self.update()
+
+    def title(self, *args):
+        pass
+
+    def protocol(self, *args):
+        pass
+
+    def destroy(self):
+        self._queue = []
+
+    def _root(self):
+        return self
+
+
+class HeadlessWidget:
+    """What HeadlessCanvas.get_tk_widget() returns: packing and destroying it do nothing"""
+    def pack(self, *args, **kwargs):
+        pass
+
+    def destroy(self):
+        pass
+
+
+class HeadlessCanvas(FigureCanvasAgg):
+    """Draws a figure into memory with Agg in place of FigureCanvasTkAgg, for measurements given canvas=HeadlessCanvas.
+    Blitting is a no-op, so a render costs what drawing the figure costs"""
+    def __init__(self, figure=None, master=None):
+        super().__init__(figure)
+
+    def get_tk_widget(self):
+        return HeadlessWidget()
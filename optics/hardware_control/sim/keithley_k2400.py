@@ -0,0 +1,57 @@
+import contextlib
+import time
+from optics.hardware_control.keithley_k2400 import SourceMeter
+from optics.hardware_control.sim.sample import Sample
+
+
+class SimulatedK2400Resource:
+    """Stands in for the pyvisa resource of a Keithley 2400, so the real keithley_k2400.SourceMeter runs on top of it.
+    Every write and query takes round_trip seconds (GPIB). The sourced voltage is the bias of the sample, and a
+    triggered measurement takes point_time seconds per point, after which *OPC? answers 1 and :FETC? returns the
+    voltage, the current of the sample (limited by the compliance), the resistance, a timestamp and a status"""
+    def __init__(self, sample, round_trip=0.002, point_time=0.02):
+        self._sample = sample
+        self._round_trip = round_trip
+        self._point_time = point_time
+        self._compliance = 0.1
+        self._trigger_count = 1
+        self._done = 0
+        self._started = time.perf_counter()
+
+    def write(self, command):
+        time.sleep(self._round_trip)
+        words = command.split()
+        if words[0] == ':SOUR:VOLT':
+            self._sample.bias = float(words[1])
+        elif words[0] == ':SOUR:CURR':
+            self._sample.bias = float(words[1]) * self._sample.resistance
+        elif words[0] in (':CURR:PROT', ':VOLT:PROT'):
+            self._compliance = float(words[1])
+        elif words[0] == ':TRIG:COUN':
+            self._trigger_count = int(words[1])
+        elif words[0] == ':INIT':
+            self._done = time.perf_counter() + self._trigger_count * self._point_time
+        elif words[0] == '*RST':
+            self._sample.bias = 0.0
+
+    def query(self, command):
+        time.sleep(self._round_trip)
+        if command == '*OPC?':
+            return '1' if time.perf_counter() >= self._done else '0'
+        if command == ':FETC?':
+            current = max(min(self._sample.jitter(self._sample.current()), self._compliance), -self._compliance)
+            voltage = self._sample.bias
+            resistance = voltage / current if current else 9.91e37
+            return '{:e},{:e},{:e},{:e},{:e}\n'.format(voltage, current, resistance,
+                                                      time.perf_counter() - self._started, 0)
+        return '0'
+
+
+@contextlib.contextmanager
+def connect(address=None, sample=None, round_trip=0.002):
+    """In place of keithley_k2400.connect, yields a keithley_k2400.SourceMeter on a simulated resource"""
+    resource = SimulatedK2400Resource(sample or Sample.default(), round_trip)
+    try:
+        yield SourceMeter(resource)
+    finally:
+        SourceMeter(resource).set_voltage(0)
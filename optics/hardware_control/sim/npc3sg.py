@@ -0,0 +1,25 @@
+import time
+from optics.hardware_control.sim import daq
+
+
+class NPC3SGReader:
+    """Simulated npc3sg.NPC3SGReader"""
+    def __init__(self, multiple_ai, sleep=0.1):
+        self._multiple_ai = multiple_ai
+        self._sleep = sleep
+
+    def read(self):
+        if self._sleep:
+            time.sleep(self._sleep)
+        voltage = self._multiple_ai.readAll()
+        return [voltage[i] / 10 * 160 for i in voltage]
+
+
+def continuous_input(continuous_ai, ai_channels, points=100):
+    return NPC3SGReader(daq.AnalogInputView(continuous_ai, ai_channels, points=points), sleep=0)
+
+
+def line_scanner(ao_channel, ai_channels, npc3sg_x=None, continuous_ai=None, rate=10000, samples_per_pixel=1000,
+                 discard=100, sample=None):
+    return daq.LineScan(ao_channel, ai_channels, rate=rate, samples_per_pixel=samples_per_pixel, discard=discard,
+                        sample=sample)
@@ -0,0 +1,24 @@
+import contextlib
+import time
+from optics.hardware_control.pm100d import PowerMeter
+from optics.hardware_control.hardware_addresses_and_constants import power_factor
+from optics.hardware_control.sim.sample import Sample
+
+
+class SimulatedThorlabsPM100:
+    """Stands in for ThorlabsPM100, so the real pm100d.PowerMeter runs on top of it. Reading read takes round_trip
+    seconds and gives the power of the sample divided by power_factor, the fraction of the beam on the detector"""
+    def __init__(self, sample, round_trip=0.003):
+        self._sample = sample
+        self._round_trip = round_trip
+
+    @property
+    def read(self):
+        time.sleep(self._round_trip)
+        return self._sample.jitter(self._sample.power) / power_factor
+
+
+@contextlib.contextmanager
+def connect(address=None, sample=None, round_trip=0.003):
+    """In place of pm100d.connect"""
+    yield PowerMeter(SimulatedThorlabsPM100(sample or Sample.default(), round_trip))
@@ -0,0 +1,66 @@
+import contextlib
+import time
+from optics.hardware_control.sim.sample import Sample
+
+
+class RotatorMountController:
+    """Simulated polarizercontroller.RotatorMountController. Moves block for as long as the rotation takes at speed
+    degrees per second, like the wait handler of the Kinesis motor, and turn the polarization of the sample"""
+    def __init__(self, sample=None, speed=20.0):
+        self._sample = sample or Sample.default()
+        self._speed = speed
+        self._position = 0.0
+
+    def read_position(self, wait_ms=0):
+        time.sleep(wait_ms / 1000)
+        return self._position
+
+    def home(self):
+        self.move_to(0)
+
+    def move(self, position):
+        while position > 360:
+            position -= 360
+        self.move_to(position)
+
+    def move_to(self, position):
+        time.sleep(abs(position - self._position) / self._speed)
+        self._position = position
+        self._sample.polarization = self.read_polarization()
+
+    def read_polarization(self, wait_ms=0):
+        return self.read_position(wait_ms)
+
+
+class WaveplateController(RotatorMountController):
+    """Simulated polarizercontroller.WaveplateController, a half wave plate turning the polarization twice as far"""
+    def move_nearest(self, position):
+        current_position = self.read_position()
+        i = 0
+        for i in range(180):
+            if position % 90 - 0.5 < (current_position + i) % 90 < position % 90 + 0.5:
+                break
+        self.move(current_position + i)
+
+    def read_polarization(self, wait_ms=0):
+        return self.read_position(wait_ms) * 2
+
+
+class PolarizerController(RotatorMountController):
+    """Simulated polarizercontroller.PolarizerController"""
+    def move_nearest(self, position):
+        period = 90 if position in (0, 45) else 180
+        i = (position - self._position) % period
+        self.move_to(self._position + i)
+
+
+@contextlib.contextmanager
+def connect_tdc001(serial_number=None, waveplate=False, sample=None):
+    """In place of polarizercontroller.connect_tdc001"""
+    yield WaveplateController(sample) if waveplate else PolarizerController(sample)
+
+
+@contextlib.contextmanager
+def connect_kdc101(serial_number=None, waveplate=True, sample=None):
+    """In place of polarizercontroller.connect_kdc101"""
+    yield WaveplateController(sample) if waveplate else PolarizerController(sample)
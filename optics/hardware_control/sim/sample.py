@@ -0,0 +1,105 @@
+import time
+import numpy as np
+
+
+class PiezoAxis:
+    """One axis of the simulated NPC3SG piezo stage. A move sets a new target and the stage relaxes towards it
+    exponentially with settle_time, like the real closed loop controller, so reading the position straight after a
+    move gives a position that is still on its way"""
+    def __init__(self, position=80.0, settle_time=0.005, travel=160.0):
+        self._settle_time = settle_time
+        self._travel = travel
+        self._start = position
+        self._target = position
+        self._moved = time.perf_counter()
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def position(self):
+        elapsed = time.perf_counter() - self._moved
+        return self._target + (self._start - self._target) * np.exp(-elapsed / self._settle_time)
+
+    def move(self, position, settled=False):
+        """settled=True puts the stage at position straight away"""
+        self._start = position if settled else self.position
+        self._target = float(np.clip(position, 0, self._travel))
+        self._moved = time.perf_counter()
+
+
+class Sample:
+    """The simulated device under the laser, shared by the simulated instruments so that what one of them changes
+    (the piezo position, the bias, the laser power or polarization) shows up in what the others read.
+
+    The photovoltage is a gaussian spot of width um (the laser on a junction at center) scaled by the laser power
+    and cos^2 of the polarization. The junction has a current I(V) = V / resistance + nonlinearity * V^3, and its
+    derivatives are what the dual harmonic lock in measures. Every time a bias above break_voltage is applied the
+    resistance grows by a factor 1 + electromigration, so an electromigration ramp sees the current drop. gain is the
+    amplifier gain between the junction and the lock ins, so the conversions in misc_utility.conversions give back didv,
+    d2idv2 and the current.
+
+    Usage: sample = Sample(resistance=10e3), shared by all instruments made with sample=sample, or Sample.default()
+    """
+    _default = None
+
+    def __init__(self, center=(80.0, 80.0), width=3.0, photovoltage=1e-3, resistance=10e3, nonlinearity=1e-5,
+                 gain=1000, power=1e-3, noise=0.01, settle_time=0.005, break_voltage=0.5, electromigration=0.05,
+                 seed=0):
+        self.x = PiezoAxis(settle_time=settle_time)
+        self.y = PiezoAxis(settle_time=settle_time)
+        self.center = center
+        self.width = width
+        self.amplitude = photovoltage
+        self.resistance = resistance
+        self.nonlinearity = nonlinearity
+        self.gain = gain
+        self.power = power  # W on the sample
+        self.polarization = 0.0  # degrees
+        self.break_voltage = break_voltage
+        self.electromigration = electromigration
+        self._bias = 0.0
+        self.noise = noise  # relative
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def default(cls):
+        """The sample the simulated instruments share when they are not given one"""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @property
+    def bias(self):
+        """V across the junction"""
+        return self._bias
+
+    @bias.setter
+    def bias(self, value):
+        self._bias = value
+        if abs(value) > self.break_voltage:
+            self.resistance *= 1 + self.electromigration
+
+    def jitter(self, value):
+        return value * (1 + self.noise * self.rng.standard_normal(np.shape(value)))
+
+    def photovoltage(self, x=None, y=None):
+        """Photovoltage at the laser spot, or at piezo position (x, y)"""
+        x = self.x.position if x is None else x
+        y = self.y.position if y is None else y
+        r2 = (x - self.center[0]) ** 2 + (y - self.center[1]) ** 2
+        polarization = np.cos(np.radians(self.polarization)) ** 2
+        return self.amplitude * np.exp(-r2 / (2 * self.width ** 2)) * polarization * self.power / 1e-3
+
+    def current(self, bias=None):
+        bias = self.bias if bias is None else bias
+        return bias / self.resistance + self.nonlinearity * bias ** 3
+
+    def didv(self, bias=None):
+        bias = self.bias if bias is None else bias
+        return 1 / self.resistance + 3 * self.nonlinearity * bias ** 2
+
+    def d2idv2(self, bias=None):
+        bias = self.bias if bias is None else bias
+        return 6 * self.nonlinearity * bias
@@ -0,0 +1,200 @@
+import contextlib
+import time
+import numpy as np
+from optics.hardware_control.sr7270 import LockIn
+from optics.hardware_control.sim.sample import Sample
+from optics.hardware_control.hardware_addresses_and_constants import low_pass_filter_factor
+
+TIME_CONSTANTS = [10e-06, 20e-06, 50e-06, 100e-06, 200e-06, 500e-06, 1e-03, 2e-03, 5e-03, 10e-03, 20e-03, 50e-03,
+                  100e-03, 200e-03, 500e-03, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000,
+                  50000, 100000]
+SENSITIVITIES = [None, 2e-9, 5e-9, 1e-8, 2e-8, 5e-8, 1e-7, 2e-7, 5e-7, 1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4,
+                 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 0.1, 0.2, 0.5, 1]  # volts, by sen command index
+COMMAND_COMPLETE = 0x01
+
+
+class Filter:
+    """First order low pass output of one lock in channel. The input is sampled whenever the output is read, so the
+    output settles towards a new value over a few time constants after the sample changes"""
+    def __init__(self, time_constant):
+        self.time_constant = time_constant
+        self._value = None
+        self._updated = time.perf_counter()
+
+    def read(self, value):
+        now = time.perf_counter()
+        if self._value is None:
+            self._value = value
+        else:
+            self._value = value + (self._value - value) * np.exp(-(now - self._updated) / self.time_constant)
+        self._updated = now
+        return self._value
+
+
+class SimulatedLockInUSB:
+    """Stands in for the PyUSB device and both endpoints of one SR7270, so the real sr7270.LockIn runs unchanged on
+    top of it: commands written to the out endpoint are answered with the same reply bytes the lock in sends (comma
+    separated values, a null character, the status byte and the overload byte).
+
+    Commands are handled one at a time, each taking round_trip seconds after it has been written, and every USB
+    transfer takes transfer seconds, so sending a batch before reading (LockIn.query_many) is faster than a command
+    and a read at a time, as on the hardware. The outputs come from the shared Sample through a Filter for every
+    channel, with the time constants set by tc commands. Outputs larger than the sensitivity set the overload bits.
+
+    Usage: with create_endpoints(sample=sample) as lock_ins, see create_endpoints
+    """
+    def __init__(self, sample, mode=0, round_trip=0.002, transfer=0.0002, time_constant=0.1, sensitivity=1e-3,
+                 oscillator_amplitude=0.007, oscillator_frequency=1000.0):
+        self._sample = sample
+        self._mode = mode
+        self._round_trip = round_trip
+        self._transfer = transfer
+        self._pending = []  # (time the reply is ready, reply bytes)
+        self._busy_until = 0
+        self._output = b''
+        self._tc = {1: time_constant, 2: time_constant}
+        self._sensitivity = {1: sensitivity, 2: sensitivity}
+        self._filters = {}
+        self._outputs = {}  # the last output of every channel with its overload bits, for st
+        self._dac = {i: 0.0 for i in range(1, 5)}
+        self._oscillator_amplitude = oscillator_amplitude
+        self._oscillator_frequency = oscillator_frequency
+        self._curve_buffer = {'length': 1000, 'interval': 5, 'started': None, 'curves': ()}
+
+    def write(self, command):
+        """The out endpoint"""
+        time.sleep(self._transfer)
+        now = time.perf_counter()
+        values, overload = self.handle(command.strip())
+        status = COMMAND_COMPLETE | (0x10 if overload else 0)
+        body = b','.join(b'%.6g' % value for value in values) + b'\n' if values is not None else b''
+        self._busy_until = max(now, self._busy_until) + self._round_trip
+        self._pending.append((self._busy_until, body + bytes([0, status, overload])))
+
+    def read(self, endpoint, size, timeout=100):
+        """dev.read(ep1, size, timeout): waits for the next reply and returns every reply ready by then, up to size
+        bytes, with tobytes() like the array PyUSB returns"""
+        if not self._output:
+            if not self._pending:
+                raise TimeoutError('SR7270 simulation: read without a command')
+            time.sleep(max(self._pending[0][0] - time.perf_counter(), 0))
+            now = time.perf_counter()
+            while self._pending and self._pending[0][0] <= now:
+                self._output += self._pending.pop(0)[1]
+        time.sleep(self._transfer)
+        chunk, self._output = self._output[:size], self._output[size:]
+        return memoryview(chunk)
+
+    def output(self, name, value, channel=1, overload_bits=0):
+        """The filtered output of a channel, and its overload bits if it is larger than the sensitivity"""
+        if name not in self._filters:
+            self._filters[name] = Filter(self._tc[channel])
+        self._filters[name].time_constant = self._tc[channel]
+        value = self._filters[name].read(self._sample.jitter(value))
+        self._outputs[name] = (value, channel, overload_bits)
+        return value, self.overload(name)
+
+    def overload(self, name):
+        value, channel, overload_bits = self._outputs[name]
+        return overload_bits if abs(value) > self._sensitivity[channel] else 0
+
+    def xy(self, name, value, channel, overload_bits):
+        x, overload = self.output(name, value, channel, overload_bits)
+        return [x, 0.05 * x], overload
+
+    def handle(self, command):
+        """Returns (output values or None, overload byte) for a command"""
+        sample = self._sample
+        words = command.split()
+        name, arguments = words[0], [float(i) for i in words[1:]]
+        channel = 2 if name.rstrip('.').endswith('2') else 1
+        gain = sample.gain
+        osc = self._oscillator_amplitude
+        if name == 'REFMODE':
+            return [self._mode], 0
+        if name == 'xy.':
+            return self.xy('xy', sample.photovoltage() / 2.22, 1, 0x03)  # read as the rms of a square wave
+        if name == 'xy1.':
+            return self.xy('xy1', sample.didv() * gain * osc, 1, 0x03)
+        if name == 'xy2.':
+            return self.xy('xy2', sample.d2idv2() * gain * osc ** 2 / 4, 2, 0x0c)
+        if name == 'mp.':
+            x, overload = self.output('xy', sample.photovoltage() / 2.22, 1, 0x03)
+            return [abs(x), 0.0], overload
+        if name == 'adc.':
+            if arguments[0] == 3:
+                return [sample.jitter(sample.current() * gain * low_pass_filter_factor)], 0
+            return [0.0], 0
+        if name in ('tc.', 'tc1.', 'tc2.'):
+            return [self._tc[channel]], 0
+        if name in ('tc', 'tc1', 'tc2'):
+            for i in ((1, 2) if name == 'tc' else (channel,)):
+                self._tc[i] = TIME_CONSTANTS[int(arguments[0])]
+            return None, 0
+        if name in ('sen.', 'sen1.', 'sen2.'):
+            return [self._sensitivity[channel]], 0
+        if name in ('sen', 'sen1', 'sen2'):
+            for i in ((1, 2) if name == 'sen' else (channel,)):
+                self._sensitivity[i] = SENSITIVITIES[int(arguments[0])]
+            return None, 0
+        if name in ('refp.', 'refp1.', 'refp2.'):
+            return [0.0], 0
+        if name == 'dac':
+            self._dac[int(arguments[0])] = arguments[1] / 100  # see LockIn.change_applied_voltage
+            if int(arguments[0]) == 3:
+                sample.bias = self._dac[3]
+            return None, 0
+        if name == 'dac.':
+            return [self._dac[int(arguments[0])]], 0
+        if name == 'of':
+            self._oscillator_frequency = arguments[0] / 100
+            return None, 0
+        if name == 'of.':
+            return [self._oscillator_frequency], 0
+        if name == 'oa':
+            self._oscillator_amplitude = arguments[0] / 100 / 1000
+            return None, 0
+        if name == 'oa.':
+            return [self._oscillator_amplitude], 0
+        if name == 'cbd':
+            self._curve_buffer['curves'] = [curve for curve, bit in LockIn.curve_bits.items()
+                                            if int(arguments[0]) & (1 << bit)]
+            return None, 0
+        if name == 'len':
+            self._curve_buffer['length'] = int(arguments[0])
+            return None, 0
+        if name == 'str':
+            self._curve_buffer['interval'] = arguments[0]
+            return None, 0
+        if name == 'td':
+            self._curve_buffer['started'] = time.perf_counter()
+            return None, 0
+        if name == 'st':
+            overload = 0
+            for output in self._outputs:
+                overload |= self.overload(output)
+            return None, overload
+        if name == 'm':
+            points = self.curve_points()
+            running = points < self._curve_buffer['length']
+            return [1 if running else 5, 0 if running else 1, 0, points], 0
+        if name == 'dc.':
+            points = self.curve_points()
+            return list(sample.jitter(np.full(points, sample.photovoltage() / 2.22))), 0
+        return None, 0  # AQN, n, hc and other settings only need the status bytes
+
+    def curve_points(self):
+        started = self._curve_buffer['started']
+        if started is None:
+            return 0
+        elapsed = (time.perf_counter() - started) * 1000
+        return min(int(elapsed / self._curve_buffer['interval']), self._curve_buffer['length'])
+
+
+@contextlib.contextmanager
+def create_endpoints(vendor=None, product=None, sample=None, round_trip=0.002, transfer=0.0002):
+    """Yields a single reference (mode 0) and a dual harmonic (mode 1) sr7270.LockIn on simulated USB devices, in
+    place of sr7270.create_endpoints. vendor and product are ignored"""
+    sample = sample or Sample.default()
+    devices = [SimulatedLockInUSB(sample, mode, round_trip, transfer) for mode in (0, 1)]
+    yield (LockIn(device, device, device) for device in devices)
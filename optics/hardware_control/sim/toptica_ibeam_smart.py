@@ -0,0 +1,56 @@
+import contextlib
+import time
+from optics.hardware_control.toptica_ibeam_smart import Laser
+from optics.hardware_control.sim.sample import Sample
+
+
+class SimulatedLaserSerial:
+    """Stands in for the serial port of the iBeam smart, so the real toptica_ibeam_smart.Laser runs on top of it.
+    Every command is answered after round_trip seconds in the format of the laser's command line. Setting the power
+    of a channel sets the power of the sample (the sum of both channels)"""
+    def __init__(self, sample, round_trip=0.01):
+        self._sample = sample
+        self._round_trip = round_trip
+        self._power = {1: 0.0, 2: sample.power * 1000}
+        self._on = True
+        self._fine = False
+        self._reply = b''
+
+    def write(self, message):
+        words = message.decode().split()
+        reply = []
+        if words[:2] == ['sh', 'temp'] and len(words) == 2:
+            reply = ['TEMP LD = 25.00 C']
+        elif words[:3] == ['sh', 'temp', 'sys']:
+            reply = ['TEMP SYS = 30.00 C']
+        elif words[:2] == ['sh', 'curr']:
+            reply = ['LDC = {:.0f} mA'.format(50 + sum(self._power.values()) if self._on else 0)]
+        elif words[:3] == ['sh', 'level', 'pow']:
+            reply = ['CH{}, PWR: {:.3f} mW'.format(channel, power) for channel, power in self._power.items()]
+        elif words[:2] == ['sta', 'la']:
+            reply = ['ON' if self._on else 'OFF']
+        elif words[:2] == ['sta', 'fine']:
+            reply = ['ON' if self._fine else 'OFF']
+        elif words[:1] == ['la']:
+            self._on = words[1] == 'on'
+        elif words[:2] == ['fine', 'on'] or words[:2] == ['fine', 'off']:
+            self._fine = words[1] == 'on'
+        elif words[:1] == ['ch'] and words[2] == 'pow':
+            self._power[int(words[1])] = float(words[3])
+            self._sample.power = sum(self._power.values()) / 1000
+        self._reply = '\r\n'.join(reply + ['CMD> ']).encode()
+        return len(message)
+
+    def read(self, size=1):
+        time.sleep(self._round_trip)
+        reply, self._reply = self._reply[:size], self._reply[size:]
+        return reply
+
+    def close(self):
+        pass
+
+
+@contextlib.contextmanager
+def connect_laser(serial_port=None, sample=None, round_trip=0.01):
+    """In place of toptica_ibeam_smart.connect_laser"""
+    yield Laser(SimulatedLaserSerial(sample or Sample.default(), round_trip))
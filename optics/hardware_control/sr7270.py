@@ -1,19 +1,46 @@
 import contextlib
-import usb.core
-import usb.util
-from collections import OrderedDict
+import threading
 import time
 from itertools import count
+import numpy as np
 
 # This module uses PyUSB which can be accessed here: https://github.com/pyusb/pyusb with documentation at:
 # http://pyusb.github.io/pyusb/
 
 
+STATUS_ERRORS = ((0x02, 'Invalid lock in command'), (0x04, 'Invalid lock in command parameter'))
+REFERENCE_UNLOCK = 0x08
+OUTPUT_OVERLOAD = 0x10
+X1_Y1_OVERLOAD = 0x03
+EXCLAMATION = ord('!')
+OVERLOAD_CODES = ['X1', 'Y1', 'X2', 'Y2', 'CH1', 'CH2', 'CH3', 'CH4']
+
+
+def decode_status(status):
+    """Returns (error message or None, reference unlocked, output overload) for a status byte"""
+    error = next((message for bit, message in STATUS_ERRORS if status & bit), None)
+    return error, bool(status & REFERENCE_UNLOCK), bool(status & OUTPUT_OVERLOAD)
+
+
+# every possible status and overload byte is decoded once, so checking a reply is just two table lookups
+STATUS_TABLE = [decode_status(i) for i in range(256)]
+OVERLOAD_TABLE = [tuple(code for bit, code in enumerate(OVERLOAD_CODES) if i & (1 << bit)) for i in range(256)]
+
+
+def parse_values(reply):
+    """Parses the comma separated floats in a raw reply, dropping the null, status and overload bytes. Returns None if
+    the reply has no output"""
+    body = reply[:-3].replace(b'\n', b'')
+    return [float(j) for j in body.split(b',')] if body else None
+
+
 @contextlib.contextmanager
 def create_endpoints(vendor, product):
     """This function creates endpoints for multiple SR7270 lock in amplifiers using the idVendor and idProduct which is
     notated in the hardware_addresses_and_constants module under hardware_control. It yields instances of the LockIn
     class for each lock in amplifier of the same idVendor and idProduct"""
+    import usb.core  # only needed to open the devices, so the module can be used with sim.sr7270 without PyUSB
+    import usb.util
     devs = []
     endpoints = []
     try:
@@ -35,6 +62,39 @@ def create_endpoints(vendor, product):
             raise ValueError
 
 
+def read_all(requests):
+    """Reads several lock in amplifiers at the same time. requests is a list of (lock_in, command) pairs such as
+    [(sr7270_single_reference, 'xy.'), (sr7270_dual_harmonic, 'xy1.'), (sr7270_dual_harmonic, 'adc. 3')]. The
+    commands for each lock in are sent as one query_many batch on a thread of their own (the first on the calling
+    thread), and the threads wait on a barrier so that every batch is sent at the same moment. Each lock in is a
+    separate USB device, so the round trips overlap instead of adding up. Returns (timestamp, *outputs) with the
+    outputs in the order of requests and the time.time() at which the batches were released."""
+    batches = {}
+    for lock_in, command in requests:
+        batches.setdefault(lock_in, []).append(command)
+    replies = {}
+    errors = []
+    released = []
+    barrier = threading.Barrier(len(batches), action=lambda: released.append(time.time()))
+
+    def query(lock_in, commands):
+        try:
+            barrier.wait()
+            replies[lock_in] = iter(lock_in.query_many(commands))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=query, args=batch) for batch in list(batches.items())[1:]]
+    for thread in threads:
+        thread.start()
+    query(*next(iter(batches.items())))
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return (released[0], *[next(replies[lock_in]) for lock_in, _ in requests])
+
+
 class LockIn:
     """This is a class that controls the SR7270 lock in amplifier using USB commands listed in the Ametek manual
     Appendix E "Alphabetical Listing of Commands" which can be found in here:
@@ -52,35 +112,16 @@ class LockIn:
         """Checks lock in amplifier status and overload bytes"""
         self._overload = False
         self._unlocked = False
-        status_codes = OrderedDict({'command complete': 0, 'invalid command': 'Invalid lock in command',
-                                    'invalid command parameter': 'Invalid lock in command parameter',
-                                    'reference unlock': 0,
-                                    'output overload': 0,
-                                    'new ADC after trigger': 0,
-                                    'input overload': 'Lock in input overload',
-                                    'data available': 0})
-        overload_codes = ['X1', 'Y1', 'X2', 'Y2', 'CH1', 'CH2', 'CH3', 'CH4']
-        status_bytes = [x for x in i[-2::]]
-        i = i[0:-3].replace('\n', '')
-        if status_bytes[0] == '!':
-            return [float(j) for j in i.split(',')] if i else None
-        for j, k in enumerate(reversed(bin(ord(status_bytes[0])))):
-            if k == '1':
-                if status_codes[list(status_codes.keys())[j]]:
-                    if status_codes[list(status_codes.keys())[j]] != 'Lock in input overload':
-                        raise ValueError(status_codes[list(status_codes.keys())[j]])
-                    #else:
-                    #    print('Warning: {}'.format(status_codes[list(status_codes.keys())[j]]))
-                if list(status_codes.keys())[j] == 'reference unlock':
-                    self._unlocked = True
-                else:
-                    if list(status_codes.keys())[j] == 'output overload':
-                        for l, m in enumerate(reversed(bin(ord(status_bytes[1])))):
-                            if m == '1':
-                                print('{} output overload'.format(overload_codes[l]))
-                                if overload_codes[l] == 'X1' or overload_codes[l] == 'Y1':
-                                    self._overload = True
-        return [float(j) for j in i.split(',')] if i else None
+        if i[-2] == EXCLAMATION:
+            return parse_values(i)
+        error, self._unlocked, output_overload = STATUS_TABLE[i[-2]]
+        if error:
+            raise ValueError(error)
+        if output_overload:
+            for channel in OVERLOAD_TABLE[i[-1]]:
+                print('{} output overload'.format(channel))
+            self._overload = bool(i[-1] & X1_Y1_OVERLOAD)
+        return parse_values(i)
 
     def auto_sensitivity(self, channel=0):
         """Sets the sensitivity of output channels to lowest sensitivity to not cause overloading"""
@@ -91,16 +132,14 @@ class LockIn:
         self.read()
         if self._overload:
             self._ep0.write('sen{}.'.format(channels[channel]))
-            s = self.read_dev()[0:-3].replace('\n', '')
-            s = [float(j) for j in s.split(',')][0] * 1000
+            s = parse_values(self.read_dev())[0] * 1000
             s = [sens[i + 1] for i in range(len(sens)) if sens[i] == s][0]
             print('Auto adjusting sensitivity to {} mV'.format(s))
             self.change_sensitivity(s, channel=channel)
             self._ep0.write('st')
             self.read()
             self._ep0.write('tc{}.'.format(channels[channel]))
-            tc = self.read_dev()[0:-3].replace('\n', '')
-            tc = [float(j) for j in tc.split(',') if ','][0]
+            tc = parse_values(self.read_dev())[0]
             time.sleep(tc * 3)
             if next(self._loops) > 5:
                 raise ValueError('Lock in sensitivity out of range')
@@ -110,10 +149,63 @@ class LockIn:
         """Returns the parsed lock in amplifier outputs"""
         return self.check_status(self.read_dev())
 
-    def read_dev(self):
-        """Reads the raw output from the lock in. The last four characters are: new line, null character, a status
+    def read_replies(self, number):
+        """Reads the raw output of a number of commands sent back to back. Replies may arrive split across or packed
+        into USB packets, so they are separated on the null character that precedes the status and overload bytes"""
+        buffer = b''
+        replies = []
+        while len(replies) < number:
+            buffer += self.read_dev()
+            end = buffer.find(b'\x00')
+            while end >= 0 and len(buffer) >= end + 3:
+                replies.append(buffer[:end + 3])
+                buffer = buffer[end + 3:]
+                end = buffer.find(b'\x00')
+        return replies
+
+    def query_many(self, commands):
+        """Sends a batch of read commands back to back and parses all of the replies in one pass. Returns a list of
+        the parsed outputs in the same order as commands. An X/Y overload on 'xy.' or 'xy1.' auto adjusts the
+        sensitivity and repeats the batch, and a reference unlock while reading 'xy.' waits for the reference to lock,
+        the same as read_xy and read_xy1"""
+        overload_channels = {'xy.': 0, 'xy1.': 1}
+        while True:
+            for command in commands:
+                self._ep0.write(command)
+            values = []
+            unlocked = False
+            overloaded = None
+            for command, reply in zip(commands, self.read_replies(len(commands))):
+                values.append(self.check_status(reply))
+                if command == 'xy.':
+                    unlocked = self._unlocked
+                if self._overload and overloaded is None and command in overload_channels:
+                    overloaded = overload_channels[command]
+            if not unlocked:
+                break
+            time.sleep(0.25)
+        if overloaded is not None:
+            self._loops = count(0)
+            self.auto_sensitivity(channel=overloaded)
+            for command in commands:
+                self._ep0.write(command)
+            values = [self.check_status(reply) for reply in self.read_replies(len(commands))]
+        return values
+
+    def read_dev(self, size=100):
+        """Reads the raw output from the lock in as bytes. The last four bytes are: new line, null character, a status
         byte representing any errors, and an overload byte indicating which channel is overloading"""
-        return ''.join(chr(x) for x in self._dev.read(self._ep1, 100, 100))
+        return self._dev.read(self._ep1, size, 100).tobytes()
+
+    def read_long_reply(self):
+        """Reads a reply that spans many USB packets, such as a curve buffer dump"""
+        chunks = []
+        while True:
+            chunks.append(self.read_dev(4096))
+            tail = b''.join(chunks[-2:])
+            end = tail.find(b'\x00')
+            if end >= 0 and len(tail) >= end + 3:
+                return b''.join(chunks)
 
     def check_reference_mode(self):
         """Checks the reference mode of the lock in amplifier. Returns 0 if single reference, 1 if dual harmonic, and
@@ -256,6 +348,53 @@ class LockIn:
                 self._ep0.write('refp2.')
         return self.read()[0]
 
+    curve_bits = {'x': 0, 'y': 1, 'magnitude': 2, 'phase': 3, 'sensitivity': 4, 'adc1': 5, 'adc2': 6, 'adc3': 7}
+    curve_buffer_points = 100000
+
+    def setup_curve_buffer(self, curves=('x', 'y'), interval_ms=5, length=1000):
+        """Sets which curves the internal curve buffer stores, the storage interval in ms and the number of points.
+        The sensitivity curve is always stored so that the curves can be dumped in volts. Returns the number of points,
+        which is reduced to fit the buffer if needed, and the interval in ms that was applied, which the lock in rounds
+        to whole ms"""
+        bits = {'sensitivity'}.union(curves)
+        length = min(int(length), self.curve_buffer_points // len(bits))
+        interval_ms = max(int(round(interval_ms)), 1)
+        self._ep0.write('cbd {}'.format(sum(1 << self.curve_bits[i] for i in bits)))
+        self.read_dev()
+        self._ep0.write('len {}'.format(length))
+        self.read_dev()
+        self._ep0.write('str {}'.format(interval_ms))
+        self.read_dev()
+        return length, interval_ms
+
+    def start_curve_buffer(self):
+        """Starts a single acquisition into the curve buffer"""
+        self._ep0.write('td')
+        self.read_dev()
+
+    def stop_curve_buffer(self):
+        """Halts curve buffer acquisition"""
+        self._ep0.write('hc')
+        self.read_dev()
+
+    def read_curve_buffer_status(self):
+        """Returns [acquisition status, sweeps, status byte, points acquired]. Acquisition status is 0 with nothing
+        running, 1 while running and 5 once halted"""
+        self._ep0.write('m')
+        return self.read()
+
+    def read_curve(self, curve):
+        """Downloads one stored curve in volts as a numpy array"""
+        self._ep0.write('dc. {}'.format(self.curve_bits[curve]))
+        reply = self.read_long_reply()
+        end = reply.find(b'\x00')
+        self.check_status(reply[end:end + 3])
+        return np.array(reply[:end].replace(b',', b' ').split(), dtype=float)
+
+    def read_curves(self, curves=('x', 'y')):
+        """Downloads several stored curves. Returns a dictionary of numpy arrays keyed by curve name"""
+        return {curve: self.read_curve(curve) for curve in curves}
+
     def status(self):
         self._ep0.write('n')
         return self.read()
@@ -1,9 +1,9 @@
 import contextlib
-import serial
 import time
 
 @contextlib.contextmanager
 def connect_laser(serial_port='COM7'):
+    import serial  # imported here so that Laser can be used with sim.toptica_ibeam_smart without pyserial
     ser = None
     try:
         ser = serial.Serial(serial_port, 115200, xonxoff=False, timeout=0.4, write_timeout=0.1)
@@ -1,9 +1,9 @@
 import matplotlib
 matplotlib.use('Qt4Agg')  # this allows you to see the interactive plots!
-from optics.misc_utility import scanner, conversions
-import csv
+from optics.misc_utility import conversions
 import numpy as np
 from optics.heating_plot import heating_plot
+from optics.thermovoltage_plot.live_image import LiveImage
 from tkinter import *
 import warnings
 import os
@@ -12,13 +12,18 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
 import tkinter as tk
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.misc_utility.tkinter_utilities import tk_sleep, has_widgets
+from optics.measurements.scan_engine import ScanEngine
+from optics.storage.writer import open_writer, extension
+from optics.measurements.checkpoint import ScanCheckpoint
+from optics.measurements.settle import lockin_settle
 
 
 class HeatingScan:
     def __init__(self, master, filepath, notes, device, scan, gain, bias, osc, xd, yd, xr, yr, xc, yc,
                  npc3sg_x, npc3sg_y, npc3sg_input, sr7270_dual_harmonic, sr7270_single_reference, powermeter, waveplate,
-                 direction=True):
+                 direction=True, path='raster', file_format='csv', resume=False,
+                 settle='fixed', canvas=FigureCanvasTkAgg):
         self._master = master
         self._filepath = filepath
         self._notes = notes
@@ -48,8 +53,16 @@ class HeatingScan:
         self._sr7270_dual_harmonic = sr7270_dual_harmonic
         self._sr7270_single_reference = sr7270_single_reference
         self._powermeter = powermeter
-        self._z1 = np.zeros((self._xd, self._yd))
-        self._z2 = np.zeros((self._xd, self._yd))
+        self._path = path
+        self._file_format = file_format
+        self._resume = resume  # carries on from the checkpoint of an unfinished scan
+        self._time_constant = self._sr7270_single_reference.read_tc()
+        self._settle = lockin_settle(self._master, self._sr7270_single_reference, settle, self._time_constant)
+        self._engine = ScanEngine(self._master, self._npc3sg_x, self._npc3sg_y, self._xd, self._yd, self._xr, self._yr,
+                                  self._xc, self._yc, self.acquire, channels=2, direction=direction, path=self._path,
+                                  render=self.render)
+        self._z1 = self._engine.z[0]
+        self._z2 = self._engine.z[1]
         self._im1 = self._ax1.imshow(self._z1.T, cmap=plt.cm.coolwarm, interpolation='nearest', origin='lower')
         self._im2 = self._ax2.imshow(self._z2.T, cmap=plt.cm.coolwarm, interpolation='nearest', origin='lower')
         self._clb1 = self._fig.colorbar(self._im1, ax=self._ax1)
@@ -57,19 +70,17 @@ class HeatingScan:
         self._imagefile = None
         self._filename = None
         self._writer = None
-        self._x_val, self._y_val = scanner.find_scan_values(self._xc, self._yc, self._xr, self._yr, self._xd, self._yd)
-        self._direction = direction
-        if not self._direction:
-            self._y_val = self._y_val[::-1]
         self._fig.tight_layout()
-        self._canvas = FigureCanvasTkAgg(self._fig, master=self._master)  # A tk.DrawingArea.
+        self._canvas = canvas(self._fig, master=self._master)  # A tk.DrawingArea.
         self._canvas.draw()
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        self._live1 = LiveImage(self._canvas, self._im1, transpose=True)
+        self._live2 = LiveImage(self._canvas, self._im2, transpose=True)
         self._abort = False
-        self._time_constant = self._sr7270_single_reference.read_tc()
 
     def abort(self):
         self._abort = True
+        self._engine.abort()
 
     def write_header(self):
         self._writer.writerow(['gain:', self._gain])
@@ -79,6 +90,7 @@ class HeatingScan:
         self._writer.writerow(['y range:', self._yr])
         self._writer.writerow(['x center:', self._xc])
         self._writer.writerow(['y center:', self._yc])
+        self._writer.writerow(['scan path:', self._path])
         if self._waveplate:
             self._writer.writerow(['polarization:', self._polarization])
             self._writer.writerow(['raw polarization:', self._measuredpolarization])
@@ -95,6 +107,7 @@ class HeatingScan:
         self._writer.writerow(['single reference time constant:', self._sr7270_single_reference.read_tc()])
         self._writer.writerow(['dual harmonic time constant 1:', self._sr7270_dual_harmonic.read_tc()])
         self._writer.writerow(['dual harmonic time constant 2:', self._sr7270_dual_harmonic.read_tc(channel=2)])
+        self._writer.writerow(['settle:', self._settle.mode])
         self._writer.writerow(['single reference phase:', self._sr7270_single_reference.read_tc()])
         self._writer.writerow(['dual harmonic reference phase 1:', self._sr7270_dual_harmonic.read_reference_phase()])
         self._writer.writerow(['dual harmonic reference phase 2:',
@@ -109,79 +122,64 @@ class HeatingScan:
         self._ax1.title.set_text('iphoto X')
         self._ax2.title.set_text('iphoto Y')
 
-    def update_plot(self, im, data, min_val, max_val):
-        im.set_data(data.T)
-        im.set_clim(vmin=min_val)
-        im.set_clim(vmax=max_val)
+    def checkpoint_settings(self):
+        return dict(self._engine.settings(), device=self._device, gain=self._gain, bias=self._bias, osc=self._osc)
 
-    def onclick(self, event):
-        try:
-            points = [int(np.ceil(event.xdata - 0.5)), int(np.ceil(event.ydata - 0.5))]
-            if not self._direction:
-                points = [int(np.ceil(event.xdata - 0.5)), int(np.ceil(self._yd - event.ydata - 0.5 - 1))]
-            self._npc3sg_x.move(self._x_val[points[0]])
-            self._npc3sg_y.move(self._y_val[points[1]])
-            print('pixel: ' + str(points))
-            print('position: ' + str(self._x_val[points[0]]) + ', ' + str(self._y_val[points[1]]))
-        except:
-            print('invalid position')
+    def resumable(self):
+        """True if resuming and the current file has an unfinished checkpoint of a scan with the same settings"""
+        return self._resume and path.exists(self._filename) and \
+            ScanCheckpoint.resumable(self._filename, self.checkpoint_settings())
+
+    def checkpoint(self, resume):
+        instruments = {'time constant': self._time_constant, 'polarization': self._polarization,
+                       'settle': self._settle.mode}
+        return ScanCheckpoint(self._filename, 2, self._xd, self._yd, self.checkpoint_settings(), instruments,
+                              resume=resume, flush=self._writer.flush)
 
     def makefile(self):
         os.makedirs(self._filepath, exist_ok=True)
         index = self._scan
-        self._filename = path.join(self._filepath, '{}_{}_{}{}'.format(self._device, self._polarization, index, '.csv'))
+        file_extension = extension(self._file_format)
+        self._filename = path.join(self._filepath,
+                                   '{}_{}_{}{}'.format(self._device, self._polarization, index, file_extension))
         self._imagefile = path.join(self._filepath,
                                     '{}_{}_{}{}'.format(self._device, self._polarization, index, '.png'))
-        while path.exists(self._filename):
+        while (path.exists(self._filename) or ScanCheckpoint.exists(self._filename)) and not self.resumable():
             index += 1
             self._filename = path.join(self._filepath,
-                                       '{}_{}_{}{}'.format(self._device, self._polarization, index, '.csv'))
+                                       '{}_{}_{}{}'.format(self._device, self._polarization, index, file_extension))
             self._imagefile = path.join(self._filepath,
                                         '{}_{}_{}{}'.format(self._device, self._polarization, index, '.png'))
 
+    def acquire(self, x_ind, y_ind):
+        raw = self._settle(self._sr7270_single_reference.read_xy)
+        currents = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
+        self._writer.writerow([raw[0], raw[1], currents[0], currents[1], x_ind, y_ind])
+        return [currents[0] * 1000, currents[1] * 1000]
+
+    def render(self):
+        self._live1.update(self._z1, self._engine.stats[0].min, self._engine.stats[0].max)
+        self._live2.update(self._z2, self._engine.stats[1].min, self._engine.stats[1].max)
+
     def run_scan(self):
-        for y_ind, i in enumerate(self._y_val):
-            self._master.update()
-            if self._abort:
-                self._npc3sg_x.move(0)
-                self._npc3sg_y.move(0)
-                break
-            if not self._direction:
-                y_ind = len(self._y_val) - y_ind - 1
-            self._npc3sg_y.move(i)
-            for x_ind, j in enumerate(self._x_val):
-                self._npc3sg_x.move(j)
-                tk_sleep(self._master, 3 * 1000 * self._time_constant)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
-                raw = self._sr7270_single_reference.read_xy()
-                currents = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
-                self._writer.writerow([raw[0], raw[1], currents[0], currents[1], x_ind, y_ind])
-                self._z1[x_ind][y_ind] = currents[0] * 1000
-                self._z2[x_ind][y_ind] = currents[1] * 1000
-                self.update_plot(self._im1, self._z1, np.amin(self._z1), np.amax(self._z1))
-                self.update_plot(self._im2, self._z2, np.amin(self._z2), np.amax(self._z2))
-                self._fig.tight_layout()
-                self._canvas.draw()  # dynamically plots the data and closes automatically after completing the scan
-                self._master.update()
-                if self._abort:
-                    self._npc3sg_x.move(0)
-                    self._npc3sg_y.move(0)
-                    break
-        self._npc3sg_x.move(0)
-        self._npc3sg_y.move(0)  # returns piezo controller position to 0,0
+        self._engine.run()
 
     def main(self):
-        button = tk.Button(master=self._master, text="Abort", command=self.abort)
-        button.pack(side=tk.BOTTOM)
+        if has_widgets(self._master):
+            button = tk.Button(master=self._master, text="Abort", command=self.abort)
+            button.pack(side=tk.BOTTOM)
         self.makefile()
-        with open(self._filename, 'w', newline='') as inputfile:
+        resuming = self.resumable()
+        with open_writer(self._filename, self._file_format, 'a' if resuming else 'w') as self._writer:
             try:
-                self._writer = csv.writer(inputfile)
                 self.setup_plots()
                 self._canvas.draw()
                 self._sr7270_dual_harmonic.change_applied_voltage(self._bias)
                 tk_sleep(self._master, 300)
                 self._sr7270_dual_harmonic.change_oscillator_amplitude(self._osc)
-                self.write_header()
+                if not resuming:
+                    self.write_header()
+                self._engine.attach_checkpoint(self.checkpoint(resuming))
                 self.run_scan()
                 heating_plot.plot(self._ax1, self._im1, self._z1, np.amax(self._z1), np.amin(self._z1))
                 heating_plot.plot(self._ax2, self._im2, self._z2, np.amax(self._z2), np.amin(self._z2))
@@ -194,7 +192,7 @@ class HeatingScan:
                 warnings.filterwarnings("ignore", ".*GUI is implemented.*")  # this warning relates to code \
                 # that was never written
                 cid = self._fig.canvas.mpl_connect('button_press_event',
-                                                   self.onclick)  # click on pixel to move laser position there
+                                                   self._engine.onclick)  # click on pixel to move laser position there
             except KeyboardInterrupt:
                 self._fig.savefig(self._imagefile, format='png',
                                   bbox_inches='tight')  # saves an image of the completed data
@@ -0,0 +1,103 @@
+import numpy as np
+
+sampling_modes = ['full', 'adaptive']
+
+
+def grid_lines(pixels, step):
+    """Every step-th pixel index, always including the last one"""
+    return np.unique(np.r_[np.arange(0, pixels, step), pixels - 1])
+
+
+def split(low, high):
+    return [low, (low + high) // 2, high] if high - low > 1 else [low, high]
+
+
+class AdaptiveScan:
+    """Samples a map sparsely through a ScanEngine, spending the pixels where the signal is.
+
+    The corners of a coarse grid of cells (every `coarse` pixels) are measured first. Then, level by level, every
+    cell whose corners differ by more than gradient, or reach more than magnitude, times the largest value measured
+    so far on any channel is split in four and the new corners are measured, until the cells are one pixel across.
+    Cells that are never split are filled in by bilinear interpolation of their corners for display, while the data
+    file only holds the pixels that were measured. A feature that falls between the corners of a coarse cell can be
+    missed, so coarse should be smaller than the smallest feature expected on the map.
+
+    points is the (x_ind, y_ind) of every pixel measured, in order, and engine.completed the mask of them.
+
+    Usage: AdaptiveScan(engine, coarse=4, gradient=0.1, magnitude=0.2).run()
+    """
+    def __init__(self, engine, coarse=4, gradient=0.1, magnitude=0.2):
+        self._engine = engine
+        self._coarse = max(int(coarse), 1)
+        self._gradient = gradient
+        self._magnitude = magnitude
+        self.points = []
+        self.leaves = []
+
+    def corners(self, cells):
+        """Returns the x and y indices of the corners of cells that still need measuring, in serpentine order"""
+        points = {(x, y) for x0, x1, y0, y1 in cells for x in (x0, x1) for y in (y0, y1)}
+        points = [point for point in points if not self._engine.completed[point]]
+        points.sort(key=lambda point: (point[1], point[0] if point[1] % 2 == 0 else -point[0]))
+        return [x for x, _ in points], [y for _, y in points]
+
+    def measure(self, cells):
+        x_inds, y_inds = self.corners(cells)
+        self.points.extend(zip(x_inds, y_inds))
+        return self._engine.measure_points(x_inds, y_inds)
+
+    def needs_refinement(self, cell, scale):
+        x0, x1, y0, y1 = cell
+        if x1 - x0 <= 1 and y1 - y0 <= 1:
+            return False
+        values = self._engine.z[:, [x0, x0, x1, x1], [y0, y1, y0, y1]]
+        spread = values.max(axis=1) - values.min(axis=1)
+        magnitude = np.abs(values).max(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return bool(np.any(spread > self._gradient * scale) | np.any(magnitude > self._magnitude * scale))
+
+    def refine(self, cells):
+        """Returns the children of the cells that need refining, keeping the rest as leaves"""
+        self._engine.flush()
+        scale = np.abs(self._engine.z[:, self._engine.completed]).max(axis=1)
+        scale[scale == 0] = np.inf  # a flat channel never needs refining
+        children = []
+        for cell in cells:
+            if self.needs_refinement(cell, scale):
+                x0, x1, y0, y1 = cell
+                xs, ys = split(x0, x1), split(y0, y1)
+                children.extend((xa, xb, ya, yb) for xa, xb in zip(xs, xs[1:]) for ya, yb in zip(ys, ys[1:]))
+            else:
+                self.leaves.append(cell)
+        return children
+
+    def fill(self):
+        """Interpolates the pixels of every leaf cell that were not measured from the cell's corners"""
+        z = self._engine.z
+        for x0, x1, y0, y1 in self.leaves:
+            tx = (np.arange(x0, x1 + 1) - x0) / max(x1 - x0, 1)
+            ty = (np.arange(y0, y1 + 1) - y0) / max(y1 - y0, 1)
+            corners = z[:, [x0, x1]][:, :, [y0, y1]]
+            block = np.einsum('cij,ia,jb->cab', corners, np.stack([1 - tx, tx]), np.stack([1 - ty, ty]))
+            missing = ~self._engine.completed[x0:x1 + 1, y0:y1 + 1]
+            z[:, x0:x1 + 1, y0:y1 + 1][:, missing] = block[:, missing]
+        self._engine.redraw()
+
+    def run(self):
+        xd, yd = self._engine.completed.shape
+        xs, ys = grid_lines(xd, self._coarse), grid_lines(yd, self._coarse)
+        cells = [(x0, x1, y0, y1) for x0, x1 in zip(xs, xs[1:] if len(xs) > 1 else xs)
+                 for y0, y1 in zip(ys, ys[1:] if len(ys) > 1 else ys)]
+        self._engine.start()
+        complete = False
+        try:
+            while cells:
+                if not self.measure(cells):
+                    return
+                cells = self.refine(cells)
+            self._engine.flush()
+            self.fill()
+            self._engine.report_lines()
+            complete = True
+        finally:
+            self._engine.finish(complete)
@@ -2,6 +2,7 @@ from optics.measurements.base_measurement import LockinBaseMeasurement
 import time
 import csv
 from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.measurements.scheduler import Scheduler
 
 
 class TimeMeasurement(LockinBaseMeasurement):
@@ -14,6 +15,7 @@ class TimeMeasurement(LockinBaseMeasurement):
         self._start_time = None
         self._scan = scan
         self._sleep = 1 / rate * 1000
+        self._scheduler = Scheduler(self._master)
 
     def start(self):
         pass
@@ -28,14 +30,12 @@ class TimeMeasurement(LockinBaseMeasurement):
         pass
 
     def measure(self):
-        self._master.update()
-        self.do_measurement()
-        self._master.update()
-        if not self._abort and time.time() - self._start_time < self._maxtime:
-            self.measure()
+        """One do_measurement per step of the scheduler until the max time is reached"""
+        while not self._abort and time.time() - self._start_time < self._maxtime:
+            self.do_measurement()
+            yield
 
-    def main(self):
-        self.pack_buttons(self._master)
+    def run(self):
         filename, imagefile, self._scan = self.make_file('time scan', self._scan)
         with open(filename, 'w', newline='') as inputfile:
             self.start()
@@ -44,7 +44,11 @@ class TimeMeasurement(LockinBaseMeasurement):
             self.write_header(self._writer)
             self.setup_plots()
             self._canvas.draw()
-            self.measure()
+            yield from self.measure()
             self._fig.savefig(imagefile, format='png', bbox_inches='tight')
             self.stop()
 
+    def main(self):
+        self.pack_buttons(self._master)
+        self._scheduler.start(self.run())
+
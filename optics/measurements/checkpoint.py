@@ -0,0 +1,110 @@
+import json
+import os
+import time
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class ScanCheckpoint:
+    """Scan state kept next to the data file of a map so that an aborted or crashed scan can be resumed.
+
+    The plotted values and a done flag for every pixel live in a memory mapped .npy file. Values are written as each
+    pixel is acquired, but the pixels are only flagged done by save(), every `every` pixels and when the scan ends,
+    after calling flush() to get their data rows out of the measurement's file buffers. A scan that dies therefore
+    repeats at most the pixels since the last save, rather than skipping pixels whose rows never reached the data
+    file. save() also rewrites a .json file next to it with the settings of the scan, the position along the
+    trajectory and the number of completed pixels.
+
+    settings (the grid, path and gain) must match for a scan to be resumed. instruments (time constants,
+    polarization, power) are only recorded, once for every session that adds to the scan.
+
+    A checkpoint is only loaded with resume=True. Otherwise a new one is written over any left at its paths, so a
+    measurement picking a file name should skip names that have a checkpoint (exists) unless it is resuming them.
+
+    Usage: checkpoint = ScanCheckpoint(data_filename, channels, xd, yd, settings, instruments, resume=False,
+                                       flush=writer.flush)
+        ScanCheckpoint.resumable(data_filename, settings), True if an unfinished checkpoint with these settings
+            exists for the data file
+        engine.attach_checkpoint(checkpoint), restores z and the completed pixels into a ScanEngine
+    """
+    def __init__(self, filename, channels, xd, yd, settings, instruments=None, every=20, resume=False, flush=None):
+        self._array_file, self._state_file = self.paths(filename)
+        self._every = every
+        self._flush = flush
+        self._pending = []  # pixels acquired since the last save
+        self._settings = self.normalize(settings)
+        dtype = np.dtype([('z', 'f8', (channels,)), ('done', '?')])
+        if resume:
+            with open(self._state_file) as fin:
+                self._state = json.load(fin)
+            if self._state['complete']:
+                raise ValueError('checkpoint {} is of a finished scan'.format(self._state_file))
+            if self._state['settings'] != self._settings:
+                raise ValueError('checkpoint {} was taken with different scan settings'.format(self._state_file))
+            self._pixels = open_memmap(self._array_file, mode='r+')
+            if self._pixels.dtype != dtype or self._pixels.shape != (xd, yd):
+                raise ValueError('checkpoint {} does not match a {} by {} scan'.format(self._array_file, xd, yd))
+            self._pixels['z'][~self._pixels['done']] = 0  # values of pixels that are measured again
+        else:
+            self._pixels = open_memmap(self._array_file, mode='w+', dtype=dtype, shape=(xd, yd))
+            self._state = {'settings': self._settings, 'sessions': [], 'complete': False}
+        self._state['sessions'].append(self.normalize(dict(instruments or {}, started=time.time())))
+        self.resumed = bool(self.done.any())
+        self.save()
+
+    @staticmethod
+    def normalize(values):
+        """values as they read back from the state file"""
+        return json.loads(json.dumps(values, default=str))
+
+    @staticmethod
+    def paths(filename):
+        """The checkpoint files of a data file. The extension is kept, so scan.csv and scan.h5 have their own"""
+        base, file_extension = os.path.splitext(filename)
+        base = '{}_{}'.format(base, file_extension.lstrip('.')) if file_extension else base
+        return base + '_checkpoint.npy', base + '_checkpoint.json'
+
+    @classmethod
+    def exists(cls, filename):
+        return any(os.path.exists(i) for i in cls.paths(filename))
+
+    @classmethod
+    def resumable(cls, filename, settings=None):
+        """True if the data file has an unfinished checkpoint, taken with settings if they are given"""
+        array_file, state_file = cls.paths(filename)
+        if not (os.path.exists(array_file) and os.path.exists(state_file)):
+            return False
+        with open(state_file) as fin:
+            state = json.load(fin)
+        return not state['complete'] and (settings is None or state['settings'] == cls.normalize(settings))
+
+    @property
+    def z(self):
+        """The (channels, x, y) values of every pixel acquired so far"""
+        return np.moveaxis(self._pixels['z'], -1, 0)
+
+    @property
+    def done(self):
+        return self._pixels['done']
+
+    def add(self, x_ind, y_ind, values):
+        self._pixels['z'][x_ind, y_ind] = values
+        self._pending.append((x_ind, y_ind))
+        self._state['position'] = [int(x_ind), int(y_ind)]
+        if len(self._pending) >= self._every:
+            self.save()
+
+    def save(self, complete=False):
+        """Flushes the data file, marks the pixels added since the last save as done and rewrites the state file"""
+        if self._flush:
+            self._flush()
+        if self._pending:
+            self._pixels['done'][tuple(np.transpose(self._pending))] = True
+            self._pending = []
+        self._pixels.flush()
+        self._state['pixels'] = int(self.done.sum())
+        self._state['updated'] = time.time()
+        self._state['complete'] = complete
+        with open(self._state_file + '.tmp', 'w') as fout:
+            json.dump(self._state, fout, indent=1)
+        os.replace(self._state_file + '.tmp', self._state_file)  # never leaves a half written state file
@@ -0,0 +1,239 @@
+import numpy as np
+from optics.misc_utility import scanner
+from optics.misc_utility.tkinter_utilities import tk_sleep, RenderTick
+from optics.misc_utility.ring_buffer import PixelRingBuffer
+from optics.misc_utility.running_stats import RunningStats
+
+
+class ScanEngine:
+    """Piezo raster scan shared by all of the map measurements.
+
+    The grid comes from scanner.find_scan_values. For every pixel the engine moves the NPC3SG piezo, waits
+    settle_time seconds and calls acquire(x_ind, y_ind), which does the measurement (and any file writing) and returns
+    one value per channel to be plotted. Pixels are buffered and written into z by a render tick at a capped frame
+    rate, after which render() is called so the measurement can redraw its plots.
+
+    path is one of scanner.scan_paths and sets the order the pixels are visited in. axis is the slow axis (the one
+    stepped once per line for raster and serpentine paths); direction=False walks that axis from the top of the grid
+    down. on_line(line_index) is called after every complete line and on_pixel(x_ind, y_ind) after every pixel, which
+    is where line cut-throughs and checkpoints hook in. Paths that do not finish one line at a time (spiral, hilbert)
+    call on_line for every completed line once the scan ends. Pixel indices always refer to x_val and y_val in
+    ascending order, regardless of the direction of the scan.
+
+    If acquire_line(x_inds, y_ind) is given, whole lines along x are measured in one call instead, for hardware timed
+    line scans. It must return an array of shape (channels, len(x_inds)) and needs a raster or serpentine path with y
+    as the slow axis.
+
+    stats holds a RunningStats for every channel, updated with each batch of pixels written into z, for the color
+    limits of the plots.
+
+    attach_checkpoint(checkpoint) restores the pixels of an unfinished scan from a ScanCheckpoint. Pixels that are
+    already complete are skipped (whole lines, for line scans) and every new pixel is written to the checkpoint."""
+    def __init__(self, master, npc3sg_x, npc3sg_y, xd, yd, xr, yr, xc, yc, acquire, channels=1, settle_time=0,
+                 direction=True, axis='y', path='raster', render=None, on_line=None, on_pixel=None, frame_rate=5,
+                 acquire_line=None):
+        self._master = master
+        self._npc3sg_x = npc3sg_x
+        self._npc3sg_y = npc3sg_y
+        self._xd = xd
+        self._yd = yd
+        self.x_val, self.y_val = scanner.find_scan_values(xc, yc, xr, yr, xd, yd)
+        self._acquire = acquire
+        self._acquire_line = acquire_line
+        if acquire_line and (axis != 'y' or path not in ('raster', 'serpentine')):
+            raise ValueError('line acquisition needs a raster or serpentine path along x')
+        self._settle_time = settle_time
+        self._direction = direction
+        self._axis = axis
+        self._path = path
+        self._render = render
+        self._on_line = on_line
+        self._on_pixel = on_pixel
+        self.z = np.zeros((channels, xd, yd))
+        self.completed = np.zeros((xd, yd), dtype=bool)
+        self.stats = [RunningStats([0]) for _ in range(channels)]  # z starts as zeros
+        self._pixels = PixelRingBuffer(1024, channels)  # acquired pixels waiting to be plotted
+        self._render_tick = RenderTick(self._master, self.render, frame_rate)
+        self._position = [None, None]
+        self._dirty = False
+        self._abort = False
+        self._checkpoint = None
+
+    def abort(self):
+        self._abort = True
+
+    def settings(self):
+        """The grid and trajectory of the scan, which a checkpoint has to match for the scan to be resumed"""
+        return {'x values': self.x_val.tolist(), 'y values': self.y_val.tolist(), 'path': self._path,
+                'axis': self._axis, 'direction': self._direction}
+
+    def attach_checkpoint(self, checkpoint):
+        self._checkpoint = checkpoint
+        self.z[:] = checkpoint.z
+        self.completed[:] = checkpoint.done
+        self.reset_stats()
+        self.redraw()
+
+    def trajectory(self):
+        """Returns the x and y pixel indices in the order that they are measured"""
+        x_ind, y_ind, _, _ = scanner.find_trajectory(self.x_val, self.y_val, self._path, self._axis, self._direction)
+        return x_ind, y_ind
+
+    def line_complete(self, line):
+        if self._axis == 'y':
+            return self.completed[:, line].all()
+        return self.completed[line, :].all()
+
+    def move(self, x_ind, y_ind):
+        """Moves the piezo to a pixel, only commanding the axes that actually change"""
+        if self._position[1] != y_ind:
+            self._npc3sg_y.move(self.y_val[y_ind])
+        if self._position[0] != x_ind:
+            self._npc3sg_x.move(self.x_val[x_ind])
+        self._position = [x_ind, y_ind]
+
+    def home(self):
+        self._npc3sg_x.move(0)
+        self._npc3sg_y.move(0)  # returns piezo controller position to 0,0
+        self._position = [None, None]
+
+    def add_pixel(self, x_ind, y_ind, values):
+        if self._pixels.full():
+            self.render()
+        self._pixels.push(x_ind, y_ind, values)
+        self.completed[x_ind, y_ind] = True
+        if self._checkpoint:
+            self._checkpoint.add(x_ind, y_ind, values)
+
+    def flush(self):
+        """Writes every buffered pixel into z. Returns True if there were any"""
+        x_ind, y_ind, values = self._pixels.drain()
+        if len(values):
+            self.z[:, x_ind, y_ind] = values.T
+            for stats, channel in zip(self.stats, values.T):
+                stats.add(channel)
+        return bool(len(values))
+
+    def reset_stats(self):
+        """Recomputes stats from the whole of z, for when z is changed other than by acquiring pixels"""
+        self.stats = [RunningStats(channel) for channel in self.z]
+
+    def redraw(self):
+        """Asks for the plots to be redrawn on the next render tick even if no new pixels arrive"""
+        self._dirty = True
+
+    def render(self):
+        if not self.flush() and not self._dirty:
+            return
+        self._dirty = False
+        if self._render:
+            self._render()
+
+    def start(self):
+        self._render_tick.start()
+
+    def finish(self, complete=None):
+        """Stops the render tick, homes the piezo and draws the last pixels. complete marks the checkpoint as finished,
+        and defaults to whether every pixel was measured"""
+        self._render_tick.stop()
+        self.home()
+        self.render()
+        if self._checkpoint:
+            self._checkpoint.save(complete=bool(self.completed.all()) if complete is None else complete)
+
+    def measure_points(self, x_inds, y_inds):
+        """Measures the given pixels in order, skipping any that are complete, for scans that choose their own points.
+        Call start() before and finish() after. Returns False if the scan was aborted"""
+        for x_ind, y_ind in zip(x_inds, y_inds):
+            self._master.update()
+            if self._abort:
+                return False
+            if self.completed[x_ind, y_ind]:
+                continue
+            self.move(x_ind, y_ind)
+            if self._settle_time:
+                tk_sleep(self._master, self._settle_time * 1000)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
+            self.add_pixel(x_ind, y_ind, self._acquire(x_ind, y_ind))
+            if self._on_pixel:
+                self._on_pixel(x_ind, y_ind)
+        return True
+
+    def report_lines(self):
+        """Calls on_line for every line of the grid, such as once the gaps of a sparse scan have been filled in"""
+        if self._on_line:
+            self.flush()
+            for line in range(self._yd if self._axis == 'y' else self._xd):
+                self._on_line(line)
+
+    def run(self):
+        if self._acquire_line:
+            self.run_lines()
+            return
+        x_inds, y_inds = self.trajectory()
+        remaining = ~self.completed[x_inds, y_inds]
+        x_inds, y_inds = x_inds[remaining], y_inds[remaining]
+        lines = y_inds if self._axis == 'y' else x_inds
+        by_line = self._path in ('raster', 'serpentine')
+        self._render_tick.start()
+        try:
+            for n, (x_ind, y_ind) in enumerate(zip(x_inds, y_inds)):
+                self._master.update()
+                if self._abort:
+                    break
+                self.move(x_ind, y_ind)
+                if self._settle_time:
+                    tk_sleep(self._master, self._settle_time * 1000)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
+                self.add_pixel(x_ind, y_ind, self._acquire(x_ind, y_ind))
+                if self._on_pixel:
+                    self._on_pixel(x_ind, y_ind)
+                if self._on_line and by_line and (n == len(lines) - 1 or lines[n + 1] != lines[n]):
+                    self.flush()
+                    self._on_line(lines[n])
+            if self._on_line and not by_line:
+                self.flush()
+                for line in range(self._yd if self._axis == 'y' else self._xd):
+                    if self.line_complete(line):
+                        self._on_line(line)
+        finally:
+            self.finish()
+
+    def run_lines(self):
+        x_inds, y_inds = self.trajectory()
+        x_inds = x_inds.reshape(self._yd, self._xd)
+        y_inds = y_inds.reshape(self._yd, self._xd)[:, 0]
+        remaining = ~self.completed[:, y_inds].all(axis=0)
+        x_inds, y_inds = x_inds[remaining], y_inds[remaining]
+        self._render_tick.start()
+        try:
+            for line_x, y_ind in zip(x_inds, y_inds):
+                self._master.update()
+                if self._abort:
+                    break
+                self.move(line_x[0], y_ind)
+                if self._settle_time:
+                    tk_sleep(self._master, self._settle_time * 1000)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
+                values = self._acquire_line(line_x, y_ind)
+                for x_ind, value in zip(line_x, np.transpose(values)):
+                    self.add_pixel(x_ind, y_ind, value)
+                    if self._on_pixel:
+                        self._on_pixel(x_ind, y_ind)
+                self._position = [line_x[-1], y_ind]
+                if self._on_line:
+                    self.flush()
+                    self._on_line(y_ind)
+        finally:
+            self.finish()
+
+    def pixel(self, event):
+        """Returns the pixel under a matplotlib mouse event"""
+        return [int(np.ceil(event.xdata - 0.5)), int(np.ceil(event.ydata - 0.5))]
+
+    def onclick(self, event):
+        try:
+            points = self.pixel(event)
+            self._npc3sg_x.move(self.x_val[points[0]])
+            self._npc3sg_y.move(self.y_val[points[1]])
+            print('pixel: ' + str(points))
+            print('position: ' + str(self.x_val[points[0]]) + ', ' + str(self.y_val[points[1]]))
+        except:
+            print('invalid position')
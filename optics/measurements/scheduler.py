@@ -0,0 +1,69 @@
+import time
+
+
+class Scheduler:
+    """Runs a measurement written as a generator from the tkinter event loop, instead of a loop (or a method calling
+    itself) that pumps tkinter with master.update().
+
+    Every next() of the generator is one step of the measurement. A step that yields nothing is followed by the next
+    one straight away, as long as the tick has not used up budget seconds; then control goes back to tkinter and the
+    steps carry on from an after() callback. A step that yields a number of ms is resumed that long afterwards, which
+    replaces tk_sleep. Only one step is ever on the stack, so a run of any length uses bounded memory, and the window
+    stays responsive (abort buttons, redraws) between steps.
+
+    Closing the generator with stop() runs its finally blocks, so files opened with a with statement in the generator
+    are closed. on_done is called once the generator finishes or is stopped. Exceptions raised by a step stop the run
+    and are passed to on_error, or raised to tkinter (which prints them) if there is none.
+
+    Usage: Scheduler(master).start(self.run()), where run is a generator function
+    """
+    def __init__(self, master, budget=0.05, on_done=None, on_error=None):
+        self._master = master
+        self._budget = budget
+        self._on_done = on_done
+        self._on_error = on_error
+        self._steps = None
+        self._after_id = None
+
+    @property
+    def running(self):
+        return self._steps is not None
+
+    def start(self, steps):
+        if self.running:
+            raise RuntimeError('the scheduler is already running a measurement')
+        self._steps = iter(steps)
+        self._after_id = self._master.after(0, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self._master.after_cancel(self._after_id)
+        if self.running:
+            self._steps.close()
+            self._finish()
+
+    def _finish(self):
+        self._steps = None
+        self._after_id = None
+        if self._on_done:
+            self._on_done()
+
+    def _tick(self):
+        self._after_id = None
+        deadline = time.perf_counter() + self._budget
+        try:
+            while True:
+                delay = next(self._steps)
+                if delay:
+                    self._after_id = self._master.after(int(round(delay)), self._tick)
+                    return
+                if time.perf_counter() >= deadline:
+                    self._after_id = self._master.after(1, self._tick)  # lets tkinter handle events before going on
+                    return
+        except StopIteration:
+            self._finish()
+        except Exception as error:
+            self._finish()
+            if not self._on_error:
+                raise
+            self._on_error(error)
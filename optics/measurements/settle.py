@@ -0,0 +1,86 @@
+import numpy as np
+from optics.misc_utility.tkinter_utilities import tk_sleep
+
+settle_modes = ['fixed', 'adaptive']
+
+
+class FixedSettle:
+    """Waits a fixed time after a move and then takes the reading"""
+    mode = 'fixed'
+
+    def __init__(self, master, wait):
+        self._master = master
+        self.max_wait = wait
+        self.last_wait = wait
+
+    def __call__(self, read):
+        tk_sleep(self._master, self.max_wait * 1000)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
+        return read()
+
+
+class AdaptiveSettle:
+    """Reads every interval seconds after a move and returns the reading as soon as the lock in output has settled,
+    waiting no longer than max_wait (three time constants, the fixed wait, by default).
+
+    The output has settled once the last two readings are both within tolerance of an estimate of its final value on
+    every channel. For a filter settling as exp(-t / tc), successive differences shrink by a constant ratio r,
+    leaving d * r / (1 - r) to go after a difference d, so while the readings approach that way the estimate is the
+    extrapolated final value; otherwise (noise around a settled output) it is the mean of the last three readings.
+    Where the signal barely changes between pixels the first three readings already agree, so the dwell drops to one
+    and a half time constants.
+
+    tolerance is in the units of the reading, or one per value of the reading, so for a lock in it is best set as a
+    fraction of the sensitivity (see lockin_settle)."""
+    mode = 'adaptive'
+
+    def __init__(self, master, time_constant, tolerance, max_wait=None, interval=None):
+        self._master = master
+        self._tolerance = tolerance
+        self.max_wait = 3 * time_constant if max_wait is None else max_wait
+        self._interval = max(time_constant / 2 if interval is None else interval, 0.001)
+        self.last_wait = 0
+
+    @staticmethod
+    def estimate(readings):
+        """The final value that the last three readings are approaching, channel by channel"""
+        change = readings[-1] - readings[-2]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            ratio = change / (readings[-2] - readings[-3])
+            decaying = (ratio > 0) & (ratio < 1)
+            return np.where(decaying, readings[-1] + change * ratio / (1 - ratio), np.mean(readings[-3:], axis=0))
+
+    def settled(self, readings):
+        if len(readings) < 3:
+            return False
+        final = self.estimate(readings)
+        return bool(np.all(np.abs(np.array(readings[-2:]) - final) <= self._tolerance))
+
+    def __call__(self, read):
+        readings = []
+        waited = 0
+        while waited + self._interval < self.max_wait:
+            tk_sleep(self._master, self._interval * 1000)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
+            waited += self._interval
+            reading = read()
+            readings.append(np.ravel(np.asarray(reading, dtype=float)))
+            if self.settled(readings):
+                self.last_wait = waited
+                return reading
+        tk_sleep(self._master, (self.max_wait - waited) * 1000)
+        self.last_wait = self.max_wait
+        return read()
+
+
+def lockin_settle(master, lockin, mode='fixed', time_constant=None, tolerance=0.002, channels=(1,)):
+    """Returns the settle for readings of a lock in amplifier after a move or a change of voltage. 'fixed' waits three
+    time constants (of the slowest of channels, in seconds), which is also the upper bound of 'adaptive'. The adaptive
+    settle takes readings of X and Y for each of channels, in that order, and tolerance is a fraction of each one's
+    sensitivity"""
+    if time_constant is None:
+        time_constant = max(lockin.read_tc(channel=channel) for channel in channels)
+    if mode == 'fixed':
+        return FixedSettle(master, 3 * time_constant)
+    if mode == 'adaptive':
+        return AdaptiveSettle(master, time_constant, np.repeat([tolerance * lockin.read_sensitivity(channel=channel)
+                                                                for channel in channels], 2))
+    raise ValueError('unknown settle mode: {}'.format(mode))
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class PixelRingBuffer:
+    """Fixed size ring buffer of map pixels. The acquisition loop pushes the pixel indices and measured values of
+    every point and the plotting side drains everything that arrived since the last drain in one go"""
+    def __init__(self, capacity, channels):
+        self._capacity = capacity
+        self._indices = np.zeros((capacity, 2), dtype=int)
+        self._values = np.zeros((capacity, channels))
+        self._head = 0  # next slot to write
+        self._count = 0  # number of pixels waiting to be drained
+
+    def __len__(self):
+        return self._count
+
+    def full(self):
+        return self._count == self._capacity
+
+    def push(self, x_ind, y_ind, values):
+        if self.full():
+            raise IndexError('Pixel buffer is full. Drain it before pushing more pixels')
+        self._indices[self._head] = x_ind, y_ind
+        self._values[self._head] = values
+        self._head = (self._head + 1) % self._capacity
+        self._count += 1
+
+    def drain(self):
+        """Returns x indices, y indices and a (pixels, channels) array of values in the order they were pushed"""
+        order = (self._head - self._count + np.arange(self._count)) % self._capacity
+        self._count = 0
+        return self._indices[order, 0], self._indices[order, 1], self._values[order]
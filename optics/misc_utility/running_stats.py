@@ -0,0 +1,98 @@
+import numpy as np
+
+
+class P2Quantile:
+    """Streaming estimate of the p quantile (0 < p < 1) with the P-square algorithm of Jain and Chlamtac. Five
+    markers are kept and nudged towards their ideal positions with a parabolic fit as values arrive, so the memory and
+    the work per value are constant. The estimate is exact for the first five values"""
+    def __init__(self, p):
+        self._p = p
+        self._heights = []
+        self._positions = np.arange(1, 6, dtype=float)
+        self._desired = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5])
+        self._increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def add(self, value):
+        q = self._heights
+        if len(q) < 5:
+            q.append(value)
+            q.sort()
+            return
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= value < q[i + 1])
+        n = self._positions
+        n[k + 1:] += 1
+        self._desired += self._increments
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) /
+                                                             (n[i + 1] - n[i]) + (n[i + 1] - n[i] - d) *
+                                                             (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])  # linear when the parabola overshoots
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self):
+        if len(self._heights) < 5:
+            return np.quantile(self._heights, self._p) if self._heights else np.nan
+        return self._heights[2]
+
+
+class RunningStats:
+    """Minimum, maximum, largest magnitude and second smallest distinct value of everything added so far, for setting
+    the color limits of live plots without reducing over the whole array for every new point. Each add() only looks
+    at the new values. quantiles is a list of p values (such as 0.01 and 0.99, for limits that ignore outliers) to
+    estimate with a P2Quantile each. nan and inf are ignored.
+
+    Values are assumed to be added once each. Arrays that start as zeros, such as a map before its first pixel, should
+    be started with values=[0] to match a reduction over the whole array.
+
+    Usage: stats = RunningStats([0])
+        stats.add(new_values)
+        im.set_clim(-stats.absmax, stats.absmax)
+    """
+    def __init__(self, values=(), quantiles=()):
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._second_min = np.inf
+        self._quantiles = {p: P2Quantile(p) for p in quantiles}
+        self.add(values)
+
+    def add(self, values):
+        values = np.ravel(np.asarray(values, dtype=float))
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        self.count += values.size
+        low = values.min()
+        above = values[values > low]
+        smallest = np.unique([self.min, self._second_min, low, above.min() if above.size else np.inf])
+        self.min, self._second_min = smallest[0], smallest[1] if len(smallest) > 1 else np.inf
+        self.max = max(self.max, values.max())
+        for quantile in self._quantiles.values():
+            for value in values:
+                quantile.add(value)
+
+    @property
+    def absmax(self):
+        return max(abs(self.min), abs(self.max)) if self.count else np.nan
+
+    @property
+    def second_min(self):
+        """The smallest value above the minimum, like np.unique(values)[1], or the minimum if all values are equal.
+        For waterfalls this is the lowest value measured above the empty rows"""
+        return self._second_min if np.isfinite(self._second_min) else self.min
+
+    def quantile(self, p):
+        return self._quantiles[p].value
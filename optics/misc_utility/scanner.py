@@ -18,6 +18,94 @@ def find_scan_values(x_center, y_center, x_range, y_range, x_scan_density, y_sca
     return x_val, y_val
 
 
+scan_paths = ['raster', 'serpentine', 'spiral', 'hilbert']
+
+
+def raster_order(xd, yd, serpentine=False):
+    """x and y pixel indices stepping along x and then moving up one row, optionally reversing every other row"""
+    x_ind = np.tile(np.arange(xd), yd)
+    y_ind = np.repeat(np.arange(yd), xd)
+    if serpentine:
+        x_ind = x_ind.reshape(yd, xd)
+        x_ind[1::2] = x_ind[1::2, ::-1]
+        x_ind = x_ind.ravel()
+    return x_ind, y_ind
+
+
+def spiral_order(xd, yd):
+    """x and y pixel indices spiralling outwards from the center pixel, skipping steps that leave the grid"""
+    x, y = (xd - 1) // 2, (yd - 1) // 2
+    x_ind = [x]
+    y_ind = [y]
+    steps = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+    length = 1
+    turn = 0
+    while len(x_ind) < xd * yd:
+        for _ in range(2):
+            dx, dy = steps[turn % 4]
+            for _ in range(length):
+                x += dx
+                y += dy
+                if 0 <= x < xd and 0 <= y < yd:
+                    x_ind.append(x)
+                    y_ind.append(y)
+            turn += 1
+        length += 1
+    return np.array(x_ind), np.array(y_ind)
+
+
+def hilbert_order(xd, yd):
+    """x and y pixel indices along a Hilbert curve covering the next power of two, keeping the points on the grid"""
+    n = 1
+    while n < max(xd, yd):
+        n *= 2
+    d = np.arange(n * n)
+    x = np.zeros(n * n, dtype=int)
+    y = np.zeros(n * n, dtype=int)
+    s = 1
+    while s < n:
+        rx = 1 & (d // 2)
+        ry = 1 & (d ^ rx)
+        flip = ry == 0
+        swap_x = np.where(flip & (rx == 1), s - 1 - x, x)
+        swap_y = np.where(flip & (rx == 1), s - 1 - y, y)
+        x, y = np.where(flip, swap_y, swap_x), np.where(flip, swap_x, swap_y)
+        x += s * rx
+        y += s * ry
+        d //= 4
+        s *= 2
+    keep = (x < xd) & (y < yd)
+    return x[keep], y[keep]
+
+
+def find_trajectory(x_val, y_val, path='raster', axis='y', direction=True):
+    """Returns the x pixel index, y pixel index, x position and y position of every point of a map, in the order that
+    they are to be measured. axis is the slow axis and direction=False walks the slow axis from the top down. Indices
+    always refer to x_val and y_val in ascending order"""
+    xd, yd = len(x_val), len(y_val)
+    if axis == 'y':
+        fast, slow = xd, yd
+    else:
+        fast, slow = yd, xd
+    if path == 'raster':
+        fast_ind, slow_ind = raster_order(fast, slow)
+    elif path == 'serpentine':
+        fast_ind, slow_ind = raster_order(fast, slow, serpentine=True)
+    elif path == 'spiral':
+        fast_ind, slow_ind = spiral_order(fast, slow)
+    elif path == 'hilbert':
+        fast_ind, slow_ind = hilbert_order(fast, slow)
+    else:
+        raise ValueError('unknown scan path: {}'.format(path))
+    if not direction:
+        slow_ind = slow - 1 - slow_ind
+    if axis == 'y':
+        x_ind, y_ind = fast_ind, slow_ind
+    else:
+        x_ind, y_ind = slow_ind, fast_ind
+    return x_ind, y_ind, np.asarray(x_val)[x_ind], np.asarray(y_val)[y_ind]
+
+
 def scan(x_val, y_val, w, z1, z2, fig, ax1, ax2, im1, im2, npc3sg_x, npc3sg_y, sr7270_bottom, gain):
     for y_ind, i in enumerate(y_val):
         npc3sg_y.move(i)
@@ -7,3 +7,31 @@ def do_nothing():
 def tk_sleep(master, ms):
     master.after(int(np.round(ms, 0)), do_nothing())
 
+
+def has_widgets(master):
+    """False for a master that cannot show widgets, such as hardware_control.sim.headless.HeadlessMaster"""
+    return not getattr(master, 'headless', False)
+
+
+class RenderTick:
+    """Calls render from the tkinter event loop at most frame_rate times per second. The callback only runs when the
+    event loop is serviced (master.update() or mainloop), so a measurement loop that pumps tkinter once per point gets
+    its plots redrawn at a capped rate instead of after every point"""
+    def __init__(self, master, render, frame_rate=5):
+        self._master = master
+        self._render = render
+        self._interval = int(np.round(1000 / frame_rate, 0))
+        self._after_id = None
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self._master.after(self._interval, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self._master.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        self._render()
+        self._after_id = self._master.after(self._interval, self._tick)
@@ -0,0 +1,31 @@
+import numpy as np
+
+trapezoid = getattr(np, 'trapezoid', None) or np.trapz  # np.trapz was removed in NumPy 2
+
+
+class IntegrationWindow:
+    """Integrates spectra over the x values between start and stop (inclusive). The window is resolved to a pixel
+    slice once with a binary search on the calibration axis, which may be increasing (nm, cm^-1) or decreasing (eV),
+    so every integration after that is a trapezoid rule over a view.
+
+    Usage: window = IntegrationWindow(xvalues, start, stop)
+        window(spectrum), the integrated counts of one spectrum
+        window(spectra), the integrated counts of every spectrum in a stack, integrating over the last axis
+    """
+    def __init__(self, xvalues, start, stop):
+        x = np.asarray(xvalues)
+        if len(x) > 1 and x[0] > x[-1]:
+            reverse = x[::-1]
+            self._slice = slice(len(x) - np.searchsorted(reverse, stop, side='right'),
+                                len(x) - np.searchsorted(reverse, start, side='left'))
+        else:
+            self._slice = slice(np.searchsorted(x, start, side='left'), np.searchsorted(x, stop, side='right'))
+        self.start = start
+        self.stop = stop
+        self.x = x[self._slice]
+
+    def __len__(self):
+        return len(self.x)
+
+    def __call__(self, spectra):
+        return trapezoid(np.asarray(spectra, dtype=float)[..., self._slice], self.x, axis=-1)
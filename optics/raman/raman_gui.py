@@ -3,12 +3,15 @@ co_initialize = ctypes.windll.ole32.CoInitialize
 import tkinter as tk
 co_initialize(None)
 from optics.hardware_control.ccd_controller import CCDController2
+from optics.hardware_control.instrument_worker import InstrumentWorker
 from optics.hardware_control.mono_controller import MonoController
 from optics.raman.single_spectrum import BaseRamanMeasurement
 from optics.raman.raman_time import RamanTime
 from optics.raman.raman_voltage_waterfall import RamanVoltageWaterfall
 from optics.raman.raman_polarization import RamanPolarization
 from optics.raman.raman_map import RamanMapScan
+from optics.misc_utility import scanner
+from optics.storage.writer import file_formats
 from optics.gui.base_gui import BaseGUI
 import time
 from optics.raman import unit_conversions
@@ -36,6 +39,10 @@ class RamanGUI(BaseGUI):
         self._dark_corrected = tk.StringVar()
         self._dark_corrected.set('False')
         self._darkcurrent.set('False')
+        self._path = tk.StringVar()
+        self._path.set('raster')
+        self._file_format = tk.StringVar()
+        self._file_format.set('csv')
         self._sr7270_single_reference = sr7270_single_reference
         self._sr7270_dual_harmonic = sr7270_dual_harmonic
         self._powermeter = powermeter
@@ -72,7 +79,8 @@ class RamanGUI(BaseGUI):
                                    self.string_to_bool(self._darkcurrent.get()),
                                    self.string_to_bool(self._dark_corrected.get()), self._inputs['device'],
                                    self._inputs['file path'], self._fields['notes'],
-                                   int(self._fields['scan']), waveplate=self._waveplate, powermeter=self._powermeter)
+                                   int(self._fields['scan']), waveplate=self._waveplate, powermeter=self._powermeter,
+                                    file_format=self._file_format.get())
         run.main()
 
     def build_time_spectrum_gui(self):
@@ -85,6 +93,7 @@ class RamanGUI(BaseGUI):
         self.make_option_menu('units', self._units, ['cm^-1', 'nm', 'eV'])
         self.make_option_menu('dark current', self._darkcurrent, ['True', 'False'])
         self.make_option_menu('subtract background', self._dark_corrected, ['True', 'False'])
+        self.make_option_menu('file format', self._file_format, file_formats)
         self.endform(self.time_spectrum)
 
     def time_spectrum(self, event=None):
@@ -100,7 +109,7 @@ class RamanGUI(BaseGUI):
                                  int(self._inputs['scan']), float(self._inputs['wait time between scans (s)']),
                                  int(self._inputs['number of scans']), float(self._inputs['start wavelength']),
                                  float(self._inputs['stop wavelength']), self._waveplate, self._powermeter,
-                                 self._npc3sg_input)
+                                 self._npc3sg_input, file_format=self._file_format.get())
         run.main()
 
     def build_voltage_waterfall_gui(self):
@@ -113,6 +122,7 @@ class RamanGUI(BaseGUI):
         self.make_option_menu('units', self._units, ['cm^-1', 'nm', 'eV'])
         self.make_option_menu('dark current', self._darkcurrent, ['True', 'False'])
         self.make_option_menu('subtract background', self._dark_corrected, ['True', 'False'])
+        self.make_option_menu('file format', self._file_format, file_formats)
         self.endform(self.voltage_waterfall)
 
     def voltage_waterfall(self, event=None):
@@ -170,7 +180,8 @@ class RamanGUI(BaseGUI):
         self.make_option_menu('units', self._units, ['cm^-1', 'nm', 'eV'])
         self.make_option_menu('dark current', self._darkcurrent, ['True', 'False'])
         self.make_option_menu('subtract background', self._dark_corrected, ['True', 'False'])
-        self.endform(self.polarization_spectrum)
+        self.make_option_menu('scan path', self._path, scanner.scan_paths)
+        self.endform(self.raman_map)
 
     def raman_map(self, event=None):
         self.fetch(event)
@@ -188,7 +199,7 @@ class RamanGUI(BaseGUI):
                             self._npc3sg_x, self._npc3sg_y,
                            self._npc3sg_input, float(self._inputs['start wavelength']),
                                 float(self._inputs['stop wavelength']), float(self._inputs['wait time between scans (s)']), self._powermeter,
-                           self._waveplate, True)
+                           self._waveplate, True, self._path.get())
         run.main()
 
     def build_bias_light_emission_gui(self):
@@ -240,7 +251,7 @@ class RamanBaseGUI(BaseGUI):
         print('connecting Raman hardware (approx. 30 seconds)')
         self._mono = MonoController()
         print('MonoControl Success')
-        self._ccd_controller = CCDController2()
+        self._ccd_controller = InstrumentWorker(CCDController2, 'ccd', initializer=lambda: co_initialize(None))
         print('Raman hardware connection complete')
         self._gain = self._ccd_controller.read_gain()
         self._gain_options = tk.StringVar()
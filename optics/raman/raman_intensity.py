@@ -3,6 +3,7 @@ import csv
 from optics.hardware_control.hardware_addresses_and_constants import laser_wavelength
 import time
 import tkinter as tk
+import numpy as np
 import matplotlib.pyplot as plt
 from optics.misc_utility.tkinter_utilities import tk_sleep
 
@@ -63,6 +64,8 @@ class RamanIntensity(BaseRamanMeasurement):
                 tk_sleep(self._master, 300)
                 power = self._powermeter.read_power()
                 self.take_spectrum()
+                if self._abort:
+                    break
                 writer.writerow(['power {}'.format(power), *[i for i in self._data]])
                 self.plot_point(now, self.integrate_spectrum(self._data, self._start, self._stop))
                 tk_sleep(self._master, self._sleep_time * 1000)
@@ -99,7 +102,8 @@ class RamanIntensity(BaseRamanMeasurement):
             for row in reader:
                 if 'power' in row[0]:
                     power.append(float(row[0].split('scan ')[1]))
-                    data.append(self.integrate_spectrum([float(i) for i in row[1::]], start, stop))
+                    data.append(row[1::])
+        data = self.integrate_spectrum(np.array(data, dtype=float), start, stop) if data else []
         fig = plt.figure()
         ax = fig.add_subplot(111)
         ax.set_title('{} time scan, {} polarization, {} - {} {}'.format(self._device, self._polarization, start, stop,
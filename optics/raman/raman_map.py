@@ -1,16 +1,18 @@
 from optics.raman.single_spectrum import BaseRamanMeasurement
 import numpy as np
-from optics.misc_utility import scanner
+import matplotlib.pyplot as plt
 from optics.hardware_control.hardware_addresses_and_constants import laser_wavelength
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.measurements.scan_engine import ScanEngine
 import csv
 from optics.heating_plot import heating_plot
+from optics.thermovoltage_plot.live_image import LiveImage
 
 
 class RamanMapScan(BaseRamanMeasurement):
     def __init__(self, master, ccd, grating, raman_gain, center_wavelength, units, integration_time, acquisitions,
                  shutter, darkcurrent, darkcorrected, filepath, notes, device, index, xd, yd, xr, yr, xc, yc,
-                 npc3sg_x, npc3sg_y, npc3sg_input, start, stop, sleep_time, powermeter, waveplate, direction=True):
+                 npc3sg_x, npc3sg_y, npc3sg_input, start, stop, sleep_time, powermeter, waveplate, direction=True,
+                 path='raster'):
         self._master = master
         self._notes = notes
         self._device = device
@@ -28,18 +30,23 @@ class RamanMapScan(BaseRamanMeasurement):
         self._npc3sg_y = npc3sg_y
         self._npc3sg_input = npc3sg_input
         self._powermeter = powermeter
-        self._z1 = np.zeros((self._xd, self._yd))
+        self._path = path
+        self._sleep_time = sleep_time
+        self._engine = ScanEngine(self._master, self._npc3sg_x, self._npc3sg_y, self._xd, self._yd, self._xr, self._yr,
+                                  self._xc, self._yc, self.acquire, settle_time=self._sleep_time, direction=direction,
+                                  path=self._path, render=self.render)
+        self._z1 = self._engine.z[0]
+        self._spectra = np.zeros((self._xd, self._yd, len(self._xvalues)))  # kept so the map can be rebuilt for a new band
+        self._new_start.set(self._start)
+        self._new_stop.set(self._stop)
         self._im1 = self._single_ax1.imshow(self._z1.T, cmap=plt.cm.coolwarm, interpolation='nearest', origin='lower')
         self._clb1 = self._single_fig.colorbar(self._im1, ax=self._single_ax1)
+        self._live1 = LiveImage(self._single_canvas, self._im1, transpose=True)
         self._writer = None
-        self._x_val, self._y_val = scanner.find_scan_values(self._xc, self._yc, self._xr, self._yr, self._xd, self._yd)
-        self._direction = direction
-        if not self._direction:
-            self._y_val = self._y_val[::-1]
-        self._sleep_time = sleep_time
 
     def abort(self):
         self._abort = True
+        self._engine.abort()
 
     def write_header(self):
         self._writer.writerow(['x scan density:', self._xd])
@@ -48,6 +55,7 @@ class RamanMapScan(BaseRamanMeasurement):
         self._writer.writerow(['y range:', self._yr])
         self._writer.writerow(['x center:', self._xc])
         self._writer.writerow(['y center:', self._yc])
+        self._writer.writerow(['scan path:', self._path])
         self._writer.writerow(['polarization:', self._polarization])
         if self._powermeter:
             self._writer.writerow(['power (W):', self._powermeter.read_power()])
@@ -73,54 +81,31 @@ class RamanMapScan(BaseRamanMeasurement):
         self._clb1.set_label('counts', rotation=270, labelpad=20)
         self._single_ax1.title.set_text('Raman signal {} - {} {}'.format(self._start, self._stop, self._units))
 
-    @staticmethod
-    def update_plot(self, im, data, min_val, max_val):
-        im.set_data(data.T)
-        im.set_clim(vmin=min_val)
-        im.set_clim(vmax=max_val)
+    def acquire(self, x_ind, y_ind):
+        _, data = self.take_spectrum()
+        if self._abort:
+            return [self._z1[x_ind, y_ind]]  # left as it was, the engine stops after this pixel
+        self._spectra[x_ind, y_ind] = data
+        return [self.integrate_spectrum(data, self._start, self._stop)]
 
-    def onclick(self, event):
-        try:
-            points = [int(np.ceil(event.xdata - 0.5)), int(np.ceil(event.ydata - 0.5))]
-            if not self._direction:
-                points = [int(np.ceil(event.xdata - 0.5)), int(np.ceil(self._yd - event.ydata - 0.5 - 1))]
-            self._npc3sg_x.move(self._x_val[points[0]])
-            self._npc3sg_y.move(self._y_val[points[1]])
-            print('pixel: ' + str(points))
-            print('position: ' + str(self._x_val[points[0]]) + ', ' + str(self._y_val[points[1]]))
-        except:
-            print('invalid position')
+    def render(self):
+        self._live1.update(self._z1, self._engine.stats[0].min, self._engine.stats[0].max)
+
+    def replot(self):
+        self._start = float(self._new_start.get())
+        self._stop = float(self._new_stop.get())
+        self._z1[:] = self.integrate_spectrum(self._spectra, self._start, self._stop)
+        self._engine.reset_stats()
+        self.setup_plots()
+        self._single_canvas.draw_idle()  # the new title, even if the color limits stay the same
+        self.render()
 
     def run_scan(self):
-        for y_ind, i in enumerate(self._y_val):
-            self._master.update()
-            if self._abort:
-                self._npc3sg_x.move(0)
-                self._npc3sg_y.move(0)
-                break
-            if not self._direction:
-                y_ind = len(self._y_val) - y_ind - 1
-            self._npc3sg_y.move(i)
-            for x_ind, j in enumerate(self._x_val):
-                self._npc3sg_x.move(j)
-                tk_sleep(self._master, 1000 * self._sleep_time)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
-                _, data = self.take_spectrum()
-                integrated = self.integrate_spectrum(data, self._start, self._stop)
-                #self._writer.writerow([(x_ind, y_ind), *integrated])
-                self._z1[x_ind][y_ind] = integrated
-                self.update_plot(self._im1, self._z1, np.amin(self._z1), np.amax(self._z1))
-                self._single_fig.tight_layout()
-                self._single_canvas.draw()  # dynamically plots the data and closes automatically after completing the scan
-                self._master.update()
-                if self._abort:
-                    self._npc3sg_x.move(0)
-                    self._npc3sg_y.move(0)
-                    break
-        self._npc3sg_x.move(0)
-        self._npc3sg_y.move(0)  # returns piezo controller position to 0,0
+        self._engine.run()
 
     def main(self):
-        self.pack_buttons(True, False, False)
+        self.make_file(measurement_title='map scan')
+        self.pack_buttons(True, True, False)
         self.setup_plots()
         self._single_canvas.draw()
         self.run_scan()
@@ -131,7 +116,7 @@ class RamanMapScan(BaseRamanMeasurement):
         heating_plot.plot(self._single_ax1, self._im1, self._z1, np.amax(self._z1), np.amin(self._z1))
         self._single_canvas.draw()  # shows the completed scan
         cid = self._single_fig.canvas.mpl_connect('button_press_event',
-                                           self.onclick)  # click on pixel to move laser position there
+                                           self._engine.onclick)  # click on pixel to move laser position there
         self._npc3sg_x.move(0)
         self._npc3sg_y.move(0)
 
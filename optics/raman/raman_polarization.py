@@ -9,6 +9,8 @@ import matplotlib.pyplot as plt
 from optics.misc_utility import conversions
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from optics.thermovoltage_plot.live_image import LiveImage
+from optics.misc_utility.running_stats import RunningStats
 
 
 class RamanPolarization(BaseRamanMeasurement):
@@ -28,6 +30,7 @@ class RamanPolarization(BaseRamanMeasurement):
         self._ax1 = self._fig.add_subplot(211)
         self._ax2 = self._fig.add_subplot(212, polar=True)
         self._wf = np.zeros((len(self._waveplate_positions), len(self._xvalues)))
+        self._stats = RunningStats([0])  # the empty rows of the waterfall
         self._im = self._ax1.imshow(self._wf, interpolation='nearest', origin='lower', aspect='auto',
                                     extent=[self._xvalues[0], self._xvalues[-1], self._waveplate_positions[0] * 2,
                                             self._waveplate_positions[-1] * 2])
@@ -39,6 +42,7 @@ class RamanPolarization(BaseRamanMeasurement):
         self._fig.tight_layout()
         self._canvas.draw()
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        self._live = LiveImage(self._canvas, self._im)
         self._start = start
         self._stop = stop
         self._npc3sg_input = npc3sg_input
@@ -68,12 +72,9 @@ class RamanPolarization(BaseRamanMeasurement):
             writer.writerow(['end:', 'end of header'])
             writer.writerow(['x values', *self._xvalues])
 
-    def update_plot(self, im, data):
-        im.set_data(data)
-        values = np.unique(data)
-        im.set_clim(vmin=sorted(values)[1])
-        im.set_clim(vmax=np.amax(data))
-        self._canvas.draw()
+    def update_plot(self, spectrum):
+        self._stats.add(spectrum)
+        self._live.update(self._wf, self._stats.second_min, self._stats.max)  # the smallest value above the empty rows
 
     def measure(self):
         with open(self._lockin_filename, 'a', newline='') as inputfile:
@@ -83,13 +84,15 @@ class RamanPolarization(BaseRamanMeasurement):
                 self._waveplate.move(waveplate_position)
                 tk_sleep(self._master, 1500)
                 _, data = self.take_spectrum()
+                if self._abort:
+                    break
                 writer.writerow(['polarization {}'.format(waveplate_position * 2), *data])
                 self._wf[i] = data
-                self.update_plot(self._im, self._wf)
+                self.update_plot(data)
                 integrated = self.integrate_spectrum(data, self._start, self._stop)
                 self._ax2.plot(conversions.degrees_to_radians(waveplate_position * 2), integrated, linestyle='',
                                       color='blue', marker='o', markersize=2)
-                self._canvas.draw()
+                self._canvas.draw_idle()  # the polar plot is not blitted, so it needs a full draw
                 self._master.update()
                 tk_sleep(self._master, self._sleep_time * 1000)
                 if self._abort:
@@ -134,7 +137,8 @@ class RamanPolarization(BaseRamanMeasurement):
             for row in reader:
                 if 'polarization' in row[0]:
                     polarization.append(float(row[0].split(' ')[1]))
-                    data.append(self.integrate_spectrum([float(i) for i in row[1::]], start, stop))
+                    data.append(row[1::])
+        data = self.integrate_spectrum(np.array(data, dtype=float), start, stop) if data else []
         fig = plt.figure()
         ax = fig.add_subplot(111, polar=True)
         ax.set_title('{} polarization scan, {} - {} {}'.format(self._device, start, stop, self._units))
@@ -1,5 +1,5 @@
 from optics.raman.single_spectrum import BaseRamanMeasurement
-import csv
+from os import path
 from optics.hardware_control.hardware_addresses_and_constants import laser_wavelength
 import time
 import tkinter as tk
@@ -9,15 +9,19 @@ import matplotlib.pyplot as plt
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from optics.misc_utility import conversions
+from optics.raman.spectrum_store import SpectrumStore
+from optics.storage.writer import open_writer
+from optics.thermovoltage_plot.live_image import LiveImage
+from optics.misc_utility.running_stats import RunningStats
 
 
 class RamanTime(BaseRamanMeasurement):
     def __init__(self, master, ccd, grating, raman_gain, center_wavelength, units, integration_time, acquisitions,
                  shutter, darkcurrent, darkcorrected, device, filepath, notes, index, sleep_time, number_scans, start,
-                 stop, waveplate, powermeter, npc3sg_input):
+                 stop, waveplate, powermeter, npc3sg_input, file_format='csv', canvas=FigureCanvasTkAgg):
         super().__init__(master, ccd, grating, raman_gain, center_wavelength, units, integration_time, acquisitions,
                          shutter, darkcurrent, darkcorrected, device, filepath, notes, index, waveplate, powermeter,
-                         single_plot=False)
+                         single_plot=False, file_format=file_format, canvas=canvas)
         self._sleep_time = sleep_time
         self._start = start
         self._stop = stop
@@ -27,6 +31,7 @@ class RamanTime(BaseRamanMeasurement):
         self._ax1 = self._fig.add_subplot(211)
         self._ax2 = self._fig.add_subplot(212)
         self._wf = np.zeros((self._number_scans, len(self._xvalues)))
+        self._stats = RunningStats([0])  # the empty rows of the waterfall
         self._im = self._ax1.imshow(self._wf, interpolation='nearest', origin='lower', aspect='auto',
                                             extent=[self._xvalues[0], self._xvalues[-1], 0, self._number_scans])
         self._ax1.set_xlabel(self._units)
@@ -37,19 +42,19 @@ class RamanTime(BaseRamanMeasurement):
         self._ax2.set_title('{} vs time, {} polarization, {} - {} {}'.format(self._device, self._polarization, self._start,
                                                                              self._stop, self._units))
         self._clb1 = self._fig.colorbar(self._im, ax=self._ax1)
-        self._canvas = FigureCanvasTkAgg(self._fig, master=self._master)  # A tk.DrawingArea.
+        self._canvas = self._canvas_type(self._fig, master=self._master)  # A tk.DrawingArea.
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self._fig.tight_layout()
         self._canvas.draw()
+        self._live = LiveImage(self._canvas, self._im)
         self._npc3sg_input = npc3sg_input
         self._powermeter = powermeter
         self._new_start.set(self._start)
         self._new_stop.set(self._stop)
-        self._times = []
+        self._store = None
 
     def write_header(self):
-        with open(self._lockin_filename, 'w', newline='') as inputfile:
-            writer = csv.writer(inputfile)
+        with open_writer(self._lockin_filename, self._file_format) as writer:
             position = self._npc3sg_input.read()
             writer.writerow(['x laser position:', position[0]])
             writer.writerow(['y laser position:', position[1]])
@@ -71,58 +76,43 @@ class RamanTime(BaseRamanMeasurement):
             writer.writerow(['end:', 'end of header'])
             writer.writerow(['x values', *self._xvalues])
 
-    def update_plot(self, im, data):
-        im.set_data(data)
-        values = np.unique(data)
-        im.set_clim(vmin=sorted(values)[1])
-        im.set_clim(vmax=np.amax(data))
-        self._canvas.draw()
+    def update_plot(self, spectrum):
+        self._stats.add(spectrum)
+        self._live.update(self._wf, self._stats.second_min, self._stats.max)  # the smallest value above the empty rows
 
     def measure(self):
+        self._store = SpectrumStore(path.splitext(self._lockin_filename)[0] + '.npy', len(self._xvalues),
+                                    self._number_scans)
         start_time = time.time()
-        with open(self._lockin_filename, 'a', newline='') as inputfile:
-            writer = csv.writer(inputfile)
+        with open_writer(self._lockin_filename, self._file_format, 'a') as writer:
             for scan in range(self._number_scans):
                 now = time.time() - start_time
-                self._times.append(now)
                 _, data = self.take_spectrum()
+                if self._abort:
+                    break
+                self._store.append(data, time=now)
                 writer.writerow(['time scan {}'.format(now), *[i for i in self._data]])
                 self._wf[scan] = data
-                self.update_plot(self._im, self._wf)
+                self.update_plot(data)
                 integrated = self.integrate_spectrum(data, self._start, self._stop)
                 self._ax2.plot(now, integrated, linestyle='', color='blue', marker='o', markersize=4)
-                self._fig.tight_layout()
-                self._canvas.draw()
+                self._canvas.draw_idle()  # the time trace is not blitted, so it needs a full draw
                 self._master.update()
                 tk_sleep(self._master, self._sleep_time * 1000)
                 if self._abort:
                     break
+        self._store.flush()
 
     def onpick(self, event):
+        if not self._store:
+            return  # nothing has been measured yet
         ax = event.inaxes
-        data = None
-        title = ''
         if ax == self._ax1:
-            ydata = int(np.ceil(event.ydata - 1))
-            with open(self._lockin_filename) as inputfile:
-                reader = csv.reader(inputfile, delimiter=',')
-                for row in reader:
-                    if 'end:' in row:
-                        break
-                for i, row in enumerate(reader):
-                    if i == ydata + 1:
-                        title = row[0]
-                        data = [float(i) for i in row[1::]]
+            ind = int(np.clip(np.ceil(event.ydata - 1), 0, len(self._store) - 1))
         else:
-            xdata = event.xdata
-            ind = (np.abs(np.asarray(self._times) - xdata)).argmin()
-            point = self._times[ind]
-            with open(self._lockin_filename) as inputfile:
-                reader = csv.reader(inputfile, delimiter=',')
-                for row in reader:
-                    if 'time scan {}'.format(point) in row:
-                        title = row[0]
-                        data = [float(i) for i in row[1::]]
+            ind = self._store.nearest('time', event.xdata)
+        title = 'time scan {}'.format(self._store.column('time')[ind])
+        data = self._store.counts[ind]
         fig = plt.figure()
         ax = fig.add_subplot(111)
         ax.set_title('{} seconds'.format(title))
@@ -132,16 +122,12 @@ class RamanTime(BaseRamanMeasurement):
         fig.show()
 
     def replot(self):
+        if not self._store:
+            return  # nothing has been measured yet
         start = float(self._new_start.get())
         stop = float(self._new_stop.get())
-        time = []
-        data = []
-        with open(self._lockin_filename) as inputfile:
-            reader = csv.reader(inputfile, delimiter=',')
-            for row in reader:
-                if 'time scan' in row[0]:
-                    time.append(float(row[0].split('scan ')[1]))
-                    data.append(self.integrate_spectrum([float(i) for i in row[1::]], start, stop))
+        time = self._store.column('time')
+        data = self.integrate_spectrum(self._store.counts, start, stop)
         fig = plt.figure()
         ax = fig.add_subplot(111)
         ax.set_title('{} time scan, {} polarization, {} - {} {}'.format(self._device, self._polarization, start, stop,
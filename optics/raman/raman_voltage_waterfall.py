@@ -1,19 +1,24 @@
 from optics.raman.single_spectrum import BaseRamanMeasurement
-import csv
+from os import path
 from optics.hardware_control.hardware_addresses_and_constants import laser_wavelength
 import time
 import tkinter as tk
 from optics.misc_utility.tkinter_utilities import tk_sleep
 import numpy as np
 import matplotlib.pyplot as plt
+from optics.raman.spectrum_store import SpectrumStore
+from optics.storage.writer import open_writer
+from optics.thermovoltage_plot.live_image import LiveImage
+from optics.misc_utility.running_stats import RunningStats
 
 
 class RamanVoltageWaterfall(BaseRamanMeasurement):
     def __init__(self, master, ccd, sr7270_dual_harmonic, grating, raman_gain, center_wavelength, units, integration_time, acquisitions,
                  shutter, darkcurrent, darkcorrected, device, filepath, notes, index, sleep_time, number_scans, start_voltage,
-                 stop_voltage, waveplate, powermeter, gate=0):
+                 stop_voltage, waveplate, powermeter, gate=0, file_format='csv'):
         super().__init__(master, ccd, grating, raman_gain, center_wavelength, units, integration_time, acquisitions,
-                         shutter, darkcurrent, darkcorrected, device, filepath, notes, index, waveplate, powermeter)
+                         shutter, darkcurrent, darkcorrected, device, filepath, notes, index, waveplate, powermeter,
+                         file_format=file_format)
         self._sr7270_dual_harmonic = sr7270_dual_harmonic
         self._sleep_time = sleep_time
         self._voltages = np.linspace(start_voltage, stop_voltage, number_scans)
@@ -21,6 +26,7 @@ class RamanVoltageWaterfall(BaseRamanMeasurement):
         self.number_scans = number_scans
         #self._voltages = [*self._voltages_for, *self._voltages_rev]
         self._wf = np.zeros((number_scans*2, len(self._xvalues)))
+        self._stats = RunningStats([0])  # the empty rows of the waterfall
         self._im = self._single_ax1.imshow(self._wf, interpolation='nearest', origin='lower', aspect='auto',
                                             extent=[self._xvalues[0], self._xvalues[-1], self._voltages[0],
                                                     self._voltages[-1]])
@@ -30,12 +36,13 @@ class RamanVoltageWaterfall(BaseRamanMeasurement):
         self._single_fig.tight_layout()
         self._single_canvas.draw()
         self._single_canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        self._live = LiveImage(self._single_canvas, self._im)
         self._gate = gate
+        self._store = None
 
     def write_header(self):
 
-        with open(self._lockin_filename, 'w', newline='') as inputfile:
-            writer = csv.writer(inputfile)
+        with open_writer(self._lockin_filename, self._file_format) as writer:
             writer.writerow(['laser wavelength:', laser_wavelength])
             writer.writerow(['polarization:', self._polarization])
             writer.writerow(['power (W):', self._power])
@@ -55,24 +62,25 @@ class RamanVoltageWaterfall(BaseRamanMeasurement):
             writer.writerow(['end:', 'end of header'])
             writer.writerow(['x values', *self._xvalues])
 
-    def update_plot(self, im, data):
-        im.set_data(data)
-        values = np.unique(data)
-        im.set_clim(vmin=sorted(values)[1])
-        im.set_clim(vmax=np.amax(data))
-        self._single_canvas.draw()
+    def update_plot(self, spectrum):
+        self._stats.add(spectrum)
+        self._live.update(self._wf, self._stats.second_min, self._stats.max)  # the smallest value above the empty rows
 
     def measure(self):
-        with open(self._lockin_filename, 'a', newline='') as inputfile:
-            writer = csv.writer(inputfile)
+        self._store = SpectrumStore(path.splitext(self._lockin_filename)[0] + '.npy', len(self._xvalues),
+                                    len(self._voltages) + len(self._voltages_rev))
+        with open_writer(self._lockin_filename, self._file_format, 'a') as writer:
             for i, voltage in enumerate(self._voltages):
                 self._sr7270_dual_harmonic.change_applied_voltage(voltage)
                 self.take_spectrum()
+                if self._abort:
+                    break
                 writer.writerow(['applied voltage {}'.format(voltage), *[i for i in self._data]])
                 writer.writerow(['applied voltage {}'.format(voltage), *self._sr7270_dual_harmonic.read_adc(3)])
                 writer.writerow(['applied voltage {}'.format(voltage), *self._sr7270_dual_harmonic.read_xy1()])
                 self._wf[i] = self._data
-                self.update_plot(self._im, self._wf)
+                self._store.append(self._data, voltage=voltage)
+                self.update_plot(self._data)
                 self._master.update()
                 tk_sleep(self._master, self._sleep_time * 1000)
                 if self._abort:
@@ -80,38 +88,32 @@ class RamanVoltageWaterfall(BaseRamanMeasurement):
             for i, voltage in enumerate(self._voltages_rev):
                 self._sr7270_dual_harmonic.change_applied_voltage(voltage)
                 self.take_spectrum()
+                if self._abort:
+                    break
                 writer.writerow(['applied voltage {}'.format(voltage), *[i for i in self._data]])
                 writer.writerow(['applied voltage {}'.format(voltage), *self._sr7270_dual_harmonic.read_adc(3)])
                 writer.writerow(['applied voltage {}'.format(voltage), *self._sr7270_dual_harmonic.read_xy1()])
                 self._wf[i + int(self.number_scans)] = self._data
-                self.update_plot(self._im, self._wf)
+                self._store.append(self._data, voltage=voltage)
+                self.update_plot(self._data)
                 self._master.update()
                 tk_sleep(self._master, self._sleep_time * 1000)
                 if self._abort:
                     break
-
-
+        self._store.flush()
 
     def onpick(self, event):
-        ydata = event.ydata
-        idx = (np.abs(self._voltages - ydata)).argmin()
-        point = self._voltages[idx]
-        with open(self._lockin_filename) as inputfile:
-            reader = csv.reader(inputfile, delimiter=',')
-            for row in reader:
-                if 'end:' in row:
-                    break
-            for row in reader:
-                if 'applied voltage {}'.format(point) in row:
-                    title = row[0]
-                    data = [float(i) for i in row[1::]]
-                    fig = plt.figure()
-                    ax = fig.add_subplot(111)
-                    ax.set_title('{}, {} polarization, {} mV'.format(self._device, self._polarization, title))
-                    ax.set_xlabel(self._units)
-                    ax.set_ylabel('counts')
-                    ax.plot(self._xvalues, data)
-                    fig.show()
+        if not self._store:
+            return  # nothing has been measured yet
+        for ind in self._store.matching('voltage', event.ydata):  # one spectrum for each sweep direction
+            title = 'applied voltage {}'.format(self._store.column('voltage')[ind])
+            fig = plt.figure()
+            ax = fig.add_subplot(111)
+            ax.set_title('{}, {} polarization, {} mV'.format(self._device, self._polarization, title))
+            ax.set_xlabel(self._units)
+            ax.set_ylabel('counts')
+            ax.plot(self._xvalues, self._store.counts[ind])
+            fig.show()
 
     def rescale(self):
         vmax = float(self._new_max.get())
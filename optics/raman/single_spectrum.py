@@ -4,19 +4,25 @@ import csv
 import numpy as np
 import os
 from os import path
+from concurrent import futures
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import tkinter as tk
 from optics.raman.unit_conversions import convert_pixels_to_unit
+from optics.raman.integration import IntegrationWindow
+from optics.storage.writer import extension
 from optics.hardware_control.hardware_addresses_and_constants import laser_wavelength
+from optics.hardware_control import instrument_worker
+from optics.misc_utility.tkinter_utilities import has_widgets
 
 
 
 class BaseRamanMeasurement:
     def __init__(self, master, ccd, grating, raman_gain, center_wavelength, units, integration_time, acquisitions,
                  shutter, darkcurrent, darkcorrected, device, filepath, notes, index, waveplate=None, powermeter=None,
-                 single_plot=True, polar=False):
+                 single_plot=True, polar=False, file_format='csv', canvas=FigureCanvasTkAgg):
         self._master = master
+        self._canvas_type = canvas  # the canvas made for each figure
         self._ccd = ccd
         self._grating = grating
         self._raman_gain = raman_gain
@@ -31,6 +37,7 @@ class BaseRamanMeasurement:
         self._filepath = filepath
         self._notes = notes
         self._index = index
+        self._file_format = file_format
         self._data = []
         if waveplate:
             self._polarization = int(round((np.round(waveplate.read_polarization(), 0) % 180) / 10) * 10)
@@ -40,7 +47,8 @@ class BaseRamanMeasurement:
             self._power = powermeter.read_power()
         else:
             self._power = 'not measured'
-        self._xvalues = convert_pixels_to_unit(self._units, self._grating, self._center_wavelength, laser_wavelength)
+        self._xvalues = convert_pixels_to_unit(self._units, self._grating, self._center_wavelength, laser_wavelength,
+                                               self._ccd.xpixels)
         ## single plot
         if single_plot:
             self._single_fig = Figure()
@@ -49,16 +57,17 @@ class BaseRamanMeasurement:
             else:
                 self._single_ax1 = self._single_fig.add_subplot(111, polar=True)
             self._single_fig.tight_layout()
-            self._single_canvas = FigureCanvasTkAgg(self._single_fig, master=self._master)  # A tk.DrawingArea.
+            self._single_canvas = self._canvas_type(self._single_fig, master=self._master)  # A tk.DrawingArea.
             self._single_canvas.draw()
             self._single_canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self._lockin_filename = None
         self._imagefile = None
+        self._integration_windows = {}
         self._abort = False
-        self._new_max = tk.StringVar()
-        self._new_min = tk.StringVar()
-        self._new_start = tk.StringVar()
-        self._new_stop = tk.StringVar()
+        self._new_max = tk.StringVar(self._master)
+        self._new_min = tk.StringVar(self._master)
+        self._new_start = tk.StringVar(self._master)
+        self._new_stop = tk.StringVar(self._master)
         self.load()
 
     def load(self):
@@ -67,13 +76,13 @@ class BaseRamanMeasurement:
     def make_file(self, measurement_title='single spectrum'):
         os.makedirs(self._filepath, exist_ok=True)
         index = self._index
-        self._lockin_filename = path.join(self._filepath, '{}_{}_{}_{}{}'.format(self._device, measurement_title, self._polarization, index, '.csv'))
+        self._lockin_filename = path.join(self._filepath, '{}_{}_{}_{}{}'.format(self._device, measurement_title, self._polarization, index, extension(self._file_format)))
         self._imagefile = path.join(self._filepath,
                                     '{}_{}_{}_{}{}'.format(self._device, measurement_title, self._polarization, index, '.png'))
         while path.exists(self._lockin_filename):
             index += 1
             self._lockin_filename = path.join(self._filepath,
-                                       '{}_{}_{}_{}{}'.format(self._device, measurement_title, self._polarization, index, '.csv'))
+                                       '{}_{}_{}_{}{}'.format(self._device, measurement_title, self._polarization, index, extension(self._file_format)))
             self._imagefile = path.join(self._filepath,
                                         '{}_{}_{}_{}{}'.format(self._device, measurement_title, self._polarization, index, '.png'))
     def replot(self):
@@ -83,6 +92,8 @@ class BaseRamanMeasurement:
         pass
 
     def pack_buttons(self, abort_option=True, integrated=True, colormap=True):
+        if not has_widgets(self._master):
+            return
         if integrated:
             row = tk.Frame(self._master)
             lab = tk.Label(row, text='start {}'.format(self._units), anchor='w')
@@ -116,12 +127,32 @@ class BaseRamanMeasurement:
     def abort(self):
         self._abort = True
 
+    def submit_spectrum(self, *args):
+        """Queues take_spectrum on a CCD running on an InstrumentWorker, or takes it straight away (blocking, as
+        before the worker) on a bare CCDController2. Returns a Future of the spectrum either way"""
+        if hasattr(self._ccd, 'submit'):
+            return self._ccd.submit('take_spectrum', *args)
+        future = futures.Future()
+        future.set_result(self._ccd.take_spectrum(*args))
+        return future
+
     def take_spectrum(self):
-        raw, data = self._ccd.take_spectrum(self._integration_time, self._raman_gain, self._acquisitions,
-                                            self._shutter, self._dark_current)
+        """Takes a spectrum, dark corrected if set. The windows are handled while the CCD integrates, so the
+        measurement can be aborted meanwhile; then the dark spectrum is dropped and None, None is returned"""
+        spectrum = self.submit_spectrum(self._integration_time, self._raman_gain, self._acquisitions, self._shutter,
+                                        self._dark_current)
+        if self._dark_corrected:
+            dark = self.submit_spectrum(self._integration_time, self._raman_gain, self._acquisitions, False,
+                                        self._dark_corrected)  # queued straight after, so no gap between the two
+        raw, data = instrument_worker.wait(self._master, spectrum)
+        if self._abort:
+            if self._dark_corrected:
+                dark.cancel()  # skipped if the worker has not started it yet
+            return None, None
         if self._dark_corrected:
-            dark_raw, dark_data = self._ccd.take_spectrum(self._integration_time, self._raman_gain, self._acquisitions,
-                                                          False, self._dark_corrected)
+            dark_raw, dark_data = instrument_worker.wait(self._master, dark)
+            if self._abort:
+                return None, None
             raw = raw - dark_raw
             data = data - dark_data
         self._data = data
@@ -136,9 +167,15 @@ class BaseRamanMeasurement:
         self._single_canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self._single_fig.savefig(self._imagefile, format='png', bbox_inches='tight')
 
+    def integration_window(self, start, stop):
+        """Returns the IntegrationWindow for a band, which is only resolved against the x values once"""
+        if (start, stop) not in self._integration_windows:
+            self._integration_windows[(start, stop)] = IntegrationWindow(self._xvalues, start, stop)
+        return self._integration_windows[(start, stop)]
+
     def integrate_spectrum(self, data, start, stop):
-        return np.trapz([data[i] for i in range(len(self._xvalues)) if start <= self._xvalues[i] <= stop],
-                        [i for i in self._xvalues if start <= i <= stop])
+        """Integrates one spectrum or a stack of spectra (integrating over the last axis) between start and stop"""
+        return self.integration_window(start, stop)(data)
 
     def save_single_spectrum(self):
         with open(self._lockin_filename, 'w', newline='') as inputfile:
@@ -0,0 +1,74 @@
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class SpectrumStore:
+    """Append-only store of the spectra taken during a measurement together with the time, applied voltage and
+    polarization of each one. Rows live in a structured array memory mapped to a .npy file, so they survive the
+    measurement window and can be reloaded with np.load(filename, mmap_mode='r').
+
+    Picking and replotting read from here instead of re-parsing the CSV. Lookups by time, voltage or polarization
+    binary search a sort order that is only rebuilt after new rows are appended.
+
+    Usage: store = SpectrumStore(filename, pixels, capacity)
+        store.append(counts, time=now)
+        store.counts, the (rows, pixels) array of spectra
+        store.nearest('time', 12.5), the index of the row taken closest to 12.5 s
+    """
+    keys = ('time', 'voltage', 'polarization')
+
+    def __init__(self, filename, pixels, capacity):
+        dtype = np.dtype([('time', 'f8'), ('voltage', 'f8'), ('polarization', 'f8'), ('counts', 'f8', (pixels,))])
+        self.filename = filename
+        self._rows = open_memmap(filename, mode='w+', dtype=dtype, shape=(capacity,))
+        self._rows[:] = np.full(1, np.nan, dtype=dtype)
+        self._length = 0
+        self._order = {}
+
+    def __len__(self):
+        return self._length
+
+    def append(self, counts, time=np.nan, voltage=np.nan, polarization=np.nan):
+        """Adds a spectrum and returns its row index. Raises IndexError once the store is full"""
+        if self._length == len(self._rows):
+            raise IndexError('spectrum store is full')
+        row = self._rows[self._length]
+        row['counts'] = counts
+        row['time'] = time
+        row['voltage'] = voltage
+        row['polarization'] = polarization
+        self._length += 1
+        self._order = {}
+        return self._length - 1
+
+    @property
+    def counts(self):
+        return self._rows['counts'][:self._length]
+
+    def column(self, key):
+        return self._rows[key][:self._length]
+
+    def sort_order(self, key):
+        if key not in self._order:
+            self._order[key] = np.argsort(self.column(key), kind='stable')
+        return self._order[key]
+
+    def nearest(self, key, value):
+        """Returns the index of the row whose key is closest to value"""
+        return self.matching(key, value)[0]
+
+    def matching(self, key, value):
+        """Returns the indices, in the order they were taken, of every row sharing the value of key closest to value,
+        such as both sweeps of a voltage waterfall"""
+        if not self._length:
+            raise IndexError('spectrum store is empty')
+        order = self.sort_order(key)
+        ordered = self.column(key)[order]
+        i = np.clip(np.searchsorted(ordered, value), 1, len(ordered) - 1) if len(ordered) > 1 else 0
+        if len(ordered) > 1 and abs(ordered[i - 1] - value) <= abs(ordered[i] - value):
+            i -= 1
+        closest = ordered[i]
+        return np.sort(order[np.searchsorted(ordered, closest, 'left'):np.searchsorted(ordered, closest, 'right')])
+
+    def flush(self):
+        self._rows.flush()
@@ -1,8 +1,8 @@
 import numpy as np
+from functools import lru_cache
 
 
 def convert_pixels_to_wavelength(groove_density, center_wavelength=785, xpixels=1024):
-    wavelengths = np.zeros(1024)
     #  these constants are for the iHR 320
     F = 318.719  # mm
     LB = F  # mm
@@ -19,16 +19,14 @@ def convert_pixels_to_wavelength(groove_density, center_wavelength=785, xpixels=
     alpha = np.arcsin((1e-6 * K * GN * LAMBDA) / (2 * np.cos(DV / 2 * np.pi / 180))) - DV * np.pi / 180 / 2
     blc = DV * np.pi / 180 + alpha
 
-    for i in range(xpixels):
-        lh = F * np.cos(G * np.pi / 180)
-        bh = blc + G * np.pi / 180
-        hblc = F * np.sin(G * np.pi / 180)   # radians
-        hbln = PIXEL_WIDTH * (i - (xpixels / 2)) + hblc
-        bln = bh - np.arctan(hbln / lh)  # radians
-        lambdan = ((np.sin(alpha) + np.sin(bln)) * 1e6) / (K * GN)
-        wavelengths[xpixels-1-i] = lambdan
-
-    return wavelengths
+    i = np.arange(xpixels)
+    lh = F * np.cos(G * np.pi / 180)
+    bh = blc + G * np.pi / 180
+    hblc = F * np.sin(G * np.pi / 180)   # radians
+    hbln = PIXEL_WIDTH * (i - (xpixels / 2)) + hblc
+    bln = bh - np.arctan(hbln / lh)  # radians
+    lambdan = ((np.sin(alpha) + np.sin(bln)) * 1e6) / (K * GN)
+    return lambdan[::-1].copy()  # reversed to match the readout order of the chip
 
 
 def convert_nm_to_wavenumber(nm, laser_wavelength=785):
@@ -50,13 +48,22 @@ def convert_ev_to_nm(ev):
 
 
 def convert_pixels_to_unit(unit, groove_density, center_wavelength, laser_wavelength=785, pixels=1024):
-    nm = convert_pixels_to_wavelength(groove_density, center_wavelength, pixels)
-    if unit == 'nm':
-        return nm
-    if unit == 'eV':
-        return convert_nm_to_ev(nm)
-    if unit == 'cm^-1':
-        return convert_nm_to_wavenumber(nm, laser_wavelength)
-
+    """Returns the calibrated x axis of the CCD in nm, eV or cm^-1. Axes are cached and shared between callers, so the
+    returned array is read only"""
+    return calibration_axis(unit, float(groove_density), float(center_wavelength), float(laser_wavelength),
+                            int(pixels))
 
 
+@lru_cache(maxsize=64)
+def calibration_axis(unit, groove_density, center_wavelength, laser_wavelength, pixels):
+    nm = convert_pixels_to_wavelength(groove_density, center_wavelength, pixels)
+    if unit == 'nm':
+        axis = nm
+    elif unit == 'eV':
+        axis = convert_nm_to_ev(nm)
+    elif unit == 'cm^-1':
+        axis = convert_nm_to_wavenumber(nm, laser_wavelength)
+    else:
+        return None
+    axis.setflags(write=False)
+    return axis
@@ -0,0 +1,102 @@
+import numbers
+import numpy as np
+
+
+class HDF5Writer:
+    """Writes the rows a measurement would send to a csv.writer into an open h5py.File.
+
+    Header rows (['key:', value, ...]) up to the ['end:', 'end of header'] row become attributes of the file. After
+    that, a row of only strings names the columns, and data rows are appended to typed, chunked, gzip compressed
+    datasets with a resizable first axis. Rows are grouped by their number of values, so a Raman file keeps its x
+    values and spectra in one dataset and the lock in readings in others. Leading strings in a data row, such as
+    'time scan 1.5' or 'applied voltage 200', are kept row by row in a matching labels dataset.
+
+    Rows are buffered and written chunk_rows at a time, and on flush()."""
+    def __init__(self, h5file, chunk_rows=256):
+        self._file = h5file
+        self._chunk_rows = chunk_rows
+        self._header = not self._file.attrs.get('end of header', False)
+        self._columns = None
+        self._rows = {}
+        self._labels = {}
+
+    def writerow(self, row):
+        row = list(row)
+        if self._header:
+            self.write_header_row(row)
+            return
+        label = []
+        while row and isinstance(row[0], str):
+            label.append(row.pop(0))
+        if not row:
+            self._columns = label
+            return
+        width = len(row)
+        self._rows.setdefault(width, []).append([self.to_float(i) for i in row])
+        self._labels.setdefault(width, []).append(' '.join(label))
+        if len(self._rows[width]) >= self._chunk_rows:
+            self.flush_width(width)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def write_header_row(self, row):
+        key = str(row[0])
+        key = key[:-1] if key.endswith(':') else key
+        if key == 'end':
+            self._header = False
+            self._file.attrs['end of header'] = True
+            return
+        values = row[1:]
+        if len(values) == 1:
+            value = values[0]
+            self._file.attrs[key] = value if isinstance(value, (numbers.Number, str)) else str(value)
+        elif all(isinstance(i, numbers.Number) for i in values):
+            self._file.attrs[key] = np.asarray(values, dtype=float)
+        else:
+            self._file.attrs[key] = [str(i) for i in values]
+
+    @staticmethod
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    def dataset(self, width):
+        name = 'data_{}'.format(width)
+        if name not in self._file:
+            dataset = self._file.create_dataset(name, shape=(0, width), maxshape=(None, width), dtype='f8',
+                                                chunks=(self._chunk_rows, width), compression='gzip', shuffle=True)
+            if self._columns and len(self._columns) == width:
+                dataset.attrs['columns'] = self._columns
+        return self._file[name]
+
+    def labels(self, width, rows):
+        """Returns the labels dataset for a width, creating it (blank for any rows already written) if needed"""
+        name = 'labels_{}'.format(width)
+        if name not in self._file:
+            import h5py
+            self._file.create_dataset(name, shape=(rows,), maxshape=(None,), dtype=h5py.string_dtype(),
+                                      chunks=(self._chunk_rows,), compression='gzip')
+        return self._file[name]
+
+    def flush_width(self, width):
+        rows = self._rows.pop(width, [])
+        labels = self._labels.pop(width, [])
+        if not rows:
+            return
+        dataset = self.dataset(width)
+        start = dataset.shape[0]
+        dataset.resize(start + len(rows), axis=0)
+        dataset[start:] = rows
+        if any(labels) or 'labels_{}'.format(width) in self._file:
+            label_dataset = self.labels(width, start)
+            label_dataset.resize(start + len(labels), axis=0)
+            label_dataset[start:] = labels
+
+    def flush(self):
+        for width in list(self._rows):
+            self.flush_width(width)
+        self._file.flush()
@@ -0,0 +1,221 @@
+import csv
+import hashlib
+import io
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+cache_version = 1
+
+
+class Measurement:
+    """A loaded data file. header is a dict of the key: value rows above 'end:' (values are kept as the strings that
+    were written, or lists of strings for rows with several values) and data is the numeric body"""
+    kind = 'table'
+
+    def __init__(self, filename, header, data):
+        self.filename = filename
+        self.header = header
+        self.data = data
+
+    def __repr__(self):
+        return '{}({!r}, {} rows)'.format(type(self).__name__, self.filename, len(self.data))
+
+
+class Table(Measurement):
+    """Any file with a row of column names, such as the time, intensity and polarization measurements and the line
+    cuts of a map. data is a pandas DataFrame"""
+    @property
+    def columns(self):
+        return list(self.data.columns)
+
+    def __getitem__(self, column):
+        return self.data[column].values
+
+
+class MapGrid(Table):
+    """A map scan. Rows may have been measured in any order, so grid(column) places every value at its x_pixel,
+    y_pixel position in an (x scan density, y scan density) array, leaving pixels that were never measured as nan"""
+    kind = 'map'
+
+    @property
+    def shape(self):
+        try:
+            return int(float(self.header['x scan density'])), int(float(self.header['y scan density']))
+        except (KeyError, ValueError):
+            return int(self.data['x_pixel'].max()) + 1, int(self.data['y_pixel'].max()) + 1
+
+    def grid(self, column):
+        z = np.full(self.shape, np.nan)
+        z[self.data['x_pixel'].values.astype(int), self.data['y_pixel'].values.astype(int)] = self.data[column].values
+        return z
+
+
+class IVSweep(Table):
+    """A current vs voltage sweep, either one scan or the total average of several"""
+    kind = 'iv sweep'
+
+    @property
+    def voltage(self):
+        if 'applied voltage (V)' in self.data:
+            return self.data['applied voltage (V)'].values
+        return self.data['voltage'].values
+
+
+class SpectrumStack(Measurement):
+    """A Raman measurement. xvalues is the calibration axis, data the (spectra, pixels) array of counts and labels
+    the text that starts each spectrum row, such as 'time scan 1.5' or 'applied voltage 200'. Rows that are not
+    spectra, like the lock in readings of a voltage waterfall, are kept in readings with their labels"""
+    kind = 'spectra'
+
+    def __init__(self, filename, header, xvalues, labels, data, readings=None):
+        super().__init__(filename, header, data)
+        self.xvalues = xvalues
+        self.labels = labels
+        self.readings = readings if readings is not None else pd.DataFrame()
+
+    def values(self):
+        """Returns the number in each spectrum's label (the time, voltage, polarization or power it was taken at)"""
+        return pd.Series(self.labels, dtype=str).str.extract(r'(-?[\d.]+(?:[eE][-+]?\d+)?)\s*$')[0].astype(
+            float).values
+
+
+def parse_header(fin):
+    """Reads the key: value rows up to 'end:' from an open csv file. Returns an empty header, leaving the file at
+    the start, if the file does not have one"""
+    header = {}
+    start = fin.tell()
+    line = fin.readline()
+    while line:
+        row = next(csv.reader([line]))
+        if not row or not row[0].endswith(':'):
+            fin.seek(start)
+            return {}
+        key = row[0][:-1].strip()
+        if key == 'end':
+            return header
+        header[key] = row[1] if len(row) == 2 else row[1:]
+        line = fin.readline()
+    fin.seek(start)
+    return {}
+
+
+def classify(filename, header, data):
+    columns = set(data.columns)
+    if {'x_pixel', 'y_pixel'} <= columns:
+        return MapGrid(filename, header, data)
+    if 'applied voltage (V)' in columns or ('voltage' in columns and 'Idc' in columns):
+        return IVSweep(filename, header, data)
+    return Table(filename, header, data)
+
+
+def read_spectra(filename, header, labels, rows, width):
+    """Splits padded rows (nan past the end of short rows) into the x values, the spectra and any other readings"""
+    labels = np.asarray(labels, dtype=str)
+    x_rows = labels == 'x values'
+    xvalues = rows[x_rows][0, :width] if x_rows.any() else np.arange(width, dtype=float)
+    spectra = ~x_rows & ~np.isnan(rows[:, width - 1])
+    readings = pd.DataFrame(rows[~x_rows & ~spectra])
+    readings = readings.dropna(axis=1, how='all')
+    readings.insert(0, 'label', labels[~x_rows & ~spectra])
+    return SpectrumStack(filename, header, xvalues, labels[spectra], rows[spectra, :width], readings)
+
+
+def read_csv_file(filename):
+    with open(filename, newline='') as fin:
+        header = parse_header(fin)
+        body = fin.read()
+    first = next(csv.reader([body.split('\n', 1)[0]]), [])
+    if first and first[0] == 'x values':
+        width = len(first) - 1
+        table = pd.read_csv(io.StringIO(body), header=None, names=range(width + 1), dtype={0: str})
+        return read_spectra(filename, header, table[0].values, table.iloc[:, 1:].to_numpy(dtype=float), width)
+    data = pd.read_csv(io.StringIO(body))
+    if len(data.columns) and data.columns[0].startswith('Unnamed'):
+        data = data.drop(columns=data.columns[0])  # the index written by DataFrame.to_csv
+    return classify(filename, header, data)
+
+
+def read_hdf5_file(filename):
+    import h5py  # only needed for hdf5 files
+    with h5py.File(filename, 'r') as h5file:
+        header = {key: [str(i) for i in value] if np.ndim(value) else str(value)
+                  for key, value in h5file.attrs.items() if key != 'end of header'}
+        datasets = {}
+        for name in h5file:
+            if name.startswith('data_'):
+                width = int(name[len('data_'):])
+                labels_name = 'labels_{}'.format(width)
+                labels = h5file[labels_name].asstr()[:] if labels_name in h5file else [''] * h5file[name].shape[0]
+                datasets[width] = (h5file[name][:], np.asarray(labels, dtype=str),
+                                   list(h5file[name].attrs.get('columns', [])))
+    for width, (rows, labels, _) in datasets.items():
+        if 'x values' in labels:
+            padded = []
+            padded_labels = []
+            for other, (other_rows, other_labels, _) in datasets.items():
+                padding = np.full((len(other_rows), max(width - other, 0)), np.nan)
+                padded.append(np.hstack([other_rows[:, :width], padding]))
+                padded_labels.append(other_labels)
+            return read_spectra(filename, header, np.concatenate(padded_labels), np.vstack(padded), width)
+    if not datasets:
+        return Table(filename, header, pd.DataFrame())
+    width = max(datasets, key=lambda i: len(datasets[i][0]))
+    rows, _, columns = datasets[width]
+    return classify(filename, header, pd.DataFrame(rows, columns=columns if len(columns) == width else None))
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'optics')
+
+
+def cache_file(filename, cache_dir):
+    key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+    return os.path.join(cache_dir, key + '.pickle')
+
+
+def load(filename, cache=True, cache_dir=None):
+    """Loads a csv or hdf5 data file written by any of the measurements and returns a MapGrid, IVSweep,
+    SpectrumStack or Table.
+
+    The header is parsed once and the body is read in one call to pandas (or h5py). Loaded files are pickled into
+    cache_dir (~/.cache/optics by default) together with the modification time and size of the file, so loading
+    the same file again is a single unpickle until the file changes."""
+    stat = os.stat(filename)
+    stamp = (cache_version, stat.st_mtime_ns, stat.st_size)
+    if cache:
+        cached = cache_file(filename, cache_dir or default_cache_dir())
+        try:
+            with open(cached, 'rb') as fin:
+                cached_stamp, measurement = pickle.load(fin)
+            if cached_stamp == stamp:
+                return measurement
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            pass
+    if os.path.splitext(filename)[1] in ('.h5', '.hdf5'):
+        measurement = read_hdf5_file(filename)
+    else:
+        measurement = read_csv_file(filename)
+    if cache:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        with open(cached + '.tmp', 'wb') as fout:
+            pickle.dump((stamp, measurement), fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cached + '.tmp', cached)
+    return measurement
+
+
+def index(directory, extensions=('.csv', '.h5'), cache=True, cache_dir=None):
+    """Loads every data file below directory. Returns a dict of filename: measurement, skipping (and printing)
+    files that cannot be parsed"""
+    measurements = {}
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if os.path.splitext(name)[1] not in extensions:
+                continue
+            filename = os.path.join(root, name)
+            try:
+                measurements[filename] = load(filename, cache, cache_dir)
+            except (ValueError, KeyError, IndexError, pd.errors.ParserError) as error:
+                print('could not load {}: {}'.format(filename, error))
+    return measurements
@@ -0,0 +1,42 @@
+import contextlib
+import csv
+from optics.storage.hdf5_writer import HDF5Writer
+
+file_formats = ['csv', 'hdf5']
+
+
+class CSVWriter:
+    """A csv.writer with a flush() like HDF5Writer's, which pushes the rows written so far out to the file"""
+    def __init__(self, csvfile):
+        self._file = csvfile
+        writer = csv.writer(csvfile)
+        self.writerow = writer.writerow
+        self.writerows = writer.writerows
+
+    def flush(self):
+        self._file.flush()
+
+
+def extension(file_format):
+    """Returns the file extension for a file format"""
+    return {'csv': '.csv', 'hdf5': '.h5'}[file_format]
+
+
+@contextlib.contextmanager
+def open_writer(filename, file_format='csv', mode='w'):
+    """Opens a data file and yields an object with the writerow/writerows methods of a csv.writer, so measurements can
+    write headers and data the same way in any format. mode is 'w' to create the file or 'a' to append to it. The
+    writer's flush() writes out any buffered rows"""
+    if file_format == 'csv':
+        with open(filename, mode, newline='') as inputfile:
+            yield CSVWriter(inputfile)
+    elif file_format == 'hdf5':
+        import h5py  # only needed for hdf5 files
+        with h5py.File(filename, mode) as h5file:
+            writer = HDF5Writer(h5file)
+            try:
+                yield writer
+            finally:
+                writer.flush()
+    else:
+        raise ValueError('unknown file format: {}'.format(file_format))
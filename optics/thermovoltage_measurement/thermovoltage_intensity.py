@@ -9,7 +9,7 @@ from optics.misc_utility import conversions
 import os
 from os import path
 import numpy as np
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.measurements.scheduler import Scheduler
 import tkinter as tk
 
 
@@ -55,6 +55,7 @@ class ThermovoltageIntensity:
         self._canvas.draw()
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self._abort = False
+        self._scheduler = Scheduler(self._master)
 
     def abort(self):
         self._abort = True
@@ -130,36 +131,38 @@ class ThermovoltageIntensity:
         self._ax3.set_ylim(self._min_power * 1 / 2 * 1000, self._max_power * 2 * 1000)
 
     def measure(self):
-        self._master.update()
-        self._attenuatorwheel.step(self._steps, 0.005)
-        tk_sleep(self._master, 100)
-        time_now = time.time() - self._start_time
-        self._power = self._powermeter.read_power()
-        raw = self._sr7270_single_reference.read_xy()
-        self._voltages = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
-        self._writer.writerow([time_now, self._power, raw[0], raw[1], self._voltages[0], self._voltages[1]])
-        self._ax1.plot(time_now, self._voltages[0] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
-        self._ax2.plot(time_now, self._voltages[1] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
-        self._ax3.plot(time_now, self._power * 1000, linestyle='', color='blue', marker='o', markersize=2)
-        self.set_limits()
-        self._fig.tight_layout()
-        self._fig.canvas.draw()
-        self._master.update()
-        if time.time() - self._start_time < self._maxtime and not self._abort:
-            self.measure()
+        """Steps of the scheduler, one step of the attenuator wheel each until the max time is reached or the scan is
+        aborted"""
+        while time.time() - self._start_time < self._maxtime and not self._abort:
+            self._attenuatorwheel.step(self._steps, 0.005)
+            yield 100
+            time_now = time.time() - self._start_time
+            self._power = self._powermeter.read_power()
+            raw = self._sr7270_single_reference.read_xy()
+            self._voltages = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
+            self._writer.writerow([time_now, self._power, raw[0], raw[1], self._voltages[0], self._voltages[1]])
+            self._ax1.plot(time_now, self._voltages[0] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
+            self._ax2.plot(time_now, self._voltages[1] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
+            self._ax3.plot(time_now, self._power * 1000, linestyle='', color='blue', marker='o', markersize=2)
+            self.set_limits()
+            self._fig.tight_layout()
+            self._fig.canvas.draw()
 
-    def main(self):
-        self.makefile()
-        button = tk.Button(master=self._master, text="Abort", command=self.abort)
-        button.pack(side=tk.BOTTOM)
+    def run(self):
         with open(self._filename, 'w', newline='') as inputfile:
             try:
                 self._start_time = time.time()
                 self._writer = csv.writer(inputfile)
                 self.write_header()
                 self.setup_plots()
-                self.measure()
+                yield from self.measure()
                 self._fig.savefig(self._imagefile, format='png', bbox_inches='tight')
             except KeyboardInterrupt:
                 self._fig.savefig(self._imagefile, format='png',
                                   bbox_inches='tight')  # saves an image of the completed data
+
+    def main(self):
+        self.makefile()
+        button = tk.Button(master=self._master, text="Abort", command=self.abort)
+        button.pack(side=tk.BOTTOM)
+        self._scheduler.start(self.run())
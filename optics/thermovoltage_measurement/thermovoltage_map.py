@@ -1,10 +1,10 @@
 import matplotlib
 
 matplotlib.use('Qt4Agg')  # this allows you to see the interactive plots!
-from optics.misc_utility import scanner, conversions
-import csv
+from optics.misc_utility import conversions
 import numpy as np
 from optics.thermovoltage_plot import thermovoltage_plot
+from optics.thermovoltage_plot.live_image import LiveImage
 from tkinter import *
 import warnings
 import os
@@ -13,14 +13,20 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
 import tkinter as tk
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.misc_utility.tkinter_utilities import has_widgets
+from optics.measurements.scan_engine import ScanEngine
+from optics.storage.writer import open_writer, extension
+from optics.measurements.checkpoint import ScanCheckpoint
+from optics.measurements.settle import lockin_settle
+from optics.measurements.adaptive_scan import AdaptiveScan
 
 
 class ThermovoltageScan:
     def __init__(self, master, filepath, notes, device, scan, gain, xd, yd, xr, yr, xc, yc,
                  npc3sg_x, npc3sg_y, npc3sg_input, sr7270_single_reference, powermeter, waveplate,
                  direction=True,
-                 axis='y'):
+                 axis='y', frame_rate=5, path='raster', file_format='csv', resume=False,
+                 settle='fixed', sampling='full', canvas=FigureCanvasTkAgg):
         self._master = master
         self._filepath = filepath
         self._notes = notes
@@ -45,38 +51,44 @@ class ThermovoltageScan:
         self._ax3 = self._fig.add_subplot(222)
         self._ax4 = self._fig.add_subplot(224)
         self._axis = axis
+        self._path = path
+        self._file_format = file_format
+        self._resume = resume  # carries on from the checkpoint of an unfinished scan
+        self._sampling = sampling  # 'adaptive' measures a coarse grid and refines it around features
+        self._adaptive = None
         self._npc3sg_x = npc3sg_x
         self._npc3sg_y = npc3sg_y
         self._npc3sg_input = npc3sg_input
         self._sr7270_single_reference = sr7270_single_reference
         self._powermeter = powermeter
-        self._norm = thermovoltage_plot.MidpointNormalize(midpoint=0)
-        self._z1 = np.zeros((self._xd, self._yd))
-        self._z2 = np.zeros((self._xd, self._yd))
-        self._im1 = self._ax1.imshow(self._z1.T, norm=self._norm, cmap=plt.cm.coolwarm, interpolation='nearest',
-                                     origin='lower')
-        self._im2 = self._ax2.imshow(self._z2.T, norm=self._norm, cmap=plt.cm.coolwarm, interpolation='nearest',
-                                     origin='lower')
+        self._time_constant = self._sr7270_single_reference.read_tc()
+        self._settle = lockin_settle(self._master, self._sr7270_single_reference, settle, self._time_constant)
+        self._engine = ScanEngine(self._master, self._npc3sg_x, self._npc3sg_y, self._xd, self._yd, self._xr, self._yr,
+                                  self._xc, self._yc, self.acquire, channels=2, direction=direction, axis=self._axis,
+                                  path=self._path, render=self.render, on_line=self.plot_cut, frame_rate=frame_rate)
+        self._z1 = self._engine.z[0]
+        self._z2 = self._engine.z[1]
+        self._im1 = self._ax1.imshow(self._z1.T, norm=thermovoltage_plot.MidpointNormalize(midpoint=0),
+                                     cmap=plt.cm.coolwarm, interpolation='nearest', origin='lower')
+        self._im2 = self._ax2.imshow(self._z2.T, norm=thermovoltage_plot.MidpointNormalize(midpoint=0),
+                                     cmap=plt.cm.coolwarm, interpolation='nearest', origin='lower')
         self._clb1 = self._fig.colorbar(self._im1, ax=self._ax1)
         self._clb2 = self._fig.colorbar(self._im2, ax=self._ax2)
         self._imagefile = None
         self._filename = None
         self._cutfilename = None
         self._writer = None
-        self._x_val, self._y_val = scanner.find_scan_values(self._xc, self._yc, self._xr, self._yr, self._xd, self._yd)
-        self._direction = direction
-        if not self._direction:
-            self._y_val = self._y_val[::-1]
-        self._fig.set_tight_layout(True)
-        self._canvas = FigureCanvasTkAgg(self._fig, master=self._master)  # A tk.DrawingArea.
+        self._canvas = canvas(self._fig, master=self._master)  # A tk.DrawingArea.
         self._canvas.draw()
+        self._live1 = LiveImage(self._canvas, self._im1, transpose=True)
+        self._live2 = LiveImage(self._canvas, self._im2, transpose=True)
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self._abort = False
         self._cut_writer = None
-        self._time_constant = self._sr7270_single_reference.read_tc()
 
     def abort(self):
         self._abort = True
+        self._engine.abort()
 
     def centerbeam(self):
         self._npc3sg_y.move(80)
@@ -90,6 +102,7 @@ class ThermovoltageScan:
         self._writer.writerow(['y range:', self._yr])
         self._writer.writerow(['x center:', self._xc])
         self._writer.writerow(['y center:', self._yc])
+        self._writer.writerow(['scan path:', self._path])
         if self._waveplate:
             self._writer.writerow(['polarization:', self._polarization])
             self._writer.writerow(['raw polarization:', self._measuredpolarization])
@@ -101,6 +114,8 @@ class ThermovoltageScan:
         else:
             self._writer.writerow(['power (W):', 'not measured'])
         self._writer.writerow(['time constant:', self._sr7270_single_reference.read_tc()])
+        self._writer.writerow(['settle:', self._settle.mode])
+        self._writer.writerow(['sampling:', self._sampling])
         self._writer.writerow(['reference phase:', self._sr7270_single_reference.read_reference_phase()])
         self._writer.writerow(['notes:', self._notes])
         self._writer.writerow(['end:', 'end of header'])
@@ -121,141 +136,96 @@ class ThermovoltageScan:
         self._ax3.set_ylabel('voltage (uV)')
         self._ax4.set_ylabel('voltage (uV)')
         if self._axis == 'y':
-            self._ax3.set_xlim(0, self._yd - 1, 1)
-            self._ax4.set_xlim(0, self._yd - 1, 1)
+            self._ax3.set_xlim(0, self._yd - 1)
+            self._ax4.set_xlim(0, self._yd - 1)
         else:
-            self._ax3.set_xlim(0, self._xd - 1, 1)
-            self._ax4.set_xlim(0, self._xd - 1, 1)
+            self._ax3.set_xlim(0, self._xd - 1)
+            self._ax4.set_xlim(0, self._xd - 1)
+        self._fig.tight_layout()
+
+    def checkpoint_settings(self):
+        return dict(self._engine.settings(), device=self._device, gain=self._gain, sampling=self._sampling)
 
-    def update_plot(self, im, data, min_val, max_val):
-        im.set_data(data.T)
-        im.set_clim(vmin=min_val)
-        im.set_clim(vmax=max_val)
+    def resumable(self):
+        """True if resuming and the current file has an unfinished checkpoint of a scan with the same settings"""
+        return self._resume and path.exists(self._filename) and \
+            ScanCheckpoint.resumable(self._filename, self.checkpoint_settings())
 
-    def onclick(self, event):
-        try:
-            points = [int(np.ceil(event.xdata - 0.5)), int(np.ceil(event.ydata - 0.5))]
-            if not self._direction:
-                points = [int(np.ceil(event.xdata - 0.5)), int(np.ceil(self._yd - event.ydata - 0.5 - 1))]
-            self._npc3sg_x.move(self._x_val[points[0]])
-            self._npc3sg_y.move(self._y_val[points[1]])
-            print('pixel: ' + str(points))
-            print('position: ' + str(self._x_val[points[0]]) + ', ' + str(self._y_val[points[1]]))
-        except:
-            print('invalid position')
+    def checkpoint(self, resume):
+        instruments = {'time constant': self._time_constant, 'polarization': self._polarization,
+                       'settle': self._settle.mode}
+        return ScanCheckpoint(self._filename, 2, self._xd, self._yd, self.checkpoint_settings(), instruments,
+                              resume=resume, flush=self.flush_files)
+
+    def flush_files(self):
+        """Writes out the buffered rows, before the checkpoint counts their pixels as done"""
+        self._writer.flush()
+        self._cut_writer.flush()
 
     def makefile(self):
         os.makedirs(self._filepath, exist_ok=True)
         index = self._scan
-        self._filename = path.join(self._filepath, '{}_{}_{}{}'.format(self._device, self._polarization, index, '.csv'))
+        file_extension = extension(self._file_format)
+        self._filename = path.join(self._filepath,
+                                   '{}_{}_{}{}'.format(self._device, self._polarization, index, file_extension))
         self._cutfilename = path.join(self._filepath,
-                                      '{}_{}_{}_cut{}'.format(self._device, self._polarization, index, '.csv'))
+                                      '{}_{}_{}_cut{}'.format(self._device, self._polarization, index, file_extension))
         self._imagefile = path.join(self._filepath,
                                     '{}_{}_{}{}'.format(self._device, self._polarization, index, '.png'))
-        while path.exists(self._filename):
+        while (path.exists(self._filename) or ScanCheckpoint.exists(self._filename)) and not self.resumable():
             index += 1
             self._filename = path.join(self._filepath,
-                                       '{}_{}_{}{}'.format(self._device, self._polarization, index, '.csv'))
-            self._cutfilename = path.join(self._filepath,
-                                          '{}_{}_{}_cut{}'.format(self._device, self._polarization, index, '.csv'))
+                                       '{}_{}_{}{}'.format(self._device, self._polarization, index, file_extension))
+            self._cutfilename = path.join(self._filepath, '{}_{}_{}_cut{}'.format(self._device, self._polarization,
+                                                                                  index, file_extension))
             self._imagefile = path.join(self._filepath,
                                         '{}_{}_{}{}'.format(self._device, self._polarization, index, '.png'))
 
-    def run_scan(self):
+    def acquire(self, x_ind, y_ind):
+        raw = self._settle(self._sr7270_single_reference.read_xy)
+        voltages = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
+        self._writer.writerow([raw[0], raw[1], voltages[0], voltages[1], x_ind, y_ind])
+        return [voltages[0] * 1000000, voltages[1] * 1000000]
+
+    def render(self):
+        self._live1.update(self._z1, -self._engine.stats[0].absmax, self._engine.stats[0].absmax)
+        self._live2.update(self._z2, -self._engine.stats[1].absmax, self._engine.stats[1].absmax)
+
+    def plot_cut(self, line):
         if self._axis == 'y':
-            for y_ind, i in enumerate(self._y_val):
-                self._master.update()
-                if self._abort:
-                    self._npc3sg_x.move(0)
-                    self._npc3sg_y.move(0)
-                    break
-                if not self._direction:
-                    y_ind = len(self._y_val) - y_ind - 1
-                self._npc3sg_y.move(i)
-                v = []
-                for x_ind, j in enumerate(self._x_val):
-                    self._npc3sg_x.move(j)
-                    tk_sleep(self._master, self._time_constant * 1000 * 3)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
-                    raw = self._sr7270_single_reference.read_xy()
-                    voltages = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
-                    v.append(voltages)
-                    self._writer.writerow([raw[0], raw[1], voltages[0], voltages[1], x_ind, y_ind])
-                    self._z1[x_ind][y_ind] = voltages[0] * 1000000
-                    self._z2[x_ind][y_ind] = voltages[1] * 1000000
-                    self.update_plot(self._im1, self._z1, -np.amax(np.abs(self._z1)), np.amax(np.abs(self._z1)))
-                    self.update_plot(self._im2, self._z2, -np.amax(np.abs(self._z2)), np.amax(np.abs(self._z2)))
-                    self._fig.set_tight_layout(True)
-                    self._canvas.draw()  # dynamically plots the data and closes automatically after completing the scan
-                    self._master.update()
-                    if self._abort:
-                        self._npc3sg_x.move(0)
-                        self._npc3sg_y.move(0)
-                        break
-                v_x_cut = np.mean(sorted([i[0] for i in v], key=abs)[-3:-1])
-                v_y_cut = np.mean(sorted([i[1] for i in v], key=abs)[-3:-1])
-                self._ax3.plot(y_ind, v_x_cut * 1000000,
-                               linestyle='', color='blue', marker='o', markersize=2)
-                self._ax4.plot(y_ind, v_y_cut * 1000000,
-                               linestyle='', color='blue', marker='o', markersize=2)
-                self._cut_writer.writerow([y_ind, v_x_cut, v_y_cut])
-                self._fig.set_tight_layout(True)
-                self._canvas.draw()
-            self._npc3sg_x.move(0)
-            self._npc3sg_y.move(0)  # returns piezo controller position to 0,0
+            x_cut, y_cut = self._z1[:, line], self._z2[:, line]
         else:
-            for x_ind, i in enumerate(self._x_val):
-                self._master.update()
-                if self._abort:
-                    self._npc3sg_x.move(0)
-                    self._npc3sg_y.move(0)
-                    break
-                if not self._direction:
-                    x_ind = len(self._x_val) - x_ind - 1
-                self._npc3sg_x.move(i)
-                v = []
-                for y_ind, j in enumerate(self._y_val):
-                    self._npc3sg_y.move(j)
-                    tk_sleep(self._master, self._time_constant * 1000 * 3)  # DO NOT USE TIME.SLEEP IN TKINTER LOOP
-                    raw = self._sr7270_single_reference.read_xy()
-                    voltages = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
-                    v.append(voltages)
-                    self._writer.writerow([raw[0], raw[1], voltages[0], voltages[1], x_ind, y_ind])
-                    self._z1[x_ind][y_ind] = voltages[0] * 1000000
-                    self._z2[x_ind][y_ind] = voltages[1] * 1000000
-                    self.update_plot(self._im1, self._z1, -np.amax(np.abs(self._z1)), np.amax(np.abs(self._z1)))
-                    self.update_plot(self._im2, self._z2, -np.amax(np.abs(self._z2)), np.amax(np.abs(self._z2)))
-                    self._fig.set_tight_layout(True)
-                    self._canvas.draw()  # dynamically plots the data and closes automatically after completing the scan
-                    self._master.update()
-                    if self._abort:
-                        self._npc3sg_x.move(0)
-                        self._npc3sg_y.move(0)
-                        break
-                v_x_cut = np.mean(sorted([i[0] for i in v], key=abs)[-3:-1])
-                v_y_cut = np.mean(sorted([i[1] for i in v], key=abs)[-3:-1])
-                self._cut_writer.writerow([x_ind, v_x_cut, v_y_cut])
-                self._ax3.plot(x_ind, v_x_cut * 1000000,
-                               linestyle='', color='blue', marker='o', markersize=2)
-                self._ax4.plot(x_ind, v_y_cut * 1000000,
-                               linestyle='', color='blue', marker='o', markersize=2)
-                self._fig.set_tight_layout(True)
-                self._canvas.draw()
-            self._npc3sg_x.move(0)
-            self._npc3sg_y.move(0)  # returns piezo controller position to 0,0
+            x_cut, y_cut = self._z1[line, :], self._z2[line, :]
+        v_x_cut = np.mean(sorted(x_cut, key=abs)[-3:-1])
+        v_y_cut = np.mean(sorted(y_cut, key=abs)[-3:-1])
+        self._ax3.plot(line, v_x_cut, linestyle='', color='blue', marker='o', markersize=2)
+        self._ax4.plot(line, v_y_cut, linestyle='', color='blue', marker='o', markersize=2)
+        self._cut_writer.writerow([line, v_x_cut / 1000000, v_y_cut / 1000000])
+        self._canvas.draw_idle()  # the cut plots are not blitted, so they need a full draw
+
+    def run_scan(self):
+        if self._sampling == 'adaptive':
+            self._adaptive = AdaptiveScan(self._engine)
+            self._adaptive.run()
+        else:
+            self._engine.run()
 
     def main(self):
-        button = tk.Button(master=self._master, text="Abort", command=self.abort)
-        button.pack(side=tk.BOTTOM)
-        button = tk.Button(master=self._master, text="Go to center", command=self.centerbeam)
-        button.pack(side=tk.BOTTOM)
+        if has_widgets(self._master):
+            button = tk.Button(master=self._master, text="Abort", command=self.abort)
+            button.pack(side=tk.BOTTOM)
+            button = tk.Button(master=self._master, text="Go to center", command=self.centerbeam)
+            button.pack(side=tk.BOTTOM)
         self.makefile()
-        with open(self._filename, 'w', newline='') as inputfile, open(self._cutfilename, 'w',
-                                                                      newline='') as cutinputfile:
+        resuming = self.resumable()
+        mode = 'a' if resuming else 'w'
+        with open_writer(self._filename, self._file_format, mode) as self._writer, \
+                open_writer(self._cutfilename, self._file_format, mode) as self._cut_writer:
             try:
-                self._writer = csv.writer(inputfile)
-                self._cut_writer = csv.writer(cutinputfile)
                 self.setup_plots()
-                self.write_header()
+                if not resuming:
+                    self.write_header()
+                self._engine.attach_checkpoint(self.checkpoint(resuming))
                 self.run_scan()
                 thermovoltage_plot.plot(self._ax1, self._im1, self._z1, np.amax(np.abs(self._z1)),
                                         -np.amax(np.abs(self._z1)))
@@ -272,7 +242,7 @@ class ThermovoltageScan:
                 warnings.filterwarnings("ignore", ".*GUI is implemented.*")  # this warning relates to code \
                 # that was never written
                 cid = self._fig.canvas.mpl_connect('button_press_event',
-                                                   self.onclick)  # click on pixel to move laser position there
+                                                   self._engine.onclick)  # click on pixel to move laser position there
             except KeyboardInterrupt:
                 self._fig.savefig(self._imagefile, format='png',
                                   bbox_inches='tight')  # saves an image of the completed data
@@ -1,11 +1,10 @@
 import matplotlib
 
 matplotlib.use('Qt4Agg')  # this allows you to see the interactive plots!
-from optics.misc_utility import scanner
-import csv
 import numpy as np
 import matplotlib.pyplot as plt
 from optics.thermovoltage_plot import thermovoltage_plot
+from optics.thermovoltage_plot.live_image import LiveImage
 from tkinter import *
 import warnings
 import os
@@ -13,12 +12,15 @@ from os import path
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import tkinter as tk
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.measurements.scan_engine import ScanEngine
+from optics.storage.writer import open_writer, extension
+from optics.measurements.checkpoint import ScanCheckpoint
 
 
 class ThermovoltageScanDC:
     def __init__(self, master, filepath, notes, device, scan, gain, xd, yd, xr, yr, xc, yc, npc3sg_x, npc3sg_y, q,
-                 powermeter, waveplate, direction=True):
+                 powermeter, waveplate, direction=True, path='raster', line_scanner=None,
+                 file_format='csv', resume=False):
         self._master = master
         self._filepath = filepath
         self._gain = gain
@@ -45,25 +47,30 @@ class ThermovoltageScanDC:
         self._npc3sg_y = npc3sg_y
         self._powermeter = powermeter
         self._norm = thermovoltage_plot.MidpointNormalize(midpoint=0)
-        self._z1 = np.zeros((self._xd, self._yd))
+        self._path = path
+        self._file_format = file_format
+        self._resume = resume  # carries on from the checkpoint of an unfinished scan
+        self._line_scanner = line_scanner  # hardware timed lines along x if given
+        self._engine = ScanEngine(self._master, self._npc3sg_x, self._npc3sg_y, self._xd, self._yd, self._xr, self._yr,
+                                  self._xc, self._yc, self.acquire, settle_time=0.3, direction=direction, path=self._path,
+                                  render=self.render, acquire_line=self.acquire_line if line_scanner else None)
+        self._z1 = self._engine.z[0]
         self._im1 = self._ax1.imshow(self._z1.T, norm=self._norm, cmap=plt.cm.coolwarm, interpolation='nearest',
                                      origin='lower')
         self._clb1 = self._fig.colorbar(self._im1, ax=self._ax1)
         self._imagefile = None
         self._filename = None
         self._writer = None
-        self._x_val, self._y_val = scanner.find_scan_values(self._xc, self._yc, self._xr, self._yr, self._xd, self._yd)
-        self._direction = direction
-        if not self._direction:
-            self._y_val = self._y_val[::-1]
         self._fig.tight_layout()
         self._canvas = FigureCanvasTkAgg(self._fig, master=self._master)  # A tk.DrawingArea.
         self._canvas.draw()
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        self._live1 = LiveImage(self._canvas, self._im1, transpose=True)
         self._abort = False
 
     def abort(self):
         self._abort = True
+        self._engine.abort()
 
     def write_header(self):
         self._writer.writerow(['x scan density:', self._xd])
@@ -72,6 +79,10 @@ class ThermovoltageScanDC:
         self._writer.writerow(['y range:', self._yr])
         self._writer.writerow(['x center:', self._xc])
         self._writer.writerow(['y center:', self._yc])
+        self._writer.writerow(['scan path:', self._path])
+        self._writer.writerow(['hardware timed:', bool(self._line_scanner)])
+        if self._line_scanner:
+            self._writer.writerow(['samples per pixel:', self._line_scanner.samples_per_pixel])
         self._writer.writerow(['polarization:', self._polarization])
         self._writer.writerow(['raw polarization:', self._measuredpolarization])
         if self._powermeter:
@@ -86,74 +97,66 @@ class ThermovoltageScanDC:
         self._clb1.set_label('voltage (uV)', rotation=270, labelpad=20)
         self._ax1.title.set_text('X_1')
 
-    def update_plot(self, im, data, min_val, max_val):
-        im.set_data(data.T)
-        im.set_clim(vmin=min_val)
-        im.set_clim(vmax=max_val)
+    def checkpoint_settings(self):
+        return dict(self._engine.settings(), device=self._device, gain=self._gain)
 
-    def onclick(self, event):
-        try:
-            points = [int(np.ceil(event.xdata - 0.5)), int(np.ceil(event.ydata - 0.5))]
-            self._npc3sg_x.move(self._x_val[points[0]])
-            self._npc3sg_y.move(self._y_val[points[1]])
-            print('pixel: ' + str(points))
-            print('position: ' + str(self._x_val[points[0]]) + ', ' + str(self._y_val[points[1]]))
-        except:
-            print('invalid position')
+    def resumable(self):
+        """True if resuming and the current file has an unfinished checkpoint of a scan with the same settings"""
+        return self._resume and path.exists(self._filename) and \
+            ScanCheckpoint.resumable(self._filename, self.checkpoint_settings())
+
+    def checkpoint(self, resume):
+        instruments = {'polarization': self._polarization, 'line scans': bool(self._line_scanner),
+                       'samples per pixel': self._line_scanner.samples_per_pixel if self._line_scanner else None}
+        return ScanCheckpoint(self._filename, 1, self._xd, self._yd, self.checkpoint_settings(), instruments,
+                              resume=resume, flush=self._writer.flush)
 
     def makefile(self):
         os.makedirs(self._filepath, exist_ok=True)
         index = self._scan
+        file_extension = extension(self._file_format)
         self._filename = path.join(self._filepath, '{}_{}_{}_{}{}'.format(self._device, self._polarization, 'DC', index,
-                                                                          '.csv'))
+                                                                          file_extension))
         self._imagefile = path.join(self._filepath, '{}_{}_{}_{}{}'.format(self._device, self._polarization, 'DC',
                                                                            index, '.png'))
-        while path.exists(self._filename):
+        while (path.exists(self._filename) or ScanCheckpoint.exists(self._filename)) and not self.resumable():
             index += 1
             self._filename = path.join(self._filepath, '{}_{}_{}_{}{}'.format(self._device, self._polarization, 'DC',
-                                                                              index, '.csv'))
+                                                                              index, file_extension))
             self._imagefile = path.join(self._filepath, '{}_{}_{}_{}{}'.format(self._device, self._polarization, 'DC',
                                                                                index, '.png'))
 
+    def acquire(self, x_ind, y_ind):
+        data = self._q.read()
+        raw = data[0] - data[1]
+        voltage = raw / self._gain
+        self._writer.writerow([raw, voltage, x_ind, y_ind])
+        return [voltage * 1000000]
+
+    def acquire_line(self, x_inds, y_ind):
+        data = self._line_scanner.scan(self._engine.x_val[x_inds])
+        raw = data[0] - data[1]
+        voltage = raw / self._gain
+        self._writer.writerows(zip(raw, voltage, x_inds, [y_ind] * len(x_inds)))
+        return [voltage * 1000000]
+
+    def render(self):
+        self._live1.update(self._z1, -self._engine.stats[0].absmax, self._engine.stats[0].absmax)
+
     def run_scan(self):
-        for y_ind, i in enumerate(self._y_val):
-            self._master.update()
-            if self._abort:
-                self._npc3sg_x.move(0)
-                self._npc3sg_y.move(0)
-                break
-            self._master.update()
-            if not self._direction:
-                y_ind = len(self._y_val) - y_ind - 1
-            self._npc3sg_y.move(i)
-            for x_ind, j in enumerate(self._x_val):
-                if self._abort:
-                    self._npc3sg_x.move(0)
-                    self._npc3sg_y.move(0)
-                    break
-                self._master.update()
-                self._npc3sg_x.move(j)
-                tk_sleep(self._master, 300)
-                data = self._q.read()
-                raw = data[0] - data[1]
-                voltage = raw / self._gain
-                self._writer.writerow([raw, voltage, x_ind, y_ind])
-                self._z1[x_ind][y_ind] = voltage * 1000000
-                self.update_plot(self._im1, self._z1, -np.amax(np.abs(self._z1)), np.amax(np.abs(self._z1)))
-                self._fig.tight_layout()
-                self._fig.canvas.draw()  # dynamically plots the data and closes automatically after completing the scan
-        self._npc3sg_x.move(0)
-        self._npc3sg_y.move(0)  # returns piezo controller position to 0,0
+        self._engine.run()
 
     def main(self):
         self.makefile()
         button = tk.Button(master=self._master, text="Abort", command=self.abort)
         button.pack(side=tk.BOTTOM)
-        with open(self._filename, 'w', newline='') as inputfile:
+        resuming = self.resumable()
+        with open_writer(self._filename, self._file_format, 'a' if resuming else 'w') as self._writer:
             try:
-                self._writer = csv.writer(inputfile)
                 self.setup_plots()
-                self.write_header()
+                if not resuming:
+                    self.write_header()
+                self._engine.attach_checkpoint(self.checkpoint(resuming))
                 self.run_scan()
                 thermovoltage_plot.plot(self._ax1, self._im1, self._z1, np.amax(np.abs(self._z1)),
                                         -np.amax(np.abs(self._z1)))
@@ -166,7 +169,7 @@ class ThermovoltageScanDC:
                 warnings.filterwarnings("ignore", ".*GUI is implemented.*")  # this warning relates to code \
                 # that was never written
                 cid = self._fig.canvas.mpl_connect('button_press_event',
-                                                   self.onclick)  # click on pixel to move laser position there
+                                                   self._engine.onclick)  # click on pixel to move laser position there
             except KeyboardInterrupt:
                 self._fig.savefig(self._imagefile, format='png',
                                   bbox_inches='tight')  # saves an image of the completed data
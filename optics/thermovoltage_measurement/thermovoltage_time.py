@@ -3,10 +3,10 @@ import matplotlib
 matplotlib.use('TkAgg')
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-from optics.misc_utility.tkinter_utilities import tk_sleep
+from optics.measurements.scheduler import Scheduler
 import time  # DO NOT USE TIME.SLEEP IN TKINTER MAINLOOP
-import csv
 from optics.misc_utility import conversions
+from optics.storage.writer import open_writer, extension
 import os
 from os import path
 import numpy as np
@@ -15,7 +15,7 @@ import tkinter as tk
 
 class ThermovoltageTime:
     def __init__(self, master, filepath, notes, device, scan, gain, rate, maxtime,
-                 npc3sg_input, sr7270_single_reference, powermeter, waveplate):
+                 npc3sg_input, sr7270_single_reference, powermeter, waveplate, buffered=False, file_format='csv'):
         self._master = master
         self._filepath = filepath
         self._notes = notes
@@ -44,6 +44,8 @@ class ThermovoltageTime:
         self._start_time = None
         self._voltages = None
         self._sleep = 1 / self._rate * 1000
+        self._buffered = buffered
+        self._file_format = file_format
         self._filename = None
         self._imagefile = None
         self._fig.tight_layout()
@@ -51,6 +53,7 @@ class ThermovoltageTime:
         self._canvas.draw()
         self._canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self._abort = False
+        self._scheduler = Scheduler(self._master)
 
     def abort(self):
         self._abort = True
@@ -72,6 +75,7 @@ class ThermovoltageTime:
             self._writer.writerow(['power (W):', 'not measured'])
         self._writer.writerow(['time constant:', self._sr7270_single_reference.read_tc()])
         self._writer.writerow(['reference phase:', self._sr7270_single_reference.read_reference_phase()])
+        self._writer.writerow(['acquisition:', 'curve buffer' if self._buffered else 'polled'])
         self._writer.writerow(['notes:', self._notes])
         self._writer.writerow(['end:', 'end of header'])
         self._writer.writerow(['time', 'x_raw', 'y_raw', 'x_v', 'y_v'])
@@ -79,13 +83,15 @@ class ThermovoltageTime:
     def makefile(self):
         os.makedirs(self._filepath, exist_ok=True)
         index = self._scan
-        self._filename = path.join(self._filepath, '{}_{}_{}{}'.format(self._device, self._polarization, index, '.csv'))
+        file_extension = extension(self._file_format)
+        self._filename = path.join(self._filepath,
+                                   '{}_{}_{}{}'.format(self._device, self._polarization, index, file_extension))
         self._imagefile = path.join(self._filepath,
                                     '{}_{}_{}{}'.format(self._device, self._polarization, index, '.png'))
         while path.exists(self._filename):
             index += 1
             self._filename = path.join(self._filepath,
-                                       '{}_{}_{}{}'.format(self._device, self._polarization, index, '.csv'))
+                                       '{}_{}_{}{}'.format(self._device, self._polarization, index, file_extension))
             self._imagefile = path.join(self._filepath,
                                         '{}_{}_{}{}'.format(self._device, self._polarization, index, '.png'))
 
@@ -98,21 +104,24 @@ class ThermovoltageTime:
         self._ax2.set_xlabel('time (s)')
         self._canvas.draw()
 
-    def set_limits(self):
-        if self._voltages[0] > self._max_voltage_x:
-            self._max_voltage_x = self._voltages[0]
-        if self._voltages[0] < self._min_voltage_x:
-            self._min_voltage_x = self._voltages[0]
+    def set_limits(self, voltages_x=None, voltages_y=None):
+        """Widens the axes to the latest reading, or to a whole block of readings"""
+        voltages_x = self._voltages[0] if voltages_x is None else voltages_x
+        voltages_y = self._voltages[1] if voltages_y is None else voltages_y
+        if np.amax(voltages_x) > self._max_voltage_x:
+            self._max_voltage_x = np.amax(voltages_x)
+        if np.amin(voltages_x) < self._min_voltage_x:
+            self._min_voltage_x = np.amin(voltages_x)
         if 0 < self._min_voltage_x < self._max_voltage_x:
             self._ax1.set_ylim(self._min_voltage_x * 1000000 / 2, self._max_voltage_x * 2 * 1000000)
         if self._min_voltage_x < 0 < self._max_voltage_x:
             self._ax1.set_ylim(self._min_voltage_x * 2 * 1000000, self._max_voltage_x * 2 * 1000000)
         if self._min_voltage_x < self._max_voltage_x < 0:
             self._ax1.set_ylim(self._min_voltage_x * 2 * 1000000, self._max_voltage_x * 1 / 2 * 1000000)
-        if self._voltages[1] > self._max_voltage_y:
-            self._max_voltage_y = self._voltages[1]
-        if self._voltages[1] < self._min_voltage_y:
-            self._min_voltage_y = self._voltages[1]
+        if np.amax(voltages_y) > self._max_voltage_y:
+            self._max_voltage_y = np.amax(voltages_y)
+        if np.amin(voltages_y) < self._min_voltage_y:
+            self._min_voltage_y = np.amin(voltages_y)
         if self._min_voltage_y > 0 < self._max_voltage_y:
             self._ax2.set_ylim(self._min_voltage_y * 1000000 / 2, self._max_voltage_y * 2 * 1000000)
         if self._min_voltage_y < 0 < self._max_voltage_y:
@@ -121,33 +130,68 @@ class ThermovoltageTime:
             self._ax2.set_ylim(self._min_voltage_y * 2 * 1000000, self._max_voltage_y * 1 / 2 * 1000000)
 
     def measure(self):
-        self._master.update()
-        raw = self._sr7270_single_reference.read_xy()
-        self._voltages = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
-        tk_sleep(self._master, self._sleep)
-        time_now = time.time() - self._start_time
-        self._writer.writerow([time_now, raw[0], raw[1], self._voltages[0], self._voltages[1]])
-        self._ax1.plot(time_now, self._voltages[0] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
-        self._ax2.plot(time_now, self._voltages[1] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
-        self.set_limits()
-        self._fig.tight_layout()
-        self._fig.canvas.draw()
-        self._master.update()
-        if not self._abort and time.time() - self._start_time < self._maxtime:
-            self.measure()
+        """Steps of the scheduler, one reading each until the max time is reached or the scan is aborted"""
+        while not self._abort and time.time() - self._start_time < self._maxtime:
+            raw = self._sr7270_single_reference.read_xy()
+            self._voltages = [conversions.convert_x_to_iphoto(x, self._gain) for x in raw]
+            yield self._sleep
+            time_now = time.time() - self._start_time
+            self._writer.writerow([time_now, raw[0], raw[1], self._voltages[0], self._voltages[1]])
+            self._ax1.plot(time_now, self._voltages[0] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
+            self._ax2.plot(time_now, self._voltages[1] * 1000000, linestyle='', color='blue', marker='o', markersize=2)
+            self.set_limits()
+            self._fig.tight_layout()
+            self._fig.canvas.draw()
 
-    def main(self):
-        button = tk.Button(master=self._master, text="Abort", command=self.abort)
-        button.pack(side=tk.BOTTOM)
+    def measure_buffered(self):
+        """Acquires into the lock in curve buffer at the requested rate. The buffer is drained once it fills, or when
+        the scan is aborted, and the scan continues with a new block until the max time is reached"""
+        remaining = int(self._maxtime * self._rate)
+        while remaining > 0 and not self._abort:
+            length, interval = self._sr7270_single_reference.setup_curve_buffer(('x', 'y'), self._sleep, remaining)
+            self._sr7270_single_reference.start_curve_buffer()
+            block_start = time.time() - self._start_time
+            status = self._sr7270_single_reference.read_curve_buffer_status()
+            while status[0] == 1:
+                self._ax1.set_title('X_1 (buffered, {} of {} points)'.format(int(status[3]), length))
+                self._canvas.draw()
+                yield min(1000, length * interval)
+                if self._abort:
+                    self._sr7270_single_reference.stop_curve_buffer()
+                status = self._sr7270_single_reference.read_curve_buffer_status()
+            curves = self._sr7270_single_reference.read_curves(('x', 'y'))
+            points = min(int(status[3]), len(curves['x']), len(curves['y']))
+            times = block_start + np.arange(points) * interval / 1000
+            voltages_x = conversions.convert_x_to_iphoto(curves['x'][:points], self._gain)
+            voltages_y = conversions.convert_x_to_iphoto(curves['y'][:points], self._gain)
+            self._writer.writerows(zip(times, curves['x'][:points], curves['y'][:points], voltages_x, voltages_y))
+            self._ax1.plot(times, voltages_x * 1000000, linestyle='', color='blue', marker='o', markersize=2)
+            self._ax2.plot(times, voltages_y * 1000000, linestyle='', color='blue', marker='o', markersize=2)
+            if points:
+                self.set_limits(voltages_x, voltages_y)
+            self._ax1.title.set_text('X_1')
+            self._fig.tight_layout()
+            self._canvas.draw()
+            remaining -= length
+            yield
+
+    def run(self):
         self.makefile()
-        with open(self._filename, 'w', newline='') as inputfile:
+        with open_writer(self._filename, self._file_format) as self._writer:
             try:
                 self._start_time = time.time()
-                self._writer = csv.writer(inputfile)
                 self.write_header()
                 self.setup_plots()
-                self.measure()
+                if self._buffered:
+                    yield from self.measure_buffered()
+                else:
+                    yield from self.measure()
                 self._fig.savefig(self._imagefile, format='png', bbox_inches='tight')
             except KeyboardInterrupt:
                 self._fig.savefig(self._imagefile, format='png',
                                   bbox_inches='tight')  # saves an image of the completed data
+
+    def main(self):
+        button = tk.Button(master=self._master, text="Abort", command=self.abort)
+        button.pack(side=tk.BOTTOM)
+        self._scheduler.start(self.run())
@@ -0,0 +1,39 @@
+class LiveImage:
+    """Keeps a colormap (an AxesImage from imshow) up to date during a measurement by blitting.
+
+    The pixels of the axes are cached after every full draw of the canvas. An update with the same color limits
+    restores that cache, draws just the image artist and blits the axes, so its cost does not depend on the ticks,
+    labels and colorbars of the rest of the figure. When the color limits change, a full draw is requested with
+    draw_idle, which also updates the colorbar; several images on one canvas changing limits together share that
+    draw, which tk does the next time it is idle (the next master.update()). transpose=True shows data.T, for maps
+    indexed [x, y].
+
+    Usage: live = LiveImage(canvas, im, transpose=True)
+        live.update(z, min_val, max_val)
+    """
+    def __init__(self, canvas, im, transpose=False):
+        self._canvas = canvas
+        self._im = im
+        self._transpose = transpose
+        self._background = None
+        self._clim = None
+        self._cid = self._canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        self._background = self._canvas.copy_from_bbox(self._im.axes.bbox)
+
+    def update(self, data, min_val, max_val):
+        self._im.set_data(data.T if self._transpose else data)
+        if (min_val, max_val) != self._clim:
+            self._clim = (min_val, max_val)
+            self._im.set_clim(vmin=min_val, vmax=max_val)
+            self._background = None  # out of date until the full draw
+        if self._background is None:
+            self._canvas.draw_idle()
+        else:
+            self._canvas.restore_region(self._background)
+            self._im.axes.draw_artist(self._im)
+            self._canvas.blit(self._im.axes.bbox)
+
+    def disconnect(self):
+        self._canvas.mpl_disconnect(self._cid)
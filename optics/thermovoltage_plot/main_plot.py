@@ -1,6 +1,7 @@
 import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
 
+from optics.storage.loader import load
 from optics.thermovoltage_plot.thermovoltage_plot import MidpointNormalize
 
 
@@ -25,13 +26,5 @@ if __name__ == "__main__":
     parser.add_argument("-plotlabel", metavar='plot_label', type=str, help='label for plot')
     args = parser.parse_args()
 
-    with open(args.f) as fin:
-        header={}
-        for i, line in enumerate(fin):
-            key, value = (token.strip() for token in line.split(":,", maxsplit=1))
-            header[key] = value
-            if key == 'end':
-                break
-        data = pd.read_csv(fin, sep=',')
-        voltages = data['x_v'].values.reshape(int(header['y scan density']), int(header['x scan density']))
-    thermovoltagemapplot((voltages.T) * 1000000, args.plotlabel, args.max_val, args.min_val)
+    voltages = load(args.f).grid('x_v')  # rows may be in any scan order
+    thermovoltagemapplot(voltages * 1000000, args.plotlabel, args.max_val, args.min_val)
@@ -1,6 +1,6 @@
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
+from optics.storage.loader import load
 
 if __name__ == "__main__":
     import argparse
@@ -11,14 +11,7 @@ if __name__ == "__main__":
     parser.add_argument("-plotlabel", metavar='plot_label', type=str, help='label for plot')
     args = parser.parse_args()
 
-    with open(args.f) as fin:
-        header={}
-        for i, line in enumerate(fin):
-            key, value = (token.strip() for token in line.split(":,", maxsplit=1))
-            header[key] = value
-            if key == 'end':
-                break
-        data = pd.read_csv(fin, sep=',')
+    data = load(args.f).data
     plt.scatter(data["time"], data['x_v']*1000000)
     plt.suptitle(args.plotlabel)
     plt.xlabel('time (s)')